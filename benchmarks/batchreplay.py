@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+"""
+Replay of many traces at once (see benchmarks.replay), e.g. to estimate
+power of recorded device-days again after a power model changed.
+
+Traces fan out over a pool of processes, one trace per task in a process of
+its own: replays redirect paths and the clock of the whole process. The
+model is the phone class replays run with, named by module and class, such
+as benchmarks.iterations.BenchPhone. Energy drawn by each UID on each
+component, as logged by the estimator of every replay, is merged into one
+table.
+
+Usage::
+python -m benchmarks.batchreplay [-j processes] [-m model] trace.bin...
+"""
+
+__all__ = ['load_model', 'get_energies', 'replay_trace', 'replay_traces',
+           'BatchSummary']
+
+from benchmarks.replay import Replay
+from utils import powerlog
+from utils.powerlog import PowerLogSegments
+
+import argparse
+import importlib
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+DEFAULT_MODEL = "benchmarks.iterations.BenchPhone"
+
+logger = logging.getLogger("BatchReplay")
+
+
+def load_model(name):
+    """Return phone class named module.Class. Raises ValueError if there is
+    no such class"""
+    module_name, _, class_name = name.rpartition(".")
+
+    try:
+        return getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError, ValueError) as e:
+        raise ValueError("No power model {0}: {1}".format(name, e))
+
+
+def get_energies(records, iter_interval):
+    """Return energy (J) drawn by each UID on each component over log
+    records, as { (uid, component) : energy }, and names of UIDs as
+    { uid : name }"""
+    energies = {}
+    names = {}
+    seconds = iter_interval / 1000.0
+
+    for record in records:
+        type_ = record[0]
+
+        if type_ == powerlog.RECORD_POWER:
+            span = 1
+            powers = record[3]
+        elif type_ == powerlog.RECORD_CATCHUP:
+            span = record[2]
+            powers = record[3]
+        else:
+            if type_ == powerlog.RECORD_APP_NAME:
+                names[record[1]] = record[2]
+            continue
+
+        for uid, component, power in powers:
+            key = (uid, component)
+            # mW over span iterations
+            energies[key] = (energies.get(key, 0) +
+                             power * span * seconds / 1000)
+
+    return energies, names
+
+
+def replay_trace(args):
+    """Replay trace with model, given as (trace path, model name). Return
+    (trace path, iterations, time spanned (ms), energies, names) as of
+    get_energies(), or (trace path, error message) if it could not be
+    replayed"""
+    path, model_name = args
+    root = tempfile.mkdtemp(prefix="powerreplay")
+    log_file = os.path.join(root, "powerlog.bin")
+
+    try:
+        with open(path, "rb") as trace:
+            replay = Replay(trace, os.path.join(root, "fs"), log_file,
+                            load_model(model_name))
+            try:
+                iterations, span = replay.run()
+            finally:
+                replay.close()
+
+        energies, names = get_energies(PowerLogSegments(log_file),
+                                       replay.iter_interval)
+        return path, iterations, span, energies, names
+    except (IOError, ValueError) as e:
+        return path, str(e)
+    finally:
+        shutil.rmtree(root)
+
+
+class BatchSummary(object):
+    """Energy of UIDs merged over replays"""
+
+    def __init__(self):
+        self.traces = 0
+        self.iterations = 0
+        self.span = 0           # ms
+        # { trace path : error message }
+        self.failed = {}
+        # { uid : { component : energy } }
+        self.energies = {}
+        self.names = {}
+        self.components = set()
+
+    def add(self, result):
+        """Merge result of replay_trace()"""
+        if len(result) == 2:
+            path, error = result
+            self.failed[path] = error
+            return
+
+        _, iterations, span, energies, names = result
+        self.traces += 1
+        self.iterations += iterations
+        self.span += span
+        self.names.update(names)
+
+        for (uid, component), energy in energies.iteritems():
+            components = self.energies.setdefault(uid, {})
+            components[component] = components.get(component, 0) + energy
+            self.components.add(component)
+
+    def get_rows(self):
+        """Return [(uid, name, total energy, { component : energy })], most
+        energy first"""
+        rows = [(uid, self.names.get(uid, str(uid)), sum(energies.values()),
+                 energies) for uid, energies in self.energies.iteritems()]
+        rows.sort(key=lambda row: (-row[2], row[0]))
+        return rows
+
+    def export_text(self, out):
+        components = sorted(self.components)
+        out.write("{0} traces, {1} iterations, {2:.1f} device hours\n".format(
+            self.traces, self.iterations, self.span / 3600000.0))
+
+        out.write("{0:>7} {1:<24} {2:>12}".format("UID", "Name", "Total J"))
+        for component in components:
+            out.write(" {0:>10}".format(component))
+        out.write("\n")
+
+        for uid, name, total, energies in self.get_rows():
+            out.write("{0:>7} {1:<24} {2:12.1f}".format(uid, name[:24],
+                                                        total))
+            for component in components:
+                out.write(" {0:10.1f}".format(energies.get(component, 0)))
+            out.write("\n")
+
+        for path, error in sorted(self.failed.iteritems()):
+            out.write("Failed {0}: {1}\n".format(path, error))
+
+
+def replay_traces(paths, model_name=DEFAULT_MODEL, processes=None):
+    """Replay traces over a pool of processes, as many as cores by default.
+    Return BatchSummary"""
+    # Fail before forking on a model that does not load
+    load_model(model_name)
+
+    summary = BatchSummary()
+    # A fresh process per trace, as a replay leaves state of the process
+    # behind, e.g. descriptors and PIDs seen
+    pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+
+    try:
+        for result in pool.imap_unordered(replay_trace, [
+                (path, model_name) for path in paths]):
+            if len(result) == 2:
+                logger.warn("Failed to replay {0}: {1}".format(*result))
+            summary.add(result)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay traces at once")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="processes replaying traces (default: cores)")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL,
+                        help="phone class estimating power "
+                             "(default: {0})".format(DEFAULT_MODEL))
+    parser.add_argument("traces", nargs="+")
+    args = parser.parse_args()
+
+    start = timeit.default_timer()
+    summary = replay_traces(args.traces, args.model, args.processes)
+    elapsed = timeit.default_timer() - start
+
+    summary.export_text(sys.stdout)
+    print("Replayed in {0:.1f} s, {1:.0f}x real time".format(
+        elapsed, summary.span / 1000.0 / elapsed if elapsed > 0 else 0))
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+"""
+Synthetic /proc and /sys trees for running monitors off Android.
+
+A tree holds npids processes spread over nuids UIDs, ncores cores, network
+interfaces with their statistics, per-UID traffic counters and a battery.
+Every tick() moves the counters forward, as a second of activity would.
+Files are rewritten in place, so that descriptors kept open by the
+descriptor cache see the new contents. redirect() points the path
+constants of SystemInfo, CPU, Wifi, ThreeG and BatteryStats at a tree.
+record_trace() writes ticks of a tree as a trace to replay (see
+benchmarks.replay).
+"""
+
+__all__ = ['ProcTree', 'record_trace', 'redirect', 'write_file']
+
+from libs.wifi import WifiAccess
+from monitors.cpu import CPU
+from monitors.threeg import ThreeG
+from monitors.wifi import Wifi
+from utils.batterystats import BatteryStats
+from utils.systeminfo import SystemInfo
+from utils.trace import TraceRecorder
+
+import os
+import random
+
+# Path constants of each class, all absolute paths under /proc or /sys
+PATH_CONSTANTS = [
+    (SystemInfo, ['PID_STAT_MASK', 'PROC_DIR', 'PROC_MEM_FILE',
+                  'PROC_STAT_FILE', 'UID_STATS_DIR', 'UID_STATUS_MASK']),
+    (CPU, ['CPUINFO_FILE', 'STAT_FILE', 'SYSFS_FREQ_FILE_MASK']),
+    (Wifi, ['NET_STATISTICS_MASK', 'UID_STATS_FOLDER', 'UID_TX_BYTE_MASK',
+            'UID_RX_BYTE_MASK']),
+    (ThreeG, ['NET_STATISTIC_MASK', 'RX_PKT_MASK', 'TX_PKT_MASK',
+              'RX_BYTE_MASK', 'TX_BYTE_MASK', 'UID_STATS_FOLDER',
+              'UID_TX_BYTE_MASK', 'UID_RX_BYTE_MASK']),
+    (BatteryStats, ['_SYSFS_MASK']),
+]
+
+# /proc/<pid>/status, as far as SystemInfo.get_uid_for_pid() reads it
+STATUS_FORMAT = ("Name:\tapp{0}\nState:\tS (sleeping)\nTgid:\t{0}\n"
+                 "Pid:\t{0}\nPPid:\t1\nTracerPid:\t0\n"
+                 "Uid:\t{1}\t{1}\t{1}\t{1}\n"
+                 "Gid:\t{1}\t{1}\t{1}\t{1}\n")
+
+
+def redirect(root):
+    """Point path constants at tree under root. Return function restoring
+    them"""
+    saved = []
+
+    for cls, names in PATH_CONSTANTS:
+        for name in names:
+            value = getattr(cls, name)
+            saved.append((cls, name, value))
+            setattr(cls, name, root + value)
+
+    def restore():
+        for cls, name, value in saved:
+            setattr(cls, name, value)
+
+    return restore
+
+
+def write_file(path, data):
+    """Write data to path, creating its directory if needed"""
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    # Truncating keeps the inode, and with it descriptors open on it
+    with open(path, "w") as fp:
+        fp.write(data)
+
+
+class ProcTree(object):
+    """Synthetic /proc and /sys under root"""
+
+    DEFAULT_IFACES = ("wlan0", "rmnet0")
+    FREQS = (245000, 384000, 460800, 499200, 576000, 614400, 652800, 691200,
+             768000, 806400, 844800, 998400)   # kHz
+    FIRST_PID = 100
+    # Share of UIDs sending or receiving on each tick
+    ACTIVE_UIDS = 0.2
+
+    def __init__(self, root, npids=200, nuids=50, ncores=4,
+                 ifaces=DEFAULT_IFACES, seed=0):
+        self.root = root
+        self.ncores = ncores
+        self.ifaces = ifaces
+        self._random = random.Random(seed)
+
+        self.uids = [SystemInfo.AID_APP + i for i in xrange(nuids)]
+        self.pids = range(self.FIRST_PID, self.FIRST_PID + npids)
+        # { pid : [uid, utime, stime, start time] }
+        self._pids = {pid: [self.uids[i % nuids], 0, 0, i] for i, pid in
+                      enumerate(self.pids)}
+        # [user, nice, system, idle, iowait, irq, softirq] of each core
+        self._cores = [[0] * 7 for _ in xrange(ncores)]
+        self._freqs = [self.FREQS[-1]] * ncores
+        # { uid : [tcp_snd, tcp_rcv] }
+        self._uid_bytes = {uid: [0, 0] for uid in self.uids}
+        # { iface : [tx_packets, rx_packets, tx_bytes, rx_bytes] }
+        self._net = {iface: [0, 0, 0, 0] for iface in ifaces}
+        self._charge = 1400000
+
+        self._write_static()
+        self._write_counters()
+
+    def path(self, path):
+        """Return where absolute path lives in the tree"""
+        return self.root + path
+
+    def _write(self, path, data):
+        write_file(self.path(path), data)
+
+    def _write_static(self):
+        self._write("/proc/meminfo", "MemTotal: 383196 kB\n"
+                    "MemFree: 26560 kB\nBuffers: 2080 kB\n"
+                    "Cached: 121464 kB\n")
+        self._write("/proc/cpuinfo", "".join(
+            "processor\t: {0}\nBogoMIPS\t: 1996.80\n\n".format(core) for
+            core in xrange(self.ncores)))
+
+        for pid, (uid, _, _, _) in self._pids.iteritems():
+            self._write("/proc/{0}/status".format(pid),
+                        STATUS_FORMAT.format(pid, uid))
+
+        battery = "/sys/class/power_supply/battery/{0}"
+        for name, value in [("voltage_now", 3900000), ("current_now", -250000),
+                            ("temp", 305), ("capacity", 80),
+                            ("full_bat", 1400)]:
+            self._write(battery.format(name), "{0}\n".format(value))
+
+    def _write_counters(self):
+        cores = self._cores
+        self._write("/proc/stat", "".join(
+            ["cpu  " + " ".join(str(sum(times)) for times in zip(*cores)) +
+             " 0 0 0\n"] +
+            ["cpu{0} {1} 0 0 0\n".format(core, " ".join(str(t) for t in
+                                                       times))
+             for core, times in enumerate(cores)] +
+            ["intr 0\nctxt 0\nbtime 1381328633\nprocesses {0}\n".format(
+                len(self._pids))]))
+
+        for pid, (_, utime, stime, start_time) in self._pids.iteritems():
+            self._write("/proc/{0}/stat".format(pid),
+                        "{0} (app{0}) S 1 {0} 0 0 -1 4194624 3171 0 0 0 {1} "
+                        "{2} 0 0 20 0 19 0 {3} 550277120 11292 4294967295 1 "
+                        "1 0 0 0 0 4612 0 38136 4294967295 0 0 17 1 0 0 0 0 "
+                        "0\n".format(pid, utime, stime, start_time))
+
+        for uid, (snd, rcv) in self._uid_bytes.iteritems():
+            self._write("/proc/uid_stat/{0}/tcp_snd".format(uid),
+                        "{0}\n".format(snd))
+            self._write("/proc/uid_stat/{0}/tcp_rcv".format(uid),
+                        "{0}\n".format(rcv))
+
+        for core, freq in enumerate(self._freqs):
+            self._write("/sys/devices/system/cpu/cpu{0}/cpufreq/"
+                        "scaling_cur_freq".format(core), "{0}\n".format(freq))
+
+        for iface, counts in self._net.iteritems():
+            for name, count in zip(["tx_packets", "rx_packets", "tx_bytes",
+                                    "rx_bytes"], counts):
+                self._write("/sys/devices/virtual/net/{0}/statistics/"
+                            "{1}".format(iface, name), "{0}\n".format(count))
+
+        self._write("/sys/class/power_supply/battery/charge_counter",
+                    "{0}\n".format(self._charge))
+
+    def tick(self, jiffies=100):
+        """Move counters forward by jiffies of activity on each core"""
+        rand = self._random
+
+        for core, times in enumerate(self._cores):
+            busy = rand.randint(0, jiffies)
+            times[0] += busy - busy // 3
+            times[2] += busy // 3
+            times[3] += jiffies - busy
+            self._freqs[core] = rand.choice(self.FREQS)
+
+        for state in self._pids.itervalues():
+            if rand.random() < 0.3:
+                state[1] += rand.randint(0, 3)
+                state[2] += rand.randint(0, 1)
+
+        for uid, counts in self._uid_bytes.iteritems():
+            if rand.random() < self.ACTIVE_UIDS:
+                counts[0] += rand.randint(0, 20000)
+                counts[1] += rand.randint(0, 200000)
+
+        for counts in self._net.itervalues():
+            tx_pkts = rand.randint(0, 100)
+            rx_pkts = rand.randint(0, 300)
+            counts[0] += tx_pkts
+            counts[1] += rx_pkts
+            counts[2] += tx_pkts * 200
+            counts[3] += rx_pkts * 1200
+
+        self._charge -= rand.randint(0, 100)
+
+        self._write_counters()
+
+    def record(self, recorder):
+        """Record tree to utils.trace.TraceRecorder as monitors read it"""
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                with open(path) as fp:
+                    recorder.record_file(path[len(self.root):], fp.read())
+
+        recorder.record_listdir("/proc", [str(pid) for pid in self.pids])
+        recorder.record_listdir("/proc/uid_stat/", [str(uid) for uid in
+                                                    self.uids])
+        for pid, state in self._pids.iteritems():
+            recorder.record_value("uid_for_pid.{0}".format(pid), state[0])
+
+
+def record_trace(tree, out, iterations, names, iter_interval=1000):
+    """Write trace of iterations of tree, each one a tick, to binary file out.
+    Monitors of names run with Wifi up on wlan0"""
+    recorder = TraceRecorder()
+    recorder.start(out, iter_interval)
+    recorder.record_value("wifi.name", "wlan0")
+    recorder.record_value("wifi.state", WifiAccess.WIFI_STATE_ENABLED)
+    recorder.record_value("wifi.speed", 54)
+    recorder.record_hardware("benchmark", names)
+
+    for iter_num in xrange(iterations):
+        tree.tick()
+        tree.record(recorder)
+        recorder.end_iteration(iter_num, iter_num * iter_interval)
+
+    recorder.stop()
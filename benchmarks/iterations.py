@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of monitor iterations and of whole estimator iterations, run off
+Android over a synthetic /proc and /sys tree (see benchmarks.fixtures).
+Android services are replaced by fixed answers and time by a virtual clock
+moving a second per iteration, so runs are reproducible.
+
+For the CPU cores, Wifi, ThreeG, the battery reads and the estimator
+processing, reports latency per iteration (median, 95th percentile and max)
+and memory each iteration leaves behind, with the garbage collector off:
+leaks show up as steady growth. Where tracemalloc is available that is net
+KB of memory blocks; otherwise it is the net count of container objects as
+tracked by the garbage collector, which misses objects such as strings and
+numbers. Either one is negative when a step frees more than it allocates.
+"Total" is a whole iteration as run by the monitor scheduler.
+
+Usage::
+python -m benchmarks.iterations [iterations] [pids] [uids] [cores]
+"""
+
+from benchmarks.fixtures import ProcTree
+from benchmarks.fixtures import redirect
+from libs.clock import VirtualClock
+from libs.clock import clock
+from libs.telephony import TelephonyAccess
+from libs.wifi import WifiAccess
+from monitors.cpu import CPU
+from monitors.threeg import ThreeG
+from monitors.wifi import Wifi
+from services.powerestimator import PowerEstimator
+from utils.batterystats import BatteryStats
+from utils.fdcache import fdcache
+from utils.hardware import Hardware
+from utils.pidindex import pidindex
+from utils.procsnapshot import ProcSnapshot
+
+import gc
+import monitors.threeg
+import monitors.wifi
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Iterations run before measuring, e.g. for files to be opened and UIDs of
+# processes to be looked up
+WARMUP = 5
+
+# What run_memory() counts
+MEMORY_UNIT = "net KB" if tracemalloc is not None else "net objects"
+
+
+class BenchConstants(object):
+    MODEL_NAME = "benchmark"
+    CPU_FREQS = [freq // 1000 for freq in ProcTree.FREQS]     # MHz
+    WIFI_LOWHIGH_PKTBOUND = 50
+    WIFI_HIGHLOW_PKTBOUND = 20
+    THREEG_INTERFACE = "rmnet0"
+
+    @classmethod
+    def get_3g_dhcfach_time(cls, provider):
+        return 6
+
+    @classmethod
+    def get_3g_fachidle_time(cls, provider):
+        return 4
+
+    @classmethod
+    def get_3g_tx_queue(cls, provider):
+        return 151
+
+    @classmethod
+    def get_3g_rx_queue(cls, provider):
+        return 119
+
+    @classmethod
+    def get_max_power(cls, monitor_name):
+        return 1000
+
+
+class BenchWifiAccess(WifiAccess):
+    """Wifi enabled on wlan0 at 54 Mbps"""
+
+    __slots__ = []
+
+    def __init__(self):
+        pass
+
+    def get_name(self):
+        return "wlan0"
+
+    def get_speed(self):
+        return 54
+
+    def get_state(self):
+        return self.WIFI_STATE_ENABLED
+
+
+class BenchTelephonyAccess(TelephonyAccess):
+    """UMTS data connection"""
+
+    def __init__(self):
+        pass
+
+    def get_network_type(self):
+        return self.NETWORK_TYPE_UMTS
+
+    def get_state(self):
+        return self.DATA_CONNECTED
+
+    def get_phone_type(self):
+        return self.PHONE_TYPE_GSM
+
+    def get_operator_name(self):
+        return "benchmark"
+
+
+def _get_cpu_power(usage):
+    return (usage.usr_perc + usage.sys_perc) * usage.freq / 1000
+
+
+def _get_wifi_power(usage):
+    if not usage.on:
+        return 0
+    return 38 if usage.pwr_state == Wifi.POWER_STATE_LOW else 720
+
+
+def _get_threeg_power(usage):
+    if not usage.on:
+        return 0
+    return (10, 401, 570)[usage.pwr_state]
+
+
+class BenchPhone(object):
+    """Phone as seen by PowerEstimator, with simple power functions"""
+
+    constants = BenchConstants
+
+    def __init__(self, hardware):
+        self.hardware = {monitor.monitor_name: monitor for monitor in
+                         hardware}
+        self.power_function = {}
+        self.power_batch_function = {}
+        self.power_batch_columns = {}
+
+        for name, monitor in self.hardware.iteritems():
+            if isinstance(monitor, CPU):
+                self.power_function[name] = _get_cpu_power
+            elif isinstance(monitor, Wifi):
+                self.power_function[name] = _get_wifi_power
+            else:
+                self.power_function[name] = _get_threeg_power
+
+
+def create_monitors(names, constants=BenchConstants,
+                    wifi_access=BenchWifiAccess,
+                    telephony_access=BenchTelephonyAccess):
+    """Return monitors of names among those running off Android: CPU cores,
+    Wifi and 3G. Android services are answered by the access classes given.
+    Other names are left out"""
+    # Android services are looked up when monitors get created
+    saved = (monitors.wifi.WifiAccess, monitors.threeg.TelephonyAccess)
+    monitors.wifi.WifiAccess = wifi_access
+    monitors.threeg.TelephonyAccess = telephony_access
+
+    hardware = []
+    try:
+        for name in names:
+            core = name[len(Hardware.CPU):]
+            if name.startswith(Hardware.CPU) and core.isdigit():
+                hardware.append(CPU(constants, int(core)))
+            elif name == Hardware.WIFI:
+                hardware.append(Wifi(constants))
+            elif name == Hardware.THREEG:
+                hardware.append(ThreeG(constants))
+    finally:
+        monitors.wifi.WifiAccess, monitors.threeg.TelephonyAccess = saved
+
+    return hardware
+
+
+def _read_battery():
+    """Battery reads done by the estimator every minute"""
+    return (BatteryStats.get_charge(), BatteryStats.get_temperature(),
+            BatteryStats.get_voltage(), BatteryStats.get_current())
+
+
+class Benchmark(object):
+    """Monitors and estimator running over a tree in directory root"""
+
+    def __init__(self, root, npids, nuids, ncores):
+        self._tree = ProcTree(os.path.join(root, "fs"), npids, nuids, ncores)
+        self._restore = redirect(self._tree.root)
+        fdcache.clear()
+        pidindex.clear()
+        ProcSnapshot._current = None
+
+        self._source = VirtualClock(0)
+        clock.set_source(self._source)
+
+        self._monitors = create_monitors(
+            [CPU.TAG_MASK.format(core) for core in xrange(ncores)] +
+            [Hardware.WIFI, Hardware.THREEG])
+        for monitor in self._monitors:
+            monitor.init(clock.tick(), PowerEstimator.ITERATION_INTERVAL)
+
+        self._log_file = PowerEstimator.LOG_FILE
+        PowerEstimator.LOG_FILE = os.path.join(root, "powerlog.bin")
+        self._estimator = PowerEstimator(BenchPhone(self._monitors))
+
+        self._iter_num = 0
+        # Steps of an iteration: [(name, function of iter_num)]
+        self.steps = ([(monitor.monitor_name, self._get_monitor_step(monitor))
+                       for monitor in self._monitors] +
+                      [("Battery", lambda iter_num: _read_battery()),
+                       ("Estimator", self._estimator._process_iteration)])
+
+    def _get_monitor_step(self, monitor):
+        def step(iter_num):
+            monitor.publish(iter_num, monitor.profile_iteration(iter_num))
+        return step
+
+    def close(self):
+        self._estimator._log.close()
+        PowerEstimator.LOG_FILE = self._log_file
+        self._restore()
+        fdcache.clear()
+        pidindex.clear()
+        ProcSnapshot._current = None
+
+    def _next(self):
+        """Move tree and clock to the next iteration. Return its number"""
+        iter_num = self._iter_num
+        self._iter_num += 1
+
+        self._tree.tick()
+        self._source.advance(PowerEstimator.ITERATION_INTERVAL)
+        clock.tick()
+
+        return iter_num
+
+    def run(self, iterations):
+        """Run iterations. Return latencies (us) of each step of each
+        iteration as { name : [latency] }"""
+        latencies = {name: [] for name, _ in self.steps}
+        latencies["Total"] = []
+        timer = timeit.default_timer
+
+        for _ in xrange(iterations):
+            iter_num = self._next()
+            total = 0
+
+            for name, step in self.steps:
+                start = timer()
+                step(iter_num)
+                elapsed = 1e6 * (timer() - start)
+                latencies[name].append(elapsed)
+                total += elapsed
+
+            latencies["Total"].append(total)
+
+        return latencies
+
+    def run_opens(self, iterations):
+        """Run iterations. Return files opened per iteration, which is zero
+        once the descriptor cache holds every file monitors read"""
+        opens = fdcache.opens
+        for _ in xrange(iterations):
+            iter_num = self._next()
+            for _, step in self.steps:
+                step(iter_num)
+
+        return (fdcache.opens - opens) / float(iterations)
+
+    def run_memory(self, iterations):
+        """Run iterations with the garbage collector off. Return memory left
+        behind by each step per iteration as { name : amount }, in
+        MEMORY_UNIT"""
+        amounts = {name: 0 for name, _ in self.steps}
+        tracing = tracemalloc is not None and not tracemalloc.is_tracing()
+
+        if tracemalloc is not None:
+            def get_amount():
+                return tracemalloc.get_traced_memory()[0] / 1024.0
+        else:
+            def get_amount():
+                # Unlike gc.get_count(), neither reset by collections nor
+                # stuck at zero when objects are freed
+                return len(gc.get_objects())
+
+        if tracing:
+            tracemalloc.start()
+        gc.collect()
+        gc.disable()
+
+        try:
+            for _ in xrange(iterations):
+                iter_num = self._next()
+
+                for name, step in self.steps:
+                    amount = get_amount()
+                    step(iter_num)
+                    amounts[name] += get_amount() - amount
+        finally:
+            gc.enable()
+            if tracing:
+                tracemalloc.stop()
+
+        amounts["Total"] = sum(amounts.itervalues())
+        return {name: amount / float(iterations) for name, amount in
+                amounts.iteritems()}
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+def main(iterations=200, npids=300, nuids=60, ncores=4):
+    root = tempfile.mkdtemp(prefix="powerbench")
+
+    try:
+        benchmark = Benchmark(root, npids, nuids, ncores)
+        try:
+            benchmark.run(WARMUP)
+            latencies = benchmark.run(iterations)
+            amounts = benchmark.run_memory(iterations)
+            opens = benchmark.run_opens(iterations)
+        finally:
+            benchmark.close()
+    finally:
+        shutil.rmtree(root)
+
+    print("{0} iterations, {1} PIDs, {2} UIDs, {3} cores".format(
+        iterations, npids, nuids, ncores))
+    print("{0:<10} {1:>10} {2:>10} {3:>10} {4:>12}".format(
+        "", "median us", "p95 us", "max us", MEMORY_UNIT))
+
+    for name in [name for name, _ in benchmark.steps] + ["Total"]:
+        values = latencies[name]
+        print("{0:<10} {1:10.1f} {2:10.1f} {3:10.1f} {4:12.1f}".format(
+            name, _percentile(values, 50), _percentile(values, 95),
+            max(values), amounts[name]))
+
+    print("Files opened per iteration: {0:.1f}".format(opens))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""
+Micro-benchmark of the /proc stat parsers against the split based parsing
+SystemInfo used before, alone and together with reading the file.
+
+Usage::
+python -m benchmarks.procparse [number]
+"""
+
+from utils.fdcache import DescriptorCache
+from utils.statparser import parse_all_cpu_times, parse_pid_times
+
+import os
+import sys
+import tempfile
+import timeit
+
+PID_STAT = (b"1234 (Binder (thread) 2) S 1 1234 0 0 -1 4194624 3171 0 0 0 "
+            b"1517 442 0 0 20 0 19 0 3742 550277120 11292 4294967295 1 1 0 "
+            b"0 0 0 4612 0 38136 4294967295 0 0 17 1 0 0 0 0 0\n")
+
+PROC_STAT = (b"cpu  36104 1226 24419 1230213 2305 1 488 0 0 0\n"
+             b"cpu0 9305 318 6574 306121 670 1 311 0 0 0\n"
+             b"cpu1 8842 294 5991 308276 529 0 98 0 0 0\n"
+             b"cpu2 9101 312 5952 307761 561 0 46 0 0 0\n"
+             b"cpu3 8856 302 5902 308055 545 0 33 0 0 0\n"
+             b"intr 2260541 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0\n"
+             b"ctxt 4381937\nbtime 1381328633\nprocesses 10052\n")
+
+
+def split_pid_times(data):
+    """Parsing as done by SystemInfo.get_pid_usr_sys_times before"""
+    fields = data.split()
+    return [int(fields[13]), int(fields[14])]
+
+
+def split_cpu_times(data):
+    """Parsing as done by SystemInfo.get_cpus_usr_sys_total_times before"""
+    cpus = {}
+    for line in data.splitlines():
+        if not line.startswith(b"cpu"):
+            break
+        times = line.split()
+        if times[0] == b"cpu":
+            continue
+        usr = int(times[1]) + int(times[2])
+        sys_ = int(times[2]) + int(times[6]) + int(times[7])
+        total = usr + sys_ + int(times[4]) + int(times[5])
+        cpus[int(times[0][3:])] = [usr, sys_, total]
+    return cpus
+
+
+def main(number=100000):
+    pid_buf = bytearray(PID_STAT)
+    stat_buf = bytearray(PROC_STAT)
+
+    fd, path = tempfile.mkstemp()
+    os.write(fd, PID_STAT)
+    os.close(fd)
+    cache = DescriptorCache()
+    buf = bytearray(4096)
+
+    def open_and_split():
+        with open(path) as fp:
+            return split_pid_times(fp.read())
+
+    def cached_and_parse():
+        return parse_pid_times(buf, cache.read_into(path, buf))
+
+    cases = [
+        ("pid stat (split)", lambda: split_pid_times(PID_STAT)),
+        ("pid stat (parser)", lambda: parse_pid_times(pid_buf, len(pid_buf))),
+        ("/proc/stat (split)", lambda: split_cpu_times(PROC_STAT)),
+        ("/proc/stat (parser)",
+         lambda: parse_all_cpu_times(stat_buf, len(stat_buf))),
+        ("pid read (open+split)", open_and_split),
+        ("pid read (cached fd)", cached_and_parse),
+    ]
+
+    try:
+        for name, func in cases:
+            elapsed = min(timeit.repeat(func, number=number, repeat=3))
+            print("{0:<22} {1:8.3f} us/call".format(name,
+                                                    1e6 * elapsed / number))
+    finally:
+        cache.clear()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
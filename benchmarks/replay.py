@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+
+"""
+Replay of traces of monitor inputs (see utils.trace) off Android, through the
+monitors and estimator as they run on the device, as fast as they go.
+
+Files and directory listings of the trace are laid out under a root
+directory, to which the path constants of monitors get redirected as in
+benchmarks (see benchmarks.fixtures). Android services answer with the values
+of the trace and events are pushed to the event queue of their monitor at
+the time they were recorded, as told by a virtual clock jumping from one
+recorded iteration to the next. Each iteration runs through the monitor
+scheduler and then the estimator, which logs powers to a power log as on the
+device.
+
+Only monitors running off Android are replayed: CPU cores, Wifi and 3G.
+Others need Android bindings to be created and are left out. The phone
+class, by default benchmarks.iterations.BenchPhone, is created with the
+monitors replayed and provides the constants they are created with and the
+power functions of the estimator.
+
+Usage::
+python -m benchmarks.replay trace.bin [powerlog.bin]
+"""
+
+__all__ = ['Replay']
+
+from benchmarks.fixtures import STATUS_FORMAT
+from benchmarks.fixtures import redirect
+from benchmarks.fixtures import write_file
+from benchmarks.iterations import BenchPhone
+from benchmarks.iterations import create_monitors
+from libs.clock import VirtualClock
+from libs.clock import clock
+from libs.telephony import TelephonyAccess
+from libs.wifi import WifiAccess
+from monitors.scheduler import MonitorScheduler
+from services.powerestimator import PowerEstimator
+from utils.fdcache import fdcache
+from utils.logwriter import BackgroundWriter
+from utils.pidindex import pidindex
+from utils.procsnapshot import ProcSnapshot
+from utils.trace import TRACE_EVENT
+from utils.trace import TRACE_FILE
+from utils.trace import TRACE_HARDWARE
+from utils.trace import TRACE_ITERATION
+from utils.trace import TRACE_LISTDIR
+from utils.trace import TRACE_VALUE
+from utils.trace import TraceReader
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+
+class ReplayWifiAccess(WifiAccess):
+    """Wifi as last recorded in the trace being replayed"""
+
+    __slots__ = []
+
+    # { key : value } recorded so far, shared with the replay
+    values = {}
+
+    def __init__(self):
+        pass
+
+    def get_name(self):
+        return self.values.get("wifi.name", "wlan0")
+
+    def get_speed(self):
+        return self.values.get("wifi.speed", 0)
+
+    def get_state(self):
+        return self.values.get("wifi.state", self.WIFI_STATE_UNKNONW)
+
+
+class ReplayTelephonyAccess(TelephonyAccess):
+    """Telephony as last recorded in the trace being replayed"""
+
+    values = {}
+
+    def __init__(self):
+        pass
+
+    def get_network_type(self):
+        return self.values.get("telephony.network_type",
+                               self.NETWORK_TYPE_UNKNOWN)
+
+    def get_state(self):
+        return self.values.get("telephony.state", self.DATA_DISCONNECTED)
+
+    def get_phone_type(self):
+        return self.values.get("telephony.phone_type", self.PHONE_TYPE_NONE)
+
+    def get_operator_name(self):
+        return self.values.get("telephony.operator_name", "")
+
+
+class Replay(object):
+    """Replay of trace, a binary file, with files laid out under directory
+    root and powers logged to segments of log_file"""
+
+    # SystemInfo.PROC_DIR and UID_STATUS_MASK, before redirect()
+    PROC_DIR = "/proc"
+    UID_STATUS_MASK = "/proc/{0}/status"
+    # Values recorded by SystemInfo.get_uid_for_pid()
+    UID_FOR_PID_PREFIX = "uid_for_pid."
+    # Estimator log settings of replays, over those of the device: segments
+    # rolling over by age on the virtual clock or going over the size budget
+    # would lose records of long traces, and so would a writer dropping them
+    # when the replay outruns storage
+    LOG_SETTINGS = {
+        "LOG_SEGMENT_SIZE": None,
+        "LOG_SEGMENT_AGE": None,
+        "LOG_MAX_SIZE": None,
+        "LOG_POLICY": BackgroundWriter.BLOCK,
+    }
+
+    logger = logging.getLogger("Replay")
+
+    def __init__(self, trace, root, log_file, phone_class=BenchPhone):
+        self._root = root
+        self._reader = TraceReader(trace)
+        self._records = iter(self._reader)
+        self.iter_interval = self._reader.iter_interval
+        self.model_name = None
+        self._names = None
+
+        # { key : value } recorded so far, answering Android services
+        self._values = {}
+        ReplayWifiAccess.values = self._values
+        ReplayTelephonyAccess.values = self._values
+        # Names listed last in each directory: { path : set(names) }
+        self._listings = {}
+        # UIDs of PIDs, for status files of PIDs coming back: { pid : uid }
+        self._pid_uids = {}
+
+        # Inputs up to the first iteration include those monitors read when
+        # created
+        self._pending = self._next_iteration()
+        if self._pending is None:
+            raise ValueError("Trace holds no iteration")
+        if self._names is None:
+            raise ValueError("Trace holds no hardware of the phone")
+
+        self._restore = redirect(root)
+        fdcache.clear()
+        pidindex.clear()
+        ProcSnapshot._current = None
+
+        self._source = VirtualClock(0)
+        clock.set_source(self._source)
+
+        self._monitors = create_monitors(self._names, phone_class.constants,
+                                         ReplayWifiAccess,
+                                         ReplayTelephonyAccess)
+        replayed = set(monitor.monitor_name for monitor in self._monitors)
+        for name in self._names:
+            if name not in replayed:
+                self.logger.warn("Not replaying {0}, which only runs on "
+                                 "Android".format(name))
+
+        iter_num, timestamp, _ = self._pending
+        for monitor in self._monitors:
+            monitor.init(timestamp - iter_num * self.iter_interval,
+                         self.iter_interval)
+
+        settings = dict(self.LOG_SETTINGS, LOG_FILE=log_file)
+        saved = {name: getattr(PowerEstimator, name) for name in settings}
+        for name, value in settings.iteritems():
+            setattr(PowerEstimator, name, value)
+        try:
+            self.estimator = PowerEstimator(phone_class(self._monitors))
+        finally:
+            for name, value in saved.iteritems():
+                setattr(PowerEstimator, name, value)
+
+        self._scheduler = MonitorScheduler(self._monitors, self.iter_interval,
+                                           None,
+                                           self.estimator._process_iteration)
+        # Event queues by monitor name
+        self._queues = {monitor.monitor_name: monitor._events for monitor in
+                        self._monitors if hasattr(monitor, "_events")}
+
+    def close(self):
+        self.estimator._log.close()
+        self._restore()
+        fdcache.clear()
+        pidindex.clear()
+        ProcSnapshot._current = None
+
+    def _path(self, path):
+        """Return where absolute path lives under root"""
+        return self._root + path
+
+    def _apply_file(self, path, data):
+        path = self._path(path)
+        if data is not None:
+            write_file(path, data)
+        elif os.path.exists(path):
+            # File gone, e.g. its process ended
+            os.remove(path)
+            fdcache.invalidate(path)
+
+    def _apply_listdir(self, path, names):
+        names = set(names)
+        directory = self._path(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        for name in self._listings.get(path, set()) - names:
+            shutil.rmtree(os.path.join(directory, name), True)
+        for name in names:
+            entry = os.path.join(directory, name)
+            if not os.path.isdir(entry):
+                os.mkdir(entry)
+                # A PID reused by a process of the same UID has no new
+                # UID recorded
+                if path == self.PROC_DIR and name in self._pid_uids:
+                    self._write_status(name)
+
+        self._listings[path] = names
+
+    def _apply_value(self, key, value):
+        if key.startswith(self.UID_FOR_PID_PREFIX):
+            pid = key[len(self.UID_FOR_PID_PREFIX):]
+            self._pid_uids[pid] = value
+            self._write_status(pid)
+        else:
+            self._values[key] = value
+
+    def _write_status(self, pid):
+        write_file(self._path(self.UID_STATUS_MASK.format(pid)),
+                   STATUS_FORMAT.format(pid, self._pid_uids[pid]))
+
+    def _next_iteration(self):
+        """Apply inputs of next iteration. Return (iter_num, time, events) of
+        it or None at the end of the trace"""
+        events = []
+
+        for record in self._records:
+            type_ = record[0]
+
+            if type_ == TRACE_FILE:
+                self._apply_file(record[1], record[2])
+            elif type_ == TRACE_LISTDIR:
+                self._apply_listdir(record[1], record[2])
+            elif type_ == TRACE_VALUE:
+                self._apply_value(record[1], record[2])
+            elif type_ == TRACE_EVENT:
+                events.append(record[1:])
+            elif type_ == TRACE_HARDWARE:
+                self.model_name, self._names = record[1:]
+            elif type_ == TRACE_ITERATION:
+                return record[1], record[2], events
+
+        return None
+
+    def _run_iteration(self, iter_num, timestamp, events):
+        for queue_name, event_time, kind, args in events:
+            queue = self._queues.get(queue_name, None)
+            if queue is not None:
+                self._source.time = event_time
+                queue.push(kind, *args)
+
+        self._source.time = timestamp
+        self._scheduler.run_iteration(iter_num)
+
+    def run(self, iterations=None):
+        """Replay up to iterations, all the rest by default. Return
+        (iterations replayed, time they spanned in ms)"""
+        count = 0
+        start_time = None
+        end_time = None
+
+        while iterations is None or count < iterations:
+            if self._pending is not None:
+                iteration = self._pending
+                self._pending = None
+            else:
+                iteration = self._next_iteration()
+                if iteration is None:
+                    break
+
+            if start_time is None:
+                start_time = iteration[1]
+            end_time = iteration[1]
+
+            self._run_iteration(*iteration)
+            count += 1
+
+        if count == 0:
+            return 0, 0
+        return count, end_time - start_time + self.iter_interval
+
+
+def main(trace_path, log_file="replay.bin"):
+    root = tempfile.mkdtemp(prefix="powerreplay")
+
+    try:
+        with open(trace_path, "rb") as trace:
+            replay = Replay(trace, root, log_file)
+            try:
+                start = timeit.default_timer()
+                iterations, span = replay.run()
+                elapsed = timeit.default_timer() - start
+            finally:
+                replay.close()
+    finally:
+        shutil.rmtree(root)
+
+    print("{0} iterations of {1} replayed in {2:.1f} s, {3:.0f}x real "
+          "time".format(iterations, replay.model_name, elapsed,
+                        span / 1000.0 / elapsed if elapsed > 0 else 0))
+    print("Powers logged to {0}.*".format(log_file))
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    main(*sys.argv[1:])
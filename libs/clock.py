@@ -1,5 +1,120 @@
 #!/usr/bin/env python
 
-from jnius import autoclass
+"""
+Process-wide monotonic clock in milliseconds since boot.
 
-SystemClock = autoclass("android.os.SystemClock")
+Reading android.os.SystemClock goes through JNI, which is too expensive to do
+for every sample. The clock is read once per iteration with tick() and every
+monitor gets that cached timestamp from now(). CLOCK_BOOTTIME, the clock
+behind SystemClock.elapsedRealtime(), is read straight from libc when
+possible. The source can be swapped, e.g. for a VirtualClock in tests.
+"""
+
+__all__ = ['clock', 'Clock', 'VirtualClock']
+
+import ctypes
+import ctypes.util
+import threading
+import time
+
+try:
+    from jnius import autoclass
+except ImportError:
+    autoclass = None
+
+# From linux/time.h
+CLOCK_BOOTTIME = 7
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _get_boottime_source():
+    """Return function reading CLOCK_BOOTTIME in ms or None if it can't be
+    read"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so")
+        clock_gettime = libc.clock_gettime
+    except (OSError, AttributeError):
+        return None
+
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+    clock_gettime.restype = ctypes.c_int
+
+    def elapsed_realtime():
+        ts = _Timespec()
+        clock_gettime(CLOCK_BOOTTIME, ctypes.byref(ts))
+        return ts.tv_sec * 1000 + ts.tv_nsec // 1000000
+
+    # Kernel may not know the clock
+    if clock_gettime(CLOCK_BOOTTIME, ctypes.byref(_Timespec())) != 0:
+        return None
+
+    return elapsed_realtime
+
+
+def _get_default_source():
+    source = _get_boottime_source()
+    if source is not None:
+        return source
+
+    if autoclass is not None:
+        try:
+            return autoclass("android.os.SystemClock").elapsedRealtime
+        except Exception:
+            pass
+
+    # Not monotonic before Python 3.3, but better than nothing
+    now = getattr(time, "monotonic", time.time)
+    return lambda: int(now() * 1000)
+
+
+class Clock(object):
+    """Milliseconds clock with a cached now() refreshed by tick()"""
+
+    def __init__(self, source=None):
+        self._source = source if source is not None else _get_default_source()
+        self._lock = threading.Lock()
+        self._now = self._source()
+
+    def tick(self):
+        """Read the clock source. Its time is returned by now() until the next
+        tick. Time never goes back, even with ticks from several threads"""
+        now = self._source()
+
+        with self._lock:
+            if now > self._now:
+                self._now = now
+            return self._now
+
+    def now(self):
+        """Return time (ms) of last tick"""
+        return self._now
+
+    def elapsed_realtime(self):
+        """Return current time (ms) of the clock source, without caching"""
+        return self._source()
+
+    def set_source(self, source):
+        """Read time from source, a function returning ms, from now on"""
+        with self._lock:
+            self._source = source
+            self._now = source()
+
+
+class VirtualClock(object):
+    """Clock source whose time only moves when told to"""
+
+    def __init__(self, start=0):
+        self.time = start
+
+    def __call__(self):
+        return self.time
+
+    def advance(self, delta):
+        self.time += delta
+        return self.time
+
+
+clock = Clock()
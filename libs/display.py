@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 from jnius import autoclass
+from libs.profiler import profiler
 
 DisplayMetrics = autoclass('android.utils.DisplayMetrics')
 System = autoclass('android.provider.Settings$System')
@@ -22,5 +23,6 @@ class DisplayAccess(object):
 
     @staticmethod
     def get_brightness():
+        profiler.count_jni(2)
         return System.getInt(PythonActivity.mActivity.getContentResolver(),
                              System.SCREEN_BRIGHTNESS)
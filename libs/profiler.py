@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""
+Overhead of the monitor itself. Every monitor iteration runs under the
+profiler, which measures its wall and CPU time and how late it started. File
+opens, bytes read and JNI calls made meanwhile are counted by the code doing
+them, and land on the profile of the monitor running on the calling thread.
+Counting outside of an iteration, e.g. from callback threads, does nothing.
+"""
+
+__all__ = ['profiler', 'MonitorProfile', 'SelfProfiler']
+
+from bisect import bisect_right
+
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# From linux/resource.h, not exported by resource before Python 3.2
+RUSAGE_THREAD = 1
+
+
+def _get_thread_time_source():
+    """Return function reading CPU time (s) of the calling thread or None if
+    it can't be read"""
+    thread_time = getattr(time, "thread_time", None)
+    if thread_time is not None:
+        return thread_time
+
+    if resource is None:
+        return None
+
+    who = getattr(resource, "RUSAGE_THREAD", RUSAGE_THREAD)
+    try:
+        resource.getrusage(who)
+    except (ValueError, resource.error):
+        return None
+
+    def thread_time():
+        usage = resource.getrusage(who)
+        return usage.ru_utime + usage.ru_stime
+
+    return thread_time
+
+
+class MonitorProfile(object):
+    """Overhead of a monitor since it started. Times are in ms. lag_hist[i]
+    counts iterations that started between LAG_BOUNDS[i - 1] and
+    LAG_BOUNDS[i] ms late, the last bucket the ones later than that"""
+
+    __slots__ = ['iterations', 'wall_time', 'cpu_time', 'max_wall_time',
+                 'file_opens', 'bytes_read', 'jni_calls', 'lag_hist']
+
+    LAG_BOUNDS = (10, 50, 100, 250, 500, 1000)
+
+    def __init__(self):
+        self.iterations = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.max_wall_time = 0.0
+        self.file_opens = 0
+        self.bytes_read = 0
+        self.jni_calls = 0
+        self.lag_hist = [0] * (len(self.LAG_BOUNDS) + 1)
+
+    def add_iteration(self, lag, wall_time, cpu_time):
+        self.iterations += 1
+        self.wall_time += wall_time
+        self.cpu_time += cpu_time
+        if wall_time > self.max_wall_time:
+            self.max_wall_time = wall_time
+        self.lag_hist[bisect_right(self.LAG_BOUNDS, lag)] += 1
+
+    def copy(self):
+        profile = MonitorProfile()
+        for name in self.__slots__:
+            setattr(profile, name, getattr(self, name))
+        profile.lag_hist = list(self.lag_hist)
+        return profile
+
+
+class SelfProfiler(object):
+    """Profiles of all monitors, by monitor name. Each profile is only
+    updated by the thread running its monitor, so that updates take no lock.
+    Readers may see figures an iteration apart"""
+
+    def __init__(self, wall_time_source=None, thread_time_source=None):
+        self._wall_time = (wall_time_source if wall_time_source is not None
+                           else time.time)
+        self._thread_time = (thread_time_source if thread_time_source is not
+                             None else _get_thread_time_source())
+        # { monitor name : MonitorProfile }
+        self._profiles = {}
+        self._lock = threading.Lock()
+        # Profile of the iteration running on each thread
+        self._local = threading.local()
+
+    def get_profile(self, name):
+        profile = self._profiles.get(name, None)
+        if profile is None:
+            with self._lock:
+                profile = self._profiles.setdefault(name, MonitorProfile())
+        return profile
+
+    def get_profiles(self):
+        """Return copy of profiles as { monitor name : MonitorProfile }"""
+        with self._lock:
+            profiles = self._profiles.items()
+        return {name: profile.copy() for name, profile in profiles}
+
+    def run(self, name, lag, function, *args):
+        """Return function(*args), profiled as an iteration of monitor name
+        that started lag ms late"""
+        profile = self.get_profile(name)
+        local = self._local
+        # Iterations may nest, e.g. a monitor wrapping another
+        outer = getattr(local, "profile", None)
+        local.profile = profile
+
+        thread_time = self._thread_time
+        cpu_start = thread_time() if thread_time is not None else 0
+        wall_start = self._wall_time()
+
+        try:
+            return function(*args)
+        finally:
+            wall_time = (self._wall_time() - wall_start) * 1000
+            cpu_time = ((thread_time() - cpu_start) * 1000 if thread_time is
+                        not None else 0)
+            profile.add_iteration(lag, wall_time, cpu_time)
+            local.profile = outer
+
+    def count_open(self, count=1):
+        profile = getattr(self._local, "profile", None)
+        if profile is not None:
+            profile.file_opens += count
+
+    def count_read(self, nbytes):
+        profile = getattr(self._local, "profile", None)
+        if profile is not None and nbytes > 0:
+            profile.bytes_read += nbytes
+
+    def count_jni(self, count=1):
+        profile = getattr(self._local, "profile", None)
+        if profile is not None:
+            profile.jni_calls += count
+
+    def reset(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profiler = SelfProfiler()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 from jnius import autoclass
+from libs.profiler import profiler
 
 PythonActivity = autoclass('org.renpy.android.PythonActivity')
 Context = autoclass('android.content.Context')
@@ -15,4 +16,5 @@ class ResourceAccess(object):
             PythonActivity.mActivity.getSystemService(Context.ACTIVITY_SERVICE)
 
     def get_running_apps(self):
+        profiler.count_jni(2)
         return self.activity_manager.getRunningAppProcesses().toArray()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+from libs.profiler import profiler
+
+try:
+    from jnius import autoclass
+except ImportError:
+    # Off Android, e.g. in benchmarks. Settings read as the Android defaults
+    autoclass = None
+
+if autoclass is not None:
+    System = autoclass('android.provider.Settings$System')
+    PythonActivity = autoclass('org.renpy.android.PythonActivity')
+else:
+    System = None
+    PythonActivity = None
+
+
+class Settings(object):
+    # From android.provider.Settings.System
+    SCREEN_BRIGHTNESS_MODE_MANUAL = 0
+    SCREEN_BRIGHTNESS_MODE_AUTOMATIC = 1
+
+    # Defaults of frameworks/base/packages/SettingsProvider
+    DEFAULT_BRIGHTNESS_MODE = SCREEN_BRIGHTNESS_MODE_MANUAL
+    DEFAULT_BRIGHTNESS = 102
+    DEFAULT_TIMEOUT = 60000     # ms
+
+    @classmethod
+    def _get_int(cls, name, default):
+        if System is None:
+            return default
+
+        profiler.count_jni(2)
+        return System.getInt(PythonActivity.mActivity.getContentResolver(),
+                             getattr(System, name), default)
+
+    @classmethod
+    def get_display_brightness_mode(cls):
+        """Return SCREEN_BRIGHTNESS_MODE_MANUAL or _AUTOMATIC"""
+        return cls._get_int("SCREEN_BRIGHTNESS_MODE",
+                            cls.DEFAULT_BRIGHTNESS_MODE)
+
+    @classmethod
+    def get_display_brightness(cls):
+        """Return screen brightness, from 0 to 255"""
+        return cls._get_int("SCREEN_BRIGHTNESS", cls.DEFAULT_BRIGHTNESS)
+
+    @classmethod
+    def get_display_timeout(cls):
+        """Return time (ms) before the screen goes off"""
+        return cls._get_int("SCREEN_OFF_TIMEOUT", cls.DEFAULT_TIMEOUT)
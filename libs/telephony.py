@@ -1,10 +1,19 @@
 #!/usr/bin/env python
 
-from jnius import autoclass
+from libs.profiler import profiler
+from utils.trace import tracer
 
-TelephonyManager = autoclass('android.telephony.TelephonyManager')
-PythonActivity = autoclass('org.renpy.android.PythonActivity')
-Context = autoclass('android.content.Context')
+try:
+    from jnius import autoclass
+except ImportError:
+    # Off Android, TelephonyAccess can't be instantiated but its constants
+    # remain
+    autoclass = None
+
+if autoclass is not None:
+    TelephonyManager = autoclass('android.telephony.TelephonyManager')
+    PythonActivity = autoclass('org.renpy.android.PythonActivity')
+    Context = autoclass('android.content.Context')
 
 
 class TelephonyAccess(object):
@@ -47,13 +56,21 @@ class TelephonyAccess(object):
             Context.TELEPHONY_SERVICE)
 
     def get_network_type(self):
-        return self.telephony_manager.getNetworkType()
+        profiler.count_jni()
+        return tracer.traced("telephony.network_type",
+                             self.telephony_manager.getNetworkType())
 
     def get_state(self):
-        return self.telephony_manager.getDataState()
+        profiler.count_jni()
+        return tracer.traced("telephony.state",
+                             self.telephony_manager.getDataState())
 
     def get_phone_type(self):
-        return self.telephony_manager.getPhoneType()
+        profiler.count_jni()
+        return tracer.traced("telephony.phone_type",
+                             self.telephony_manager.getPhoneType())
 
     def get_operator_name(self):
-        return self.telephony_manager.getNetworkOperatorName()
+        profiler.count_jni()
+        return tracer.traced("telephony.operator_name",
+                             self.telephony_manager.getNetworkOperatorName())
@@ -1,10 +1,18 @@
 #!/usr/bin/env python
 
-from jnius import autoclass
+from libs.profiler import profiler
+from utils.trace import tracer
 
-PythonActivity = autoclass('org.renpy.android.PythonActivity')
-SystemProperties = autoclass('android.os.SystemProperties')
-Context = autoclass('android.content.Context')
+try:
+    from jnius import autoclass
+except ImportError:
+    # Off Android, WifiAccess can't be instantiated but its constants remain
+    autoclass = None
+
+if autoclass is not None:
+    PythonActivity = autoclass('org.renpy.android.PythonActivity')
+    SystemProperties = autoclass('android.os.SystemProperties')
+    Context = autoclass('android.content.Context')
 
 
 class WifiAccess(object):
@@ -22,14 +30,16 @@ class WifiAccess(object):
             Context.WIFI_SERVICE)
 
     def get_name(self):
-        return SystemProperties.get("wifi.interface")
+        profiler.count_jni()
+        return tracer.traced("wifi.name",
+                             SystemProperties.get("wifi.interface"))
 
     def get_speed(self):
+        profiler.count_jni(2)
         wifi_info = self.wifi_manager.getConnectionInfo()
-        if wifi_info:
-            return wifi_info.getLinkSpeed()
-
-        return 0
+        speed = wifi_info.getLinkSpeed() if wifi_info else 0
+        return tracer.traced("wifi.speed", speed)
 
     def get_state(self):
-        return self.wifi_manager.getWifiState()
+        profiler.count_jni()
+        return tracer.traced("wifi.state", self.wifi_manager.getWifiState())
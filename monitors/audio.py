@@ -6,11 +6,10 @@ from libs.audio import AudioAccess
 from monitors.devicemonitor import DeviceMonitor
 from services.iterationdata import IterationData
 from services.usagedata import UsageData
+from utils.eventqueue import EventQueue
 from utils.hardware import Hardware
 from utils.systeminfo import SystemInfo
 
-import threading
-
 
 class Audio(DeviceMonitor):
     AudioProxy = AudioAccess()
@@ -19,9 +18,9 @@ class Audio(DeviceMonitor):
         super(Audio, self).__init__(Hardware.AUDIO, devconstants)
 
         self._uid_states = {}
-        self._uid_usage = None
-        self._uidstate_lock = threading.Lock()
         self._sys_uid = None
+        # Media events wait here until next iteration folds them
+        self._events = EventQueue(self.monitor_name)
 
         callbacks = {
             NotificationProxy.ON_SYSTEM_MEDIA_CALL: self.__on_system_media_call,
@@ -40,41 +39,53 @@ class Audio(DeviceMonitor):
             self._event_server.remove_hook()
         super(Audio, self)._on_exit()
 
+    # Called from binder threads: just queue the event and return. Order
+    # matters, as a system media call tells who the next system media is for
+
     def __on_system_media_call(self, uid):
-        self._sys_uid = uid
+        self._events.push(NotificationProxy.ON_SYSTEM_MEDIA_CALL, uid)
 
     def __on_start_media(self, uid, id_):
-        uid_usage = MediaUsage(uid, id_)
-        if (uid == SystemInfo.AID_SYSTEM) and (self._sys_uid is not None):
-            uid_usage.proxy_uid = self._sys_uid
-            self._sys_uid = None
-        else:
-            uid_usage.proxy_uid = uid
-        with self._uidstate_lock:
-            # Act like a treeset. Just insert, but don't update
-            self._uid_states.setdefault(uid, uid_usage)
+        self._events.push(NotificationProxy.ON_START_MEDIA, uid, id_)
 
     def __on_stop_media(self, uid, id_):
-        with self._uidstate_lock:
-            del (self._uid_states[uid])
+        self._events.push(NotificationProxy.ON_STOP_MEDIA, uid, id_)
+
+    def fold_events(self, events):
+        """ Update media states with events, as (timestamp, kind, args)
+        tuples, in the order they happened """
+        for timestamp, kind, args in events:
+            uid = args[0]
+
+            if kind == NotificationProxy.ON_SYSTEM_MEDIA_CALL:
+                self._sys_uid = uid
+            elif kind == NotificationProxy.ON_START_MEDIA:
+                uid_usage = MediaUsage(uid, args[1])
+                if ((uid == SystemInfo.AID_SYSTEM) and
+                        (self._sys_uid is not None)):
+                    uid_usage.proxy_uid = self._sys_uid
+                    self._sys_uid = None
+                else:
+                    uid_usage.proxy_uid = uid
+                # Act like a treeset. Just insert, but don't update
+                self._uid_states.setdefault(uid, uid_usage)
+            elif kind == NotificationProxy.ON_STOP_MEDIA:
+                self._uid_states.pop(uid, None)
 
     def calc_iteration(self, iter_num):
         """ Return power usage of each application using audio after one
         iteration. """
         result = IterationData()
 
-        audio_on = (self._uid_usage is not None and len(self._uid_states) !=
-                    0) or (self.AudioProxy.is_music_active())
-        result.set_sys_usage(AudioUsage(audio_on))
+        self.fold_events(self._events.drain())
 
-        if self._uid_usage is not None:
-            with self._uidstate_lock:
-                uid = -1
+        audio_on = (len(self._uid_states) != 0 or
+                    self.AudioProxy.is_music_active())
+        result.set_sys_usage(AudioUsage(audio_on))
 
-                for usage in self._uid_usage.values():
-                    if usage.uid != uid:
-                        result.set_uid_usage(usage.proxy_uid, AudioUsage(True))
-                    uid = usage.uid
+        # One media usage per UID
+        for usage in self._uid_states.itervalues():
+            result.set_uid_usage(usage.proxy_uid, AudioUsage(True))
 
         return result
 
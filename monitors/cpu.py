@@ -1,12 +1,18 @@
 #!/usr/bin/env python
 
 from __future__ import division
+from libs.profiler import profiler
 from monitors.devicemonitor import DeviceMonitor
 from services.iterationdata import IterationData
 from services.usagedata import UsageData
+from utils.fdcache import fdcache
 from utils.hardware import Hardware
+from utils.pidindex import pidindex
+from utils.procsnapshot import ProcSnapshot
 from utils.systeminfo import SystemInfo
 
+import heapq
+
 
 class CPU(DeviceMonitor):
     TAG_MASK = Hardware.CPU + "{0}"
@@ -15,11 +21,13 @@ class CPU(DeviceMonitor):
     SYSFS_FREQ_FILE_MASK =\
         "/sys/devices/system/cpu/cpu{0}/cpufreq/scaling_cur_freq"
 
-    def __init__(self, devconstants, num=0):
+    def __init__(self, devconstants, num=0, scheduler=None):
         super(CPU, self).__init__(self.TAG_MASK.format(num), devconstants)
 
         self._state = CPUState(SystemInfo.AID_ALL)
         self._pid_states = {}
+        self._scheduler = (scheduler if scheduler is not None else
+                           CPUPollScheduler())
         self._uid_states = {}
         self.num = num
         self.cpufreq_file = self.SYSFS_FREQ_FILE_MASK.format(num)
@@ -37,7 +45,9 @@ class CPU(DeviceMonitor):
             self.logger.warn("Failed to read CPU frequency")
             return result
 
-        times = SystemInfo.get_usr_sys_total_times(self.num)
+        # All cores share the same view of /proc for this iteration
+        snapshot = ProcSnapshot.get(iter_num)
+        times = snapshot.get_cpu_times(self.num)
 
         if len(times) == 0:
             self.logger.warn("Failed to read CPU times")
@@ -59,62 +69,88 @@ class CPU(DeviceMonitor):
         # CPU usage is returned by Linux using process ID.
         # A UID can have many processes and our final result should be based on
         # UID (app), therefore we need to account for all processes referring
-        # to the same UID
-        self._uid_states.clear()
-        pids = SystemInfo.get_running_pids()
+        # to the same UID. UID states are kept between iterations and reset
+        # the first time one of their processes is accounted for
+        delta_total = self._state.get_delta_total()
+
+        # Processes that are still running: [(pid, state)]
+        running = []
+
+        for pid in snapshot.pids:
+            pid_state = self._pid_states.get(pid, None)
+
+            # New process that hasn't been registered yet by our monitor. Its
+            # UID is only known once it gets read
+            if pid_state is None:
+                pid_state = PidState()
+                self._pid_states[pid] = pid_state
+
+            running.append((pid, pid_state))
 
-        if pids is not None:
-            for i, pid in enumerate(pids):
-                if pid < 0:
-                    break
+        # Only part of the processes get read this iteration
+        polled = self._scheduler.select(running, iter_num)
 
-                pid_state = self._pid_states.get(pid, None)
+        for pid, pid_state in running:
+            if pid in polled:
+                times = snapshot.get_pid_times(pid)
 
-                # New process that hasn't been registered yet by our monitor
-                if not pid_state:
-                    uid = SystemInfo.get_uid_for_pid(pid)
+                if len(times) == 0:
+                    # Process exited since the snapshot was taken
+                    continue
 
-                    if uid >= 0:
-                        self._pid_states[pid] = CPUState(uid)
-                    else:
+                start_time = times[SystemInfo.INDEX_START_TIME]
+
+                # First read of the process or PID reused by another one
+                if start_time != pid_state.start_time:
+                    uid = pidindex.get_uid(pid, start_time)
+
+                    if uid < 0:
                         # Assume process no longer exists
                         continue
 
-                if pid_state.is_stale(iter_num):
-                    # Nothing much is going on with this PID recently. We'll
-                    # just assume that it's not using any of the CPU for this
-                    # iteration
-                    pid_state.skip_update(iter_num, total_time)
-                else:
-                    times = SystemInfo.get_pid_usr_sys_times(pid)
+                    pid_state = PidState(uid, start_time)
+                    self._pid_states[pid] = pid_state
 
-                    if len(times) > 0:
-                        usr_time = times[SystemInfo.INDEX_USR_TIME]
-                        sys_time = times[SystemInfo.INDEX_SYS_TIME]
+                # Update slice of time used by this process based on global
+                # iteration time. Time used while it wasn't polled gets
+                # charged now
+                pid_state.update(times[SystemInfo.INDEX_USR_TIME],
+                                 times[SystemInfo.INDEX_SYS_TIME], total_time,
+                                 iter_num)
+            else:
+                # Nothing much is going on with this PID recently. We'll
+                # just assume that it's only using what is left to charge
+                # from previous iterations
+                pid_state.skip_update(iter_num, total_time)
 
-                        # Update slice of time used by this process based on
-                        # global iteration time
-                        pid_state.update(usr_time, sys_time, total_time,
-                                         iter_num)
+            if not init or pid_state.uid is None:
+                continue
 
-                        if not init:
-                            continue
+            uid_state = self._uid_states.get(pid_state.uid, None)
 
-                uid_state = self._uid_states.get(pid_state.uid, None)
+            # Register new UID if it doesn't exist. Then absorb power data
+            # from its respective process
+            if uid_state is None:
+                uid_state = CPUState(pid_state.uid)
+                self._uid_states[pid_state.uid] = uid_state
 
-                # Register new UID if it doesn't exist. Else absorb power data
-                # from its respective process
-                if uid_state is not None:
-                    self._uid_states[pid_state.uid] = pid_state
-                else:
-                    uid_state.absorb(pid_state)
+            if not uid_state.is_alive(iter_num):
+                uid_state.reset(iter_num, delta_total)
+
+            uid_state.absorb(pid_state)
 
         # Remove processes that are no longer active
-        self._pid_states = {k: v for k, v in self._pid_states.iteritems() if
-                            self._pid_states[k].is_alive(iter_num)}
+        self._pid_states = {pid: pid_state for pid, pid_state in
+                            self._pid_states.iteritems() if
+                            pid_state.is_alive(iter_num)}
+
+        # Collect the summed UID information. UIDs left without processes
+        # are dropped
+        for uid, uid_state in self._uid_states.items():
+            if not uid_state.is_alive(iter_num):
+                del self._uid_states[uid]
+                continue
 
-        # Collect the summed UID information
-        for k, v in self._uid_states.iteritems():
             uid_usage = self._get_cpu_usage(uid_state.get_usr_perc(),
                                             uid_state.get_sys_perc(), freq)
             result.set_uid_usage(uid, uid_usage)
@@ -154,18 +190,17 @@ class CPU(DeviceMonitor):
         cannot be determined, return 0.
         """
 
-        # Try to read from /sys/devices file first
-        try:
-            with open(self.cpufreq_file, 'r') as fp:
-                freq_khz = fp.read().strip()
-            if freq_khz.isdigit():
-                return int(freq_khz) // 1000
-        except (IOError, ValueError), (errno, strerror):
-            pass
+        # Try to read from /sys/devices file first. It is kept open as it is
+        # read on every iteration
+        freq_khz = fdcache.read_int(self.cpufreq_file)
+        if freq_khz >= 0:
+            return freq_khz // 1000
 
         try:
+            profiler.count_open()
             with open(self.CPUINFO_FILE, 'r') as fp:
                 data = fp.readlines()
+                profiler.count_read(sum(len(line) for line in data))
                 # Core frequency at every 3 lines
                 freq_line = 3 * (self.num + 1)
                 if data[freq_line - 1].startswith("BogoMIPS"):
@@ -187,6 +222,18 @@ class CPUUsage(UsageData):
         self._usr_perc = usr_perc
         self._freq = freq
 
+    @property
+    def sys_perc(self):
+        return self._sys_perc
+
+    @property
+    def usr_perc(self):
+        return self._usr_perc
+
+    @property
+    def freq(self):
+        return self._freq
+
     def log(self, out):
         """ Raises IOError error if output stream can't be written
         """
@@ -195,7 +242,9 @@ class CPUUsage(UsageData):
 
 
 class CPUState(object):
-    __slots__ = ['_iteration', '_inactive_iters']
+    __slots__ = ['uid', '_last_usr', '_last_sys', '_last_total', '_delta_usr',
+                 '_delta_sys', '_delta_total', '_carry_usr', '_carry_sys',
+                 '_last_update', '_iteration', '_inactive_iters']
 
     def __init__(self, uid):
         self.uid = uid
@@ -206,6 +255,9 @@ class CPUState(object):
         self._delta_usr = 0
         self._delta_sys = 0
         self._delta_total = 1
+        # Time used that didn't fit in the iteration it was read in
+        self._carry_usr = 0
+        self._carry_sys = 0
         self._last_update = 0   # iteration number
         self._iteration = 0     # current iteration number
         self._inactive_iters = 0
@@ -216,34 +268,71 @@ class CPUState(object):
     def skip_update(self, iteration, total_time):
         """ Process is still running but we skip reading the CPU utilization
         for this iteration to avoid wasting CPU cycles as this process has not
-        been very active lately
+        been very active lately. Time left over from the last read is charged
+        instead
         """
-        self._delta_usr = 0
-        self._delta_sys = 0
         self._delta_total = total_time - self._last_total
         if self._delta_total < 1:
             self._delta_total = 1
         self._last_total = total_time
         self._iteration = iteration
 
+        self._charge(self._carry_usr, self._carry_sys)
+
     def update(self, usr_time, sys_time, total_time, iteration):
-        # This will directly increase the delta by one second at the first run
-        self._delta_usr = usr_time - self._last_usr
-        self._delta_sys = sys_time - self._last_sys
         self._delta_total = total_time - self._last_total
-
         if self._delta_total < 1:
             self._delta_total = 1
-        self._last_usr = usr_time
-        self._last_sys = sys_time
         self._last_total = total_time
         self._last_update = self._iteration = iteration
 
-        if self.get_usr_perc() + self.get_sys_perc() < 0.1:
+        if not self.is_initialized():
+            # First read only sets the baseline. Time used before the process
+            # was seen is not charged
+            self._last_usr = usr_time
+            self._last_sys = sys_time
+            self._delta_usr = 0
+            self._delta_sys = 0
+            return
+
+        # Deltas span all iterations skipped since the last read
+        delta_usr = usr_time - self._last_usr
+        delta_sys = sys_time - self._last_sys
+        self._last_usr = usr_time
+        self._last_sys = sys_time
+
+        if delta_usr + delta_sys == 0:
             self._inactive_iters += 1
         else:
             self._inactive_iters = 0
 
+        self._charge(self._carry_usr + delta_usr, self._carry_sys + delta_sys)
+
+    def _charge(self, usr, sys):
+        """ Charge usr and sys time to current iteration. Whatever exceeds the
+        iteration time is carried over to the following ones, so that time
+        used while the process was not being read is not lost
+        """
+        used = usr + sys
+
+        if used > self._delta_total:
+            scale = self._delta_total / used
+            self._delta_usr = usr * scale
+            self._delta_sys = sys * scale
+        else:
+            self._delta_usr = usr
+            self._delta_sys = sys
+
+        self._carry_usr = usr - self._delta_usr
+        self._carry_sys = sys - self._delta_sys
+
+    def reset(self, iteration, delta_total):
+        """ Clear accumulated data to start absorbing a new iteration """
+        self._delta_usr = 0
+        self._delta_sys = 0
+        self._delta_total = delta_total
+        self._iteration = iteration
+
     def absorb(self, state):
         """ Accumulate state data """
         self._delta_usr += state._delta_usr
@@ -259,9 +348,98 @@ class CPUState(object):
         return (100.0 * self._delta_sys / max(self._delta_usr + self._delta_sys,
                                               self._delta_total))
 
+    def get_delta_total(self):
+        """ Total time elapsed in last iteration """
+        return self._delta_total
+
+    def get_last_update(self):
+        """ Iteration number of last time CPU times were read """
+        return self._last_update
+
+    def get_inactive_iters(self):
+        """ Number of consecutive reads with no CPU time used """
+        return self._inactive_iters
+
     def is_alive(self, iteration):
         return self._iteration == iteration
 
-    def is_stale(self, iteration):
-        return (1 << (iteration - self._last_update) > (self._inactive_iters
-                                                        * self._inactive_iters))
+
+class PidState(CPUState):
+    """ CPU state of a process. Start time tells it apart from processes
+    that ran with the same PID before. Both are unknown until the process is
+    first read """
+    __slots__ = ['start_time']
+
+    def __init__(self, uid=None, start_time=None):
+        super(PidState, self).__init__(uid)
+        self.start_time = start_time
+
+
+class CPUPollScheduler(object):
+    """ Choose which processes get their /proc/<pid>/stat read on an
+    iteration. Processes are kept in hot, warm and cold tiers according to how
+    many consecutive reads showed them idle, and each tier is read once every
+    period iterations. No more than read_budget files are read per iteration;
+    when more are due, the ones most overdue relative to their period win,
+    so cold processes are not starved by busy ones.
+    Time used by a process while it is not read is charged back by CPUState
+    once it is read again.
+    """
+
+    TIER_HOT = 0
+    TIER_WARM = 1
+    TIER_COLD = 2
+
+    # Polling period in iterations of each tier
+    DEFAULT_PERIODS = (1, 4, 16)
+    # Idle reads before moving to warm and cold tiers
+    DEFAULT_WARM_AFTER = 2
+    DEFAULT_COLD_AFTER = 8
+    # Max stat files read per iteration
+    DEFAULT_READ_BUDGET = 100
+
+    def __init__(self, periods=DEFAULT_PERIODS,
+                 read_budget=DEFAULT_READ_BUDGET,
+                 warm_after=DEFAULT_WARM_AFTER,
+                 cold_after=DEFAULT_COLD_AFTER):
+        if len(periods) != 3 or min(periods) < 1:
+            raise ValueError("Expected 3 polling periods of at least 1")
+        if read_budget < 1:
+            raise ValueError("Read budget must be at least 1")
+
+        self._periods = tuple(periods)
+        self._read_budget = read_budget
+        self._warm_after = warm_after
+        self._cold_after = cold_after
+
+    def get_tier(self, state):
+        inactive_iters = state.get_inactive_iters()
+
+        if inactive_iters >= self._cold_after:
+            return self.TIER_COLD
+        if inactive_iters >= self._warm_after:
+            return self.TIER_WARM
+        return self.TIER_HOT
+
+    def select(self, running, iter_num):
+        """ Return set of PIDs to read from [(pid, state)] on iteration
+        iter_num """
+        # [(priority, pid)]
+        due = []
+
+        for pid, state in running:
+            if not state.is_initialized():
+                # Baseline of new processes is read first
+                due.append((float("inf"), pid))
+                continue
+
+            age = iter_num - state.get_last_update()
+            period = self._periods[self.get_tier(state)]
+
+            if age >= period:
+                due.append((age / period, pid))
+
+        if len(due) > self._read_budget:
+            due = heapq.nlargest(self._read_budget, due)
+
+        return set(pid for _, pid in due)
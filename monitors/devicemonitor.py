@@ -1,15 +1,24 @@
 #!/usr/bin/env python
 
-from libs.clock import SystemClock
+from __future__ import division
+
+from libs.clock import clock
+from libs.profiler import profiler
+
 import logging
 import threading
-import time
 
 
 class DeviceMonitor(threading.Thread):
     __slots__ = ["_constants", "has_uid_information"]
 
+    DEFAULT_ITER_INTERVAL = 1000    # 1 second
+    # Iterations of data kept for get_data(). A reader falling behind can
+    # catch up on as many iterations
+    DATA_SLOTS = 8
+
     def __init__(self, monitor_name, devconstants):
+        super(DeviceMonitor, self).__init__(target=self._run)
         self.daemon = True
 
         self.has_uid_information = False
@@ -18,59 +27,83 @@ class DeviceMonitor(threading.Thread):
         self.logger = logging.getLogger(monitor_name)
         self._stop = threading.Event()
 
-        super(DeviceMonitor, self).__init__(target=self._run)
-        self._data_lock = threading.Lock()
+        self._start_time = None
+        # Iterations between runs, as set by MonitorScheduler. Data is only
+        # published on iterations multiple of it
+        self.period = 1
         #self.start()
 
-    def _prepare(self, iter_interval=1):
-        """ Called once at the beginning of the daemon loop. """
-        self._start_time = SystemClock.elapsedRealtime()
-        self._iter_interval = iter_interval # Every second
-
-        # Iteration-data buffers for cycling during data collection
-        self._data1 = None
-        self._data2 = None
-        self._iter1 = -1
-        self._iter2 = -1
+    def init(self, start_time, iter_interval=DEFAULT_ITER_INTERVAL):
+        """ Called once before the first iteration, either by the daemon loop
+        or by whoever drives calc_iteration() instead. Iteration n starts
+        at start_time + n * iter_interval (ms) """
+        self._start_time = start_time
+        self._iter_interval = iter_interval
+
+        # Ring of (iter_num, data, span) published, iteration n going to
+        # slot n % DATA_SLOTS. Written by a single producer and read by a
+        # single consumer: storing a slot is atomic, so no lock is needed
+        self._slots = [None] * self.DATA_SLOTS
+        # Last iteration calc_iteration() ran on
+        self._last_iter = -1
+
+    def publish(self, iter_num, data):
+        """ Make data of iteration available to get_data(). Data covers every
+        iteration since the last one published, including those skipped when
+        calc_iteration() overran or the monitor runs every few iterations """
+        if self._last_iter >= 0:
+            span = iter_num - self._last_iter
+        else:
+            span = 1
+        self._last_iter = iter_num
+
+        if data is None:
+            return
+
+        self._slots[iter_num % self.DATA_SLOTS] = (iter_num, data, span)
 
     def _run(self):
         """ Runs the daemon loop that collects data for this monitor."""
 
-        # Hands off to client class to actually calculate the information we
-        # want for this monitor
+        if self._start_time is None:
+            self.init(clock.tick())
 
         iter_num = 0
-        self._prepare()
 
         while not self.is_stopped():
-            data = self.calc_iteration(iter_num)
-            if data is not None:
-                with self._data_lock:
-                    if self._iter1 < self._iter2:
-                        self._iter1 = iter_num
-                        self._data1 = data
-                    else:
-                        self._iter2 = iter_num
-                        self._data2 = data
-
-            if not self.is_stopped():
+            clock.tick()
+            # Hands off to client class to actually calculate the information
+            # we want for this monitor
+            self.publish(iter_num, self.profile_iteration(iter_num))
+
+            if self.is_stopped():
                 break
 
-            now = SystemClock.elapsedRealtime()
+            now = clock.tick()
             # Compute the next iteration that we can make the start of
             prev_iter = iter_num
-            iter_num = max((iter_num + 1), 1 + (now - self._start_time) /
+            iter_num = max((iter_num + 1), 1 + (now - self._start_time) //
                            self._iter_interval)
 
             if prev_iter + 1 != iter_num:
+                # Data of next iteration covers the skipped ones
                 self.logger.warn("Had to skip iteration {0} to "
                                  "{1}".format(prev_iter, iter_num))
 
-            # Sleep until next iteration completes
-            time.sleep(self._start_time + iter_num * self._iter_interval - now)
+            # Sleep until next iteration starts
+            self._stop.wait((self._start_time + iter_num * self._iter_interval
+                             - now) / 1000)
 
         self._on_exit()
 
+    def profile_iteration(self, iter_num):
+        """ Run calc_iteration() under the self profiler, see libs.profiler.
+        Iteration lag is taken from the last clock tick """
+        lag = clock.now() - (self._start_time + iter_num *
+                             self._iter_interval)
+        return profiler.run(self.monitor_name, lag, self.calc_iteration,
+                            iter_num)
+
     def stop(self):
         self._stop.set()
 
@@ -91,27 +124,32 @@ class DeviceMonitor(threading.Thread):
         """
         raise NotImplementedError
 
+    def is_due(self, iter_num):
+        """ Whether the monitor runs on iteration iter_num """
+        return iter_num % self.period == 0
+
     def get_data(self, iter_num):
-        """ Returns data point for given iteration. Method should be called
-        with a strictly increasing iteration parameter
+        """ Returns data point for given iteration, None if it was never
+        published or is more than DATA_SLOTS iterations old
 
         Integer -> Data
         """
-        with self._data_lock:
-            ret = None
-            if iter_num == self._iter1:
-                ret = self._data1
-            if iter_num == self._iter2:
-                ret = self._data2
-
-            if self._iter1 <= iter_num:
-                self._data1 = None
-                self._iter1 = -1
-            if self._iter2 <= iter_num:
-                self._data2 = None
-                self._iter2 = -1
-
-        if not ret:
-            self.logger.warn("Could not find data for requested iteration")
-
-        return ret
+        return self.get_data_span(iter_num)[0]
+
+    def get_data_span(self, iter_num):
+        """ Returns data point for given iteration along with the number of
+        iterations it covers, up to and including iter_num. Usages are
+        averages over those iterations. (None, 0) if there is no data, which
+        is only worth a warning on iterations the monitor is due
+
+        Integer -> (Data, Integer)
+        """
+        slot = self._slots[iter_num % self.DATA_SLOTS]
+
+        if slot is None or slot[0] != iter_num:
+            if self.is_due(iter_num):
+                self.logger.warn("Could not find data for iteration "
+                                 "{0}".format(iter_num))
+            return None, 0
+
+        return slot[1], slot[2]
@@ -2,7 +2,7 @@
 
 from __future__ import division
 
-from libs.clock import SystemClock
+from libs.clock import clock
 from libs.gps import GPSListener
 from libs.notification import NotificationProxy
 from libs.sdk import Build
@@ -10,11 +10,11 @@ from libs.sdk import Build
 from monitors.devicemonitor import DeviceMonitor
 from services.iterationdata import IterationData
 from services.usagedata import UsageData
+from utils.eventqueue import EventQueue
 from utils.hardware import Hardware
 from utils.systeminfo import SystemInfo
 
 import logging
-import threading
 
 
 class GPS(DeviceMonitor):
@@ -40,20 +40,23 @@ class GPS(DeviceMonitor):
     POWER_STATE_ON = 2
     NPOWER_STATES = 3
 
+    # Kind of queued GPS status listener events, next to NotificationProxy
+    # event kinds
+    EVENT_GPS_STATUS = 0
+
     def __init__(self, devconstants):
         super(GPS, self).__init__(Hardware.GPS, devconstants)
         self._uid_states = {}
         self._sleep_time = round(1000 * devconstants.GPS_SLEEP_TIME)
-        self._update_time = 0
         self._hook_method = 0
         self._statekeeper = None
-        self._status = None
+        self._num_satellites = 0
 
         self._setup_gps_hook()
 
-        self._uidstates_lock = threading.Lock()
-        self._statekeeper_lock = threading.Lock()
-        self._gpsstatus_lock = threading.Lock()
+        # Events from listener and notifications wait here until next
+        # iteration folds them
+        self._events = EventQueue(self.monitor_name)
 
         # Track physical state
         self._statekeeper = GPSState(self._hook_method, self._sleep_time)
@@ -69,7 +72,7 @@ class GPS(DeviceMonitor):
             NotificationProxy.ON_START_WAKELOCK: self.__on_start_wakelock,
             NotificationProxy.ON_STOP_WAKELOCK: self.__on_stop_wakelock,
             NotificationProxy.ON_START_GPS: self.__on_start_gps,
-            NotificationProxy.ON_STOP_GPS: self.__on_start_gps,
+            NotificationProxy.ON_STOP_GPS: self.__on_stop_gps,
         }
 
         if NotificationProxy.is_available():
@@ -112,91 +115,112 @@ class GPS(DeviceMonitor):
         if self._hook_method & self.HOOK_NOTIFICATIONS == self.NO_HOOKS:
             self._hook_method |= self.HOOK_TIMER
 
+    # Callbacks run on binder and looper threads: just queue the event and
+    # return. Events are folded into state machines by fold_events()
+
     def __on_start_wakelock(self, uid, name, lock_type):
         """ Callback method for GPS status monitor. """
         if (uid == SystemInfo.AID_SYSTEM) and (name == "GpsLocationProvider"):
-            self._statekeeper.update_event(self.GPS_STATUS_ENGINE_ON,
-                                           self.HOOK_NOTIFICATIONS)
+            self._events.push(NotificationProxy.ON_START_WAKELOCK, uid)
 
     def __on_stop_wakelock(self, uid, name, lock_type):
         """ Callback method for GPS status monitor. """
         if (uid == SystemInfo.AID_SYSTEM) and (name == "GpsLocationProvider"):
-            self._statekeeper.update_event(self.GPS_STATUS_ENGINE_OFF,
-                                           self.HOOK_NOTIFICATIONS)
+            self._events.push(NotificationProxy.ON_STOP_WAKELOCK, uid)
 
     def __on_start_gps(self, uid):
         """ Callback method for GPS status monitor. """
-        self.update_uid_event(uid, self.GPS_STATUS_SESSION_BEGIN,
-                              self.HOOK_NOTIFICATIONS)
+        self._events.push(NotificationProxy.ON_START_GPS, uid)
 
     def __on_stop_gps(self, uid):
         """ Callback method for GPS status monitor. """
-        self.update_uid_event(uid, self.GPS_STATUS_SESSION_END,
-                              self.HOOK_NOTIFICATIONS)
+        self._events.push(NotificationProxy.ON_STOP_GPS, uid)
 
     def __on_gps_status_changed(self, event):
-        """ Callback method for GPS status monitor. """
-        if event == self.GPS_EVENT_STARTED:
-            self._statekeeper.update_event(self.GPS_STATUS_SESSION_BEGIN,
-                                           self.HOOK_GPS_STATUS_LISTENER)
-        elif event == self.GPS_EVENT_STOPPED:
-            self._statekeeper.update_event(self.GPS_STATUS_SESSION_END,
-                                           self.HOOK_GPS_STATUS_LISTENER)
-        with self._gpsstatus_lock:
-            self._status = self._listener.gps_status
-
-    def update_uid_event(self, uid, event, hook_source):
+        """ Callback method for GPS status monitor. Queues the satellite
+        count rather than the status, a Java object that changes under us """
+        status = self._listener.gps_status
+        num_satellites = 0
+        if status is not None:
+            num_satellites = len(status.getSatellites())
+        self._events.push(self.EVENT_GPS_STATUS, event, num_satellites)
+
+    def fold_events(self, events):
+        """ Update GPS state machines with events, as (timestamp, kind, args)
+        tuples, in the order they happened """
+        for timestamp, kind, args in events:
+            if kind == self.EVENT_GPS_STATUS:
+                event, self._num_satellites = args
+                if event == self.GPS_EVENT_STARTED:
+                    self._statekeeper.update_event(
+                        self.GPS_STATUS_SESSION_BEGIN,
+                        self.HOOK_GPS_STATUS_LISTENER, timestamp)
+                elif event == self.GPS_EVENT_STOPPED:
+                    self._statekeeper.update_event(
+                        self.GPS_STATUS_SESSION_END,
+                        self.HOOK_GPS_STATUS_LISTENER, timestamp)
+            elif kind == NotificationProxy.ON_START_WAKELOCK:
+                self._statekeeper.update_event(self.GPS_STATUS_ENGINE_ON,
+                                               self.HOOK_NOTIFICATIONS,
+                                               timestamp)
+            elif kind == NotificationProxy.ON_STOP_WAKELOCK:
+                self._statekeeper.update_event(self.GPS_STATUS_ENGINE_OFF,
+                                               self.HOOK_NOTIFICATIONS,
+                                               timestamp)
+            elif kind == NotificationProxy.ON_START_GPS:
+                self.update_uid_event(args[0], self.GPS_STATUS_SESSION_BEGIN,
+                                      self.HOOK_NOTIFICATIONS, timestamp)
+            elif kind == NotificationProxy.ON_STOP_GPS:
+                self.update_uid_event(args[0], self.GPS_STATUS_SESSION_END,
+                                      self.HOOK_NOTIFICATIONS, timestamp)
+
+    def update_uid_event(self, uid, event, hook_source, timestamp=None):
         """ Update GPS state machine for given UID """
-        with self._uidstates_lock:
-
-            state = self._uid_states.get(uid, None)
+        state = self._uid_states.get(uid, None)
 
-            if not state:
-                state = GPSState(self.HOOK_NOTIFICATIONS | self.HOOK_TIMER,
-                                 self._sleep_time, self._update_time)
-                self._uid_states[uid] = state
+        if not state:
+            state = GPSState(self.HOOK_NOTIFICATIONS | self.HOOK_TIMER,
+                             self._sleep_time, timestamp)
+            self._uid_states[uid] = state
 
-            state.update_event(event, hook_source)
+        state.update_event(event, hook_source, timestamp)
 
     def calc_iteration(self, iter_num):
         """ Return power usage of each application using GPS after one
         iteration. """
         result = IterationData()
 
+        self.fold_events(self._events.drain())
+
         # Get the power data for the physical GPS device
 
-        with self._statekeeper_lock:
-            state_times = self._statekeeper.state_times
-            pwr_state = self._statekeeper.pwr_state
-            self._statekeeper.reset_times()
+        state_times = self._statekeeper.state_times
+        pwr_state = self._statekeeper.pwr_state
+        self._statekeeper.reset_times()
 
         # Get the number of satellite that were available in the last update
 
         num_satellites = 0
-        with self._gpsstatus_lock:
-            if pwr_state == self.POWER_STATE_ON and self._status is not None:
-                num_satellites = len(self._status.getSatellites())
+        if pwr_state == self.POWER_STATE_ON:
+            num_satellites = self._num_satellites
 
         result.set_sys_usage(GPSUsage(state_times, num_satellites))
 
         # Get usage data for each UID we have information on
         if self.has_uid_information:
-            with self._uidstates_lock:
-                self._update_time = (self._start_time + self._iter_interval *
-                                     iter_num)
-                for uid, state in self._uid_states.iteritems():
-                    state_times = state.get_state_times()
-                    pwr_state = state.get_power_state()
-                    state.reset_times()
-
-                    # There is a guarantee that num_satellites will be zero
-                    # if GPS is off (see above)
-                    result.set_uid_usage(uid, GPSUsage(state_times,
-                                                       num_satellites))
-
-                    # Remove state information for UIDs no longer using the GPS
-                    if pwr_state == self.POWER_STATE_OFF:
-                        del (self._uid_states[uid])
+            for uid, state in self._uid_states.items():
+                state_times = state.state_times
+                pwr_state = state.pwr_state
+                state.reset_times()
+
+                # There is a guarantee that num_satellites will be zero
+                # if GPS is off (see above)
+                result.set_uid_usage(uid, GPSUsage(state_times,
+                                                   num_satellites))
+
+                # Remove state information for UIDs no longer using the GPS
+                if pwr_state == self.POWER_STATE_OFF:
+                    del (self._uid_states[uid])
 
         return result
 
@@ -235,12 +259,12 @@ class GPSState(object):
         # (seconds)
         self._sleep_time = sleep_time
 
-        if not update_time:
-            self._update_time = SystemClock.elapsedRealtime()
+        if update_time is None:
+            self._update_time = clock.now()
         else:
             self._update_time = update_time
 
-        self._state_times = []
+        self._state_times = [0] * GPS.NPOWER_STATES
         self.pwr_state = GPS.POWER_STATE_OFF
 
     @property
@@ -259,17 +283,20 @@ class GPSState(object):
     def reset_times(self):
         self._state_times = [0] * GPS.NPOWER_STATES
 
-    def update_event(self, event, hook_source):
+    def update_event(self, event, hook_source, timestamp=None):
         """ When a hook source gets an event, it should report it to this
-        function. The only exception is HOOK_TIME which is handled within this
-        class itself.
+        function, along with the time (ms) it happened, which defaults to now.
+        The only exception is HOOK_TIME which is handled within this class
+        itself.
         """
-        # TODO: Access should be locked
         if (self._hook_mask & hook_source) == GPS.NO_HOOKS:
             # We are not using this hook source, ignore.
             return
 
-        self._update_times()
+        if timestamp is None:
+            timestamp = clock.elapsed_realtime()
+
+        self._update_times(timestamp)
         prev_state = self.pwr_state
 
         if event == GPS.GPS_STATUS_SESSION_BEGIN:
@@ -288,20 +315,25 @@ class GPSState(object):
         if self.pwr_state != prev_state:
             if ((prev_state == GPS.POWER_STATE_ON) and
                     (self.pwr_state == GPS.POWER_STATE_SLEEP)):
-                self._off_time = SystemClock.elapsedRealtime() + \
-                    self._sleep_time
+                self._off_time = timestamp + self._sleep_time
             else:
                 # Any other state transition should reset the off timer
                 self._off_time = None
 
-    def _update_times(self):
-        now = SystemClock.elapsedRealtime()
+    def _update_times(self, now=None):
+        # Also called on GPS events, which need their own time rather than
+        # the one of the last iteration
+        if now is None:
+            now = clock.elapsed_realtime()
+        # Events folded late may predate the last update
+        now = max(now, self._update_time)
 
         # Check if GPS has gone to sleep state due to timer
         if ((self._hook_mask & GPS.HOOK_TIMER != GPS.NO_HOOKS) and
                 (self._off_time is not None) and (self._off_time < now)):
             self._state_times[self.pwr_state] += (self._off_time -
                                                   self._update_time) / 1000
+            self._update_time = self._off_time
             self.pwr_state = GPS.POWER_STATE_OFF
             self._off_time = None
 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+from libs.clock import clock
+
+import logging
+import threading
+
+
+class MonitorScheduler(threading.Thread):
+    """ Run the iterations of all device monitors from a single thread
+    instead of one thread per monitor. On every tick each monitor due
+    computes its iteration, which is then published for get_data() as if the
+    monitor ran on its own. A monitor with a period of n iterations only runs
+    on iterations multiple of n; it has no data for the others, which
+    get_data() expects. Once all monitors are done, on_iteration (if any) is
+    called with the iteration number, e.g. for the estimator to collect their
+    data.
+    """
+
+    DEFAULT_PERIOD = 1
+
+    logger = logging.getLogger("MonitorScheduler")
+
+    def __init__(self, monitors, iter_interval, periods=None,
+                 on_iteration=None):
+        """ periods: { monitor name : iterations between runs } """
+        super(MonitorScheduler, self).__init__(target=self._run)
+        self.daemon = True
+
+        self._monitors = [monitor for monitor in monitors if monitor is not
+                          None]
+        self._iter_interval = iter_interval
+        self._periods = periods if periods is not None else {}
+        self._on_iteration = on_iteration
+        self._stop = threading.Event()
+
+        for monitor in self._monitors:
+            monitor.period = self._periods.get(monitor.monitor_name,
+                                               self.DEFAULT_PERIOD)
+
+    def _run(self):
+        start_time = clock.tick()
+
+        for monitor in self._monitors:
+            monitor.init(start_time, self._iter_interval)
+
+        iter_num = 0
+
+        while not self.is_stopped():
+            self.run_iteration(iter_num)
+
+            if self.is_stopped():
+                break
+
+            now = clock.tick()
+            # Compute the next iteration that we can make the start of
+            prev_iter = iter_num
+            iter_num = max((iter_num + 1), 1 + (now - start_time) //
+                           self._iter_interval)
+
+            if prev_iter + 1 != iter_num:
+                # Data of next iteration covers the skipped ones
+                self.logger.warn("Had to skip iteration {0} to "
+                                 "{1}".format(prev_iter, iter_num))
+
+            # Sleep until next iteration starts
+            self._stop.wait((start_time + iter_num * self._iter_interval -
+                             now) / 1000)
+
+        for monitor in self._monitors:
+            monitor._on_exit()
+
+    def run_iteration(self, iter_num):
+        """ Run monitors due on iteration iter_num, then on_iteration """
+        clock.tick()
+
+        for monitor in self._monitors:
+            if not monitor.is_due(iter_num):
+                continue
+
+            try:
+                data = monitor.profile_iteration(iter_num)
+            except Exception:
+                # One monitor failing shouldn't stop all others
+                self.logger.exception("{0} failed on iteration {1}".format(
+                    monitor.monitor_name, iter_num))
+                continue
+
+            monitor.publish(iter_num, data)
+
+        if self._on_iteration is not None:
+            self._on_iteration(iter_num)
+
+    def stop(self):
+        self._stop.set()
+
+    def is_stopped(self):
+        return self._stop.isSet()
@@ -2,6 +2,7 @@
 
 from __future__ import division
 
+from libs.profiler import profiler
 from monitors.screen.screen import Screen
 from services.iterationdata import IterationData
 from services.usagedata import UsageData
@@ -68,6 +69,8 @@ class OLED(Screen):
         # TODO: Substitute with C-based getScreenPixPower native function
         if screen and self._fb_file is not None:
             try:
+                profiler.count_open()
+                profiler.count_read(4 * len(self._fb_samples))
                 with open(self._fb_file) as fp:
                     for x in self._fb_samples:
                         fp.seek(x * 4)
@@ -3,7 +3,9 @@
 from libs.display import DisplayAccess
 
 from libs.broadcast import BroadcastReceiver
+from libs.profiler import profiler
 from monitors.devicemonitor import DeviceMonitor
+from utils.trace import tracer
 
 import os
 import threading
@@ -25,7 +27,7 @@ class Screen(DeviceMonitor):
         self.width = self.Display.get_width()
         self.height = self.Display.get_height()
 
-        self.screen_on = True
+        self.screen_on = tracer.traced("screen.on", True)
         self.has_uid_information = True
         self._screenlock = threading.Lock()
         # Start display status monitor
@@ -39,17 +41,25 @@ class Screen(DeviceMonitor):
         """ Callback method for display status monitor. """
         with self._screenlock:
             if intent.getAction() == 'screen_on':
-                self.screen_on = True
+                self.screen_on = tracer.traced("screen.on", True)
             elif intent.getAction() == 'screen_off':
-                self.screen_on = False
+                self.screen_on = tracer.traced("screen.on", False)
 
     @classmethod
     def get_display_brightness(cls):
+        return tracer.traced("screen.brightness",
+                             cls._read_display_brightness())
+
+    @classmethod
+    def _read_display_brightness(cls):
         for filename in cls.BACKLIGHT_BRIGHTNESS_FILES:
             if os.path.exists(filename):
                 try:
+                    profiler.count_open()
                     with open(filename, 'r') as fp:
-                        brightness = int(fp.read().strip())
+                        data = fp.read()
+                        profiler.count_read(len(data))
+                        brightness = int(data.strip())
                         return brightness
                 except (IOError, ValueError):
                     pass
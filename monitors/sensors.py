@@ -2,16 +2,15 @@
 
 from __future__ import division
 
-from libs.clock import SystemClock
+from libs.clock import clock
 from libs.notification import NotificationProxy
 from libs.sensors import SensorsAccess
 from monitors.devicemonitor import DeviceMonitor
 from services.iterationdata import IterationData
 from services.usagedata import UsageData
+from utils.eventqueue import EventQueue
 from utils.hardware import Hardware
 
-import threading
-
 
 class Sensors(DeviceMonitor):
     SENSORS = SensorsAccess.get_sensors().keys()
@@ -20,7 +19,8 @@ class Sensors(DeviceMonitor):
         super(Sensors, self).__init__(Hardware.SENSORS, devconstants)
         self._state = SensorState()
         self._uid_states = {}
-        self._sensorslock = threading.Lock()
+        # Sensor events wait here until next iteration folds them
+        self._events = EventQueue(self.monitor_name)
 
         callbacks = {
             NotificationProxy.ON_START_SENSOR: self.__on_start_sensor,
@@ -44,31 +44,46 @@ class Sensors(DeviceMonitor):
         result = IterationData()
         sensor_usage = SensorUsage()
 
-        with self._sensorslock:
-            sensor_usage.on_times = self._state.get_times()
-            result.set_sys_usage(sensor_usage)
+        self.fold_events(self._events.drain())
+
+        sensor_usage.on_times = self._state.get_times()
+        result.set_sys_usage(sensor_usage)
 
-            for uid, state in self._uid_states.iteritems():
-                usage = SensorUsage()
-                usage.on_times = state.get_times()
-                result.set_uid_usage(uid, usage)
+        for uid, state in self._uid_states.items():
+            usage = SensorUsage()
+            usage.on_times = state.get_times()
+            result.set_uid_usage(uid, usage)
 
-                if state.started_sensors == 0:
-                    del (self._uid_states[uid])
+            if state.started_sensors == 0:
+                del (self._uid_states[uid])
 
         return result
 
+    def fold_events(self, events):
+        """ Update sensor states with events, as (timestamp, kind, (uid,
+        sensor)) tuples, in the order they happened """
+        for timestamp, kind, (uid, sensor) in events:
+            uid_state = self._uid_states.get(uid, None)
+            if uid_state is None:
+                # Over the same interval as the device, or the on-time of
+                # events queued before this iteration would be lost
+                uid_state = SensorState(self._state._timestamp)
+                self._uid_states[uid] = uid_state
+
+            if kind == NotificationProxy.ON_START_SENSOR:
+                self._state.start_sensor(sensor, timestamp)
+                uid_state.start_sensor(sensor, timestamp)
+            else:
+                self._state.stop_sensor(sensor, timestamp)
+                uid_state.stop_sensor(sensor, timestamp)
+
+    # Called from binder threads: just queue the event and return
+
     def __on_start_sensor(self, uid, sensor):
-        with self._sensorslock:
-            self._state.start_sensor(sensor)
-            uid_state = self._uid_states.setdefault(uid, SensorState())
-            uid_state.start_sensor(sensor)
+        self._events.push(NotificationProxy.ON_START_SENSOR, uid, sensor)
 
     def __on_stop_sensor(self, uid, sensor):
-        with self._sensorslock:
-            self._state.stop_sensor(sensor)
-            uid_state = self._uid_states.setdefault(uid, SensorState())
-            uid_state.stop_sensor(sensor)
+        self._events.push(NotificationProxy.ON_STOP_SENSOR, uid, sensor)
 
 
 class SensorUsage(UsageData):
@@ -82,35 +97,45 @@ class SensorUsage(UsageData):
 
 
 class SensorState(object):
-    __slots__ = ['_on', '_on_times', 'started_sensors']
+    __slots__ = ['_on', '_on_times', '_timestamp', 'started_sensors']
 
-    def __init__(self):
+    def __init__(self, timestamp=None):
+        """ Count on-times from timestamp (ms), which defaults to now """
         self._on = dict.fromkeys(Sensors.SENSORS, 0)
         self._on_times = dict.fromkeys(Sensors.SENSORS, 0)
-        self._timestamp = SystemClock.elapsedRealtime()
+        self._timestamp = timestamp if timestamp is not None else clock.now()
         self.started_sensors = 0
 
-    def start_sensor(self, name):
-        if (name in self._on) and (self._on[name] == 0):
-            self._on_times[name] -= SystemClock.elapsedRealtime() -\
-                self._timestamp
+    def start_sensor(self, name, timestamp=None):
+        """ Start sensor at timestamp (ms), which defaults to now """
+        if timestamp is None:
+            timestamp = clock.elapsed_realtime()
+
+        if name not in self._on:
+            # Unknown sensors would break the whole batch of events
+            return
+
+        if self._on[name] == 0:
+            self._on_times[name] -= max(timestamp - self._timestamp, 0)
             self.started_sensors += 1
 
-        # WARNING: May break when name is invalid
         self._on[name] += 1
 
-    def stop_sensor(self, name):
+    def stop_sensor(self, name, timestamp=None):
+        """ Stop sensor at timestamp (ms), which defaults to now """
+        if timestamp is None:
+            timestamp = clock.elapsed_realtime()
+
         if name in self._on:
             if self._on[name] == 0:
                 return
             if self._on[name] - 1 == 0:
-                self._on_times[name] += (SystemClock.elapsedRealtime() -
-                                         self._timestamp)
+                self._on_times[name] += max(timestamp - self._timestamp, 0)
                 self.started_sensors -= 1
             self._on[name] -= 1
 
     def get_times(self):
-        now = SystemClock.elapsedRealtime()
+        now = clock.now()
         div = now - self._timestamp
 
         if div <= 0:
@@ -3,14 +3,14 @@
 
 from __future__ import division
 
-from libs.clock import SystemClock
+from libs.clock import clock
 from libs.telephony import TelephonyAccess
 from monitors.devicemonitor import DeviceMonitor
 from services.iterationdata import IterationData
 from services.usagedata import UsageData
 from services.powerestimator import PowerEstimator
+from utils.fdcache import fdcache
 from utils.hardware import Hardware
-from utils.sysfs import Node
 from utils.systeminfo import SystemInfo
 
 import os
@@ -27,23 +27,25 @@ class ThreeG(DeviceMonitor):
     TX_PKT_MASK = "/sys/devices/virtual/net/{0}/statistics/tx_packets"
     RX_BYTE_MASK = "/sys/devices/virtual/net/{0}/statistics/rx_bytes"
     TX_BYTE_MASK = "/sys/devices/virtual/net/{0}/statistics/tx_bytes"
-    UID_STATS_FOLDER = "/proc/uid_state/"
-    UID_TX_BYTE_MASK = UID_STATS_FOLDER.join("{0}/tcp_snd")
-    UID_RX_BYTE_MASK = UID_STATS_FOLDER.join("{0}/tcp_rcv")
+    UID_STATS_FOLDER = "/proc/uid_stat/"
+    UID_TX_BYTE_MASK = UID_STATS_FOLDER + "{0}/tcp_snd"
+    UID_RX_BYTE_MASK = UID_STATS_FOLDER + "{0}/tcp_rcv"
 
     def __init__(self, devconstants, iface="rmnet0"):
         super(ThreeG, self).__init__(Hardware.THREEG, devconstants)
         self._telephony = TelephonyAccess()
         self.iface = devconstants.THREEG_INTERFACE
         self._provider = self._telephony.get_operator_name()
-        self._state = ThreeGState(
+        # Timers and queue sizes of the provider, for interface and UID
+        # states alike
+        self._state_params = (
             devconstants.get_3g_dhcfach_time(self._provider),
             devconstants.get_3g_fachidle_time(self._provider),
             devconstants.get_3g_tx_queue(self._provider),
             devconstants.get_3g_rx_queue(self._provider))
+        self._state = ThreeGState(*self._state_params)
 
         self._uid_states = {}
-        self._sysfs = Node(self.NET_STATISTIC_MASK.format(self.iface))
 
         # Test file existence
         self.has_uid_information = os.access(self.UID_STATS_FOLDER, os.F_OK)
@@ -75,10 +77,10 @@ class ThreeG(DeviceMonitor):
 
             return result
 
-        tx_pkts = int(self._sysfs.tx_packets)
-        rx_pkts = int(self._sysfs.rx_packets)
-        tx_bytes = int(self._sysfs.tx_bytes)
-        rx_bytes = int(self._sysfs.rx_bytes)
+        tx_pkts = fdcache.read_int(self.TX_PKT_MASK.format(self.iface))
+        rx_pkts = fdcache.read_int(self.RX_PKT_MASK.format(self.iface))
+        tx_bytes = fdcache.read_int(self.TX_BYTE_MASK.format(self.iface))
+        rx_bytes = fdcache.read_int(self.RX_BYTE_MASK.format(self.iface))
 
         if (tx_bytes == -1) or (rx_bytes == -1):
             self.logger.warn("Failed to read  UID Tx/Rx byte counts")
@@ -99,18 +101,21 @@ class ThreeG(DeviceMonitor):
                 if uid < 0:
                     continue
 
-                uid_state = self._uid_states.setdefault(uid, ThreeGState())
+                uid_state = self._uid_states.get(uid, None)
 
-                if uid_state.is_stale():
+                if uid_state is None:
+                    uid_state = ThreeGState(*self._state_params)
+                    self._uid_states[uid] = uid_state
+
+                if not uid_state.is_stale():
                     # Use heuristic to not poll for UIDs that haven't had much
                     # activity recently
                     continue
 
-                # Read operations are the expensive part of polling
-                with open(self.UID_TX_BYTE_MASK.format(uid)) as fp:
-                    tx_bytes = int(fp.read().strip())
-                with open(self.UID_RX_BYTE_MASK.format(uid)) as fp:
-                    rx_bytes = int(fp.read().strip())
+                # Read operations are the expensive part of polling. Files
+                # are kept open between iterations
+                tx_bytes = fdcache.read_int(self.UID_TX_BYTE_MASK.format(uid))
+                rx_bytes = fdcache.read_int(self.UID_RX_BYTE_MASK.format(uid))
 
                 if (rx_bytes == -1) or (tx_bytes == -1):
                     self.logger.warn("Failed to read UID Tx/Rx byte counts")
@@ -152,8 +157,11 @@ class ThreeGUsage(UsageData):
 
 
 class ThreeGState(object):
-    __slots__ = ['pwr_state', '_dch_fach_time', 'fach_idle_time',
-                 '_txqueue_size', '_rxqueue_size']
+    __slots__ = ['tx_pkts', 'rx_pkts', 'tx_bytes', 'rx_bytes', 'delta_pkts',
+                 'delta_tx_bytes', 'delta_rx_bytes', 'pwr_state',
+                 '_pwr_state_time', '_inactive_time', '_update_time',
+                 '_dch_fach_time', '_fach_idle_time', '_txqueue_size',
+                 '_rxqueue_size']
 
     def __init__(self, dch_fach_time, fach_idle_time, txqueue_size,
                  rxqueue_size):
@@ -174,14 +182,14 @@ class ThreeGState(object):
         self._rxqueue_size = rxqueue_size
 
     def interface_off(self):
-        self._update_time = SystemClock.elapsedRealtime()
+        self._update_time = clock.now()
         self.pwr_state = ThreeG.POWER_STATE_IDLE
 
     def is_initialized(self):
         return self._update_time is not None
 
     def update(self, tx_pkts, rx_pkts, tx_bytes, rx_bytes):
-        now = SystemClock.elapsedRealtime()
+        now = clock.now()
 
         if (self._update_time is not None) and (now > self._update_time):
             delta_time = now - self._update_time
@@ -237,10 +245,13 @@ class ThreeGState(object):
 
         None -> Boolean
         """
+        if not self.is_initialized():
+            return True
+
         if self.pwr_state != ThreeG.POWER_STATE_IDLE:
             return True
 
         # TODO: check if 10000 us the correct number (Why 10s?)
         # Reduce this number if we want more frequent 3G checks
-        return ((SystemClock.elapsedRealtime() - self._update_time) >
+        return ((clock.now() - self._update_time) >
                 min(10000, self._inactive_time))
@@ -2,14 +2,14 @@
 
 from __future__ import division
 
-from libs.clock import SystemClock
+from libs.clock import clock
 from libs.wifi import WifiAccess
 
 from monitors.devicemonitor import DeviceMonitor
 from services.iterationdata import IterationData
 from services.usagedata import UsageData
+from utils.fdcache import fdcache
 from utils.hardware import Hardware
-from utils.sysfs import Node
 from utils.systeminfo import SystemInfo
 
 import os
@@ -32,7 +32,7 @@ class Wifi(DeviceMonitor):
         self.iface = iface_name if iface_name is not None else "eth0"
         self._state = WifiState(devconstants.WIFI_HIGHLOW_PKTBOUND,
                                 devconstants.WIFI_LOWHIGH_PKTBOUND)
-        self._sysfs = Node(self.NET_STATISTICS_MASK.format(self.iface))
+        self._stats_dir = self.NET_STATISTICS_MASK.format(self.iface)
         self._uid_states = {}
         self._speed = 0
 
@@ -46,7 +46,7 @@ class Wifi(DeviceMonitor):
 
         state = self._wifi.get_state()
 
-        if ((state != WifiAccess.WIFI_STATE_ENABLED) or
+        if ((state != WifiAccess.WIFI_STATE_ENABLED) and
                 (state != WifiAccess.WIFI_STATE_DISABLING)):
             # Allow the real interface state keeper to reset its state so that
             # the next update it knows it's coming back from an off state. We
@@ -59,10 +59,10 @@ class Wifi(DeviceMonitor):
             result.set_sys_usage(WifiUsage())
             return result
 
-        tx_pkts = int(self._sysfs.tx_packets)
-        rx_pkts = int(self._sysfs.rx_packets)
-        tx_bytes = int(self._sysfs.tx_bytes)
-        rx_bytes = int(self._sysfs.rx_bytes)
+        tx_pkts = fdcache.read_int(self._stats_dir + "/tx_packets")
+        rx_pkts = fdcache.read_int(self._stats_dir + "/rx_packets")
+        tx_bytes = fdcache.read_int(self._stats_dir + "/tx_bytes")
+        rx_bytes = fdcache.read_int(self._stats_dir + "/rx_bytes")
 
         if ((tx_pkts == -1) or (rx_pkts == -1) or (tx_bytes == -1) or
                 (rx_bytes == -1)):
@@ -104,11 +104,10 @@ class Wifi(DeviceMonitor):
                     # activity recently
                     continue
 
-                # These read operations are the expensive part of polling
-                with open(self.UID_TX_BYTE_MASK.format(uid)) as fp:
-                    tx_bytes = int(fp.read().strip())
-                with open(self.UID_RX_BYTE_MASK.format(uid)) as fp:
-                    rx_bytes = int(fp.read().strip())
+                # These read operations are the expensive part of polling.
+                # Files are kept open between iterations
+                tx_bytes = fdcache.read_int(self.UID_TX_BYTE_MASK.format(uid))
+                rx_bytes = fdcache.read_int(self.UID_RX_BYTE_MASK.format(uid))
 
                 if (rx_bytes == -1) or (tx_bytes == -1):
                     self.logger.warn("Failed to read UID Tx/Rx byte counts")
@@ -172,7 +171,11 @@ class WifiUsage(UsageData):
 
 
 class WifiState(object):
-    __slots__ = ['_highlow_pktbound', '_lowhigh_pktbound', 'pwr_state']
+    __slots__ = ['_highlow_pktbound', '_lowhigh_pktbound', 'tx_pkts',
+                 'rx_pkts', 'tx_bytes', 'rx_bytes', 'tx_rate', 'delta_pkts',
+                 'delta_tx_bytes', 'delta_rx_bytes', 'pwr_state',
+                 'avg_tx_pkt_size', 'avg_rx_pkt_size', '_update_time',
+                 'inactive_time']
 
     def __init__(self, highlow_pktbound, lowhigh_pktbound):
         self._highlow_pktbound = highlow_pktbound
@@ -195,14 +198,14 @@ class WifiState(object):
         self.inactive_time = 0
 
     def interface_off(self):
-        self._update_time = SystemClock.elapsedRealtime()
+        self._update_time = clock.now()
         self.pwr_state = Wifi.POWER_STATE_LOW
 
     def is_initialized(self):
         return self._update_time is not None
 
     def update(self, tx_pkts, rx_pkts, tx_bytes, rx_bytes):
-        now = SystemClock.elapsedRealtime()
+        now = clock.now()
 
         if (self._update_time is not None) and (now > self._update_time):
             delta_time = now - self._update_time
@@ -247,5 +250,5 @@ class WifiState(object):
 
         # TODO: check if 10000 is the correct number (should be 10s?)
         # Reduce this number if we want more frequent WiFi checks
-        return ((SystemClock.elapsedRealtime() - self._update_time) >
+        return ((clock.now() - self._update_time) >
                 min(10000, self.inactive_time))
@@ -11,6 +11,7 @@ from monitors.screen.lcd import LCD
 from monitors.threeg import ThreeG
 from monitors.wifi import Wifi
 from phones.device import Device
+from phones.powermodel import PowerModel
 from utils.hardware import Hardware
 
 
@@ -39,16 +40,20 @@ class Constants(object):
     WIFI_LINK_RATIOS = []
     WIFI_LINK_SPEEDS = []
 
-    @classmethod
-    def _get_sensor_pwr_ratios(cls):
-        powers = {}
-
-        for name, power in SensorsAccess.get_sensors():
-            powers[name] = power * Constants.BATTERY_VOLTAGE
+    # Power of each sensor: { name : power }, read from Android by
+    # get_sensor_pwr_ratios() on first use
+    SENSOR_PWR_RATIOS = None
 
-        return powers
+    @classmethod
+    def get_sensor_pwr_ratios(cls):
+        """ Return power of each sensor, as reported by Android in mA times
+        the battery voltage of this phone """
+        if cls.__dict__.get("SENSOR_PWR_RATIOS", None) is None:
+            cls.SENSOR_PWR_RATIOS = {
+                name: power * cls.BATTERY_VOLTAGE for name, power in
+                SensorsAccess.get_sensors().iteritems()}
 
-    SENSOR_PWR_RATIOS = _get_sensor_pwr_ratios()
+        return cls.SENSOR_PWR_RATIOS
 
     # The following methods are too specific and need to be implemented
     # according to the device in question
@@ -93,29 +98,10 @@ class Constants(object):
             "Constants shouldn't be instantiated directly")
 
 
-class BaseDevice(Device):
-    hardware = {
-        Hardware.CPU: CPU(Constants),
-        Hardware.LCD: LCD(Constants),
-        Hardware.WIFI: Wifi(Constants),
-        Hardware.THREEG: ThreeG(Constants),
-        Hardware.GPS: GPS(Constants),
-        Hardware.AUDIO: Audio(Constants),
-        Hardware.SENSORS: Sensors(Constants),
-    }
-
-    power_function = {
-        Hardware.CPU: BasePowerCalculator.get_cpu_power,
-        Hardware.LCD: BasePowerCalculator.get_lcd_power,
-        Hardware.WIFI: BasePowerCalculator.get_wifi_power,
-        Hardware.THREEG: BasePowerCalculator.get_3g_power,
-        Hardware.GPS: BasePowerCalculator.get_gps_power,
-        Hardware.AUDIO: BasePowerCalculator.get_audio_power,
-        Hardware.SENSORS: BasePowerCalculator.get_sensor_power,
-    }
-
-
 class BasePowerCalculator(object):
+    # Power tables of the phone, compiled
+    model = PowerModel(Constants)
+
     @classmethod
     def get_lcd_power(cls, lcd_data):
         raise NotImplementedError
@@ -126,34 +112,19 @@ class BasePowerCalculator(object):
 
     @classmethod
     def get_cpu_power(cls, cpu_data):
-        """ Find the two closest CPU frequencies and linearly interpolate the
-        power ratio for current freq
+        """ Interpolate the power ratio for current freq from the two closest
+        CPU frequencies
         """
-        if not cpu_data or len(Constants.CPU_PWR_RATIOS) == 0:
+        if not cpu_data:
             return 0
-        elif len(Constants.CPU_PWR_RATIOS) == 1:
-            ratio = Constants.CPU_PWR_RATIOS[0]
-        else:
-            freq = cpu_data.freq
-            if cpu_data.freq < Constants.CPU_PWR_RATIOS[0]:
-                freq = Constants.CPU_FREQS[0]
-            if cpu_data.freq > Constants.CPU_PWR_RATIOS[-1]:
-                freq = Constants.CPU_FREQS[-1]
-
-            i = cls._upper_bound(freq, Constants.CPU_FREQS)
 
-            if i == 0:
-                i += 1
-            elif i == len(Constants.CPU_FREQS):
-                i -= 1
+        return cls.model.get_cpu_power(cpu_data.freq, cpu_data.usr_perc,
+                                       cpu_data.sys_perc)
 
-            ratio = (Constants.CPU_PWR_RATIOS[i - 1] +
-                     (Constants.CPU_PWR_RATIOS[i] - Constants.CPU_PWR_RATIOS[
-                         i - 1]) /
-                     (Constants.CPU_FREQS[i] - Constants.CPU_FREQS[i - 1]) *
-                     (freq - Constants.CPU_FREQS[i - 1]))
-
-        return max(0, ratio * (cpu_data.usr_perc + cpu_data.sys_perc))
+    @classmethod
+    def get_cpu_power_batch(cls, freqs, usr_percs, sys_percs):
+        """ Column version of get_cpu_power, see PowerModel.get_cpu_powers """
+        return cls.model.get_cpu_powers(freqs, usr_percs, sys_percs)
 
     @classmethod
     def get_audio_power(cls, audio_data):
@@ -161,42 +132,27 @@ class BasePowerCalculator(object):
 
     @classmethod
     def get_gps_power(cls, gps_data):
-        res = sum(time * power for time, power in zip(gps_data.state_times,
-                                                      Constants.GPS_STATE_PWRS))
-        return res
+        return cls.model.get_gps_power(gps_data.state_times)
 
     @classmethod
-    def get_wifi_power(cls, wifi_data):
-        ratio = 0
+    def get_gps_power_batch(cls, state_times):
+        """ Column version of get_gps_power """
+        return cls.model.get_gps_powers(state_times)
 
-        if not wifi_data or not wifi_data.on:
+    @classmethod
+    def get_wifi_power(cls, wifi_data):
+        if not wifi_data:
             return 0
-        if wifi_data.pwr_state == Wifi.POWER_STATE_LOW:
-            return Constants.WIFI_LOW_PWR
-        if wifi_data.pwr_state == Wifi.POWER_STATE_HIGH:
-            if len(Constants.WIFI_LINK_SPEEDS) == 1:
-                # If there is only one set speed we have to use its ratio as we
-                # have nothing else to use
-                ratio = Constants.WIFI_LINK_RATIOS[0]
-            else:
-                # Find two nearest speed/ratio pairs and linearly interpolate
-                # the ratio for this link speed
-
-                i = cls._upper_bound(wifi_data.speed, Constants
-                .WIFI_LINK_SPEEDS)
-                if i == 0:
-                    i += 1
-                elif i == len(Constants.WIFI_LINK_SPEEDS):
-                    i -= 1
-
-                ratio = (Constants.WIFI_LINK_RATIOS[i - 1] +
-                         (Constants.WIFI_LINK_RATIOS[i] -
-                          Constants.WIFI_LINK_RATIOS[i - 1]) /
-                         (Constants.WIFI_LINK_SPEEDS[i] - Constants
-                         .WIFI_LINK_SPEEDS[i - 1]) *
-                         (wifi_data.speed - Constants.WIFI_LINK_SPEEDS[i - 1]))
-
-        return max(0, Constants.WIFI_HIGH_PWR + ratio * wifi_data.tx_rate)
+
+        return cls.model.get_wifi_power(wifi_data.on, wifi_data.pwr_state,
+                                        wifi_data.speed, wifi_data.tx_rate)
+
+    @classmethod
+    def get_wifi_power_batch(cls, ons, pwr_states, speeds, tx_rates):
+        """ Column version of get_wifi_power. Return power of every row of
+        (on, pwr_state, speed, tx_rate)
+        """
+        return cls.model.get_wifi_powers(ons, pwr_states, speeds, tx_rates)
 
     @classmethod
     def get_3g_power(cls, threeg_data):
@@ -218,19 +174,33 @@ class BasePowerCalculator(object):
 
         res = sum(time * power for time, power in
                   zip(sensor_data.on_times.values(),
-                      Constants.SENSOR_PWR_RATIOS.values()))
+                      Constants.get_sensor_pwr_ratios().values()))
+        return res
 
-    @classmethod
-    def _upper_bound(cls, value, list_):
-        lo = 0
-        hi = len(list_)
 
-        while lo < hi:
-            mid = lo + (hi - lo) // 2
-            if list_[mid] <= value:
-                lo = mid + 1
-            else:
-                hi = mid
+class BaseDevice(Device):
+    hardware = {
+        Hardware.CPU: CPU(Constants),
+        Hardware.LCD: LCD(Constants),
+        Hardware.WIFI: Wifi(Constants),
+        Hardware.THREEG: ThreeG(Constants),
+        Hardware.GPS: GPS(Constants),
+        Hardware.AUDIO: Audio(Constants),
+        Hardware.SENSORS: Sensors(Constants),
+    }
 
-        return lo
+    power_function = {
+        Hardware.CPU: BasePowerCalculator.get_cpu_power,
+        Hardware.LCD: BasePowerCalculator.get_lcd_power,
+        Hardware.WIFI: BasePowerCalculator.get_wifi_power,
+        Hardware.THREEG: BasePowerCalculator.get_3g_power,
+        Hardware.GPS: BasePowerCalculator.get_gps_power,
+        Hardware.AUDIO: BasePowerCalculator.get_audio_power,
+        Hardware.SENSORS: BasePowerCalculator.get_sensor_power,
+    }
 
+    power_batch_function = {
+        Hardware.CPU: BasePowerCalculator.get_cpu_power_batch,
+        Hardware.WIFI: BasePowerCalculator.get_wifi_power_batch,
+        Hardware.GPS: BasePowerCalculator.get_gps_power_batch,
+    }
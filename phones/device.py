@@ -26,6 +26,16 @@ class Device(object):
         Hardware.SENSORS: None,
     }
 
+    # Column versions of power functions, taking one list per attribute of
+    # usage named in power_batch_columns
+    power_batch_function = {}
+
+    power_batch_columns = {
+        Hardware.CPU: ('freq', 'usr_perc', 'sys_perc'),
+        Hardware.WIFI: ('on', 'pwr_state', 'speed', 'tx_rate'),
+        Hardware.GPS: ('state_times',),
+    }
+
     # This is an abstract class that should be extended and incr
     def __init__(self):
         raise NotImplementedError
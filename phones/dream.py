@@ -9,6 +9,7 @@ from monitors.threeg import ThreeG
 from monitors.wifi import Wifi
 from phones.base import Constants as BaseConstants, BaseDevice
 from phones.base import BasePowerCalculator
+from phones.powermodel import PowerModel
 from utils.hardware import Hardware
 
 
@@ -103,7 +104,7 @@ class Constants(BaseConstants):
         if monitor_name == Hardware.THREEG:
             return cls.get_3g_dch_power("")
         if monitor_name == Hardware.SENSORS:
-            return sum(cls.SENSOR_PWR_RATIOS.values)
+            return sum(cls.get_sensor_pwr_ratios().values())
 
         # Where does this value come from?
         return 900
@@ -130,8 +131,16 @@ class DreamPhone(BaseDevice):
         Hardware.SENSORS: PowerCalculator.get_sensor_power,
     }
 
+    power_batch_function = {
+        Hardware.CPU: PowerCalculator.get_cpu_power_batch,
+        Hardware.WIFI: PowerCalculator.get_wifi_power_batch,
+        Hardware.GPS: PowerCalculator.get_gps_power_batch,
+    }
+
 
 class PowerCalculator(BasePowerCalculator):
+    model = PowerModel(Constants)
+
     @classmethod
     def get_lcd_power(cls, lcd_data):
         if lcd_data.screen_on:
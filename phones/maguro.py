@@ -5,6 +5,7 @@ from monitors.screen.oled import OLED
 from monitors.wifi import Wifi
 from phones.base import Constants as BaseConstants, BaseDevice
 from phones.base import BasePowerCalculator
+from phones.powermodel import PowerModel
 
 from utils.hardware import Hardware
 
@@ -87,8 +88,15 @@ class MaguroPhone(BaseDevice):
         Hardware.SENSORS: None
     }
 
+    power_batch_function = {
+        Hardware.CPU: PowerCalculator.get_cpu_power_batch,
+        Hardware.WIFI: PowerCalculator.get_wifi_power_batch
+    }
+
 
 class PowerCalculator(BasePowerCalculator):
+    model = PowerModel(Constants)
+
     # Galaxy Nexus has no LCd screen
     @classmethod
     def get_lcd_power(cls, lcd_data):
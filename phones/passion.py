@@ -10,6 +10,7 @@ from monitors.threeg import ThreeG
 from monitors.wifi import Wifi
 from phones.base import Constants as BaseConstants, BaseDevice
 from phones.base import BasePowerCalculator
+from phones.powermodel import PowerModel
 from utils.hardware import Hardware
 
 Display = DisplayAccess()
@@ -127,8 +128,16 @@ class PassionPhone(BaseDevice):
         Hardware.SENSORS: PowerCalculator.get_sensor_power,
     }
 
+    power_batch_function = {
+        Hardware.CPU: PowerCalculator.get_cpu_power_batch,
+        Hardware.WIFI: PowerCalculator.get_wifi_power_batch,
+        Hardware.GPS: PowerCalculator.get_gps_power_batch,
+    }
+
 
 class PowerCalculator(BasePowerCalculator):
+    model = PowerModel(Constants)
+
     # HTC Passion has no LCD screen
     @classmethod
     def get_lcd_power(cls, lcd_data):
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+from array import array
+from bisect import bisect_right
+from itertools import izip
+from monitors.wifi import Wifi
+
+
+class PiecewiseLinear(object):
+    """ Linear interpolation over points (xs, ys), extrapolating with the
+    first and last segments. A dense table holding the segment of every step
+    units of x finds the segment of a value with a single index. Segment i
+    goes from point i - 1 to point i and is interpolated the same way the
+    power calculators always did, so results are bit for bit the same.
+    """
+
+    __slots__ = ['xs', 'ys', '_bases', '_slopes', '_x0', '_step', '_table']
+
+    def __init__(self, xs, ys, step):
+        self.xs = tuple(xs)
+        self.ys = tuple(ys)
+        self._step = step
+        self._x0 = xs[0] if len(xs) > 0 else 0
+
+        npoints = len(xs)
+        self._bases = [0] + [ys[i - 1] for i in xrange(1, npoints)]
+        self._slopes = [0] + [(ys[i] - ys[i - 1]) / (xs[i] - xs[i - 1]) for
+                              i in xrange(1, npoints)]
+
+        # Number of points up to each step of x
+        ncells = int((xs[-1] - self._x0) // step) + 1 if npoints > 1 else 0
+        self._table = array('i', (bisect_right(self.xs, self._x0 + k * step)
+                                  for k in xrange(ncells)))
+
+    def __len__(self):
+        return len(self.xs)
+
+    def get_segment(self, x):
+        """ Return index of segment used to interpolate x. Only valid with
+        two points or more """
+        npoints = len(self.xs)
+        k = int((x - self._x0) // self._step)
+
+        if k < 0:
+            count = 0
+        elif k >= len(self._table):
+            count = npoints
+        else:
+            count = self._table[k]
+            # A step may hold more than one point
+            xs = self.xs
+            while count < npoints and xs[count] <= x:
+                count += 1
+            while count > 0 and xs[count - 1] > x:
+                count -= 1
+
+        if count == 0:
+            return 1
+        if count == npoints:
+            return npoints - 1
+        return count
+
+    def get(self, x):
+        """ Return interpolated y at x. A single point is constant and no
+        points at all is zero """
+        if len(self.xs) < 2:
+            return self.ys[0] if len(self.ys) > 0 else 0
+
+        i = self.get_segment(x)
+        return self._bases[i] + self._slopes[i] * (x - self.xs[i - 1])
+
+
+class PowerModel(object):
+    """ Power tables of a phones Constants class compiled for evaluation.
+    Tables are validated when compiled: a ValueError is raised on tables
+    whose lengths don't match or whose x values are not strictly increasing,
+    and on negative powers. Empty ratios or powers of None mean the
+    component was never calibrated and draws no power from them.
+    """
+
+    CPU_FREQ_STEP = 1       # MHz per table entry
+    WIFI_SPEED_STEP = 0.5   # Mbps per table entry
+    # Power states of GPS.NPOWER_STATES: off, sleep and on
+    GPS_STATES = 3
+
+    def __init__(self, constants):
+        self.name = constants.MODEL_NAME
+
+        self.cpu = self._compile("CPU", constants.CPU_FREQS,
+                                 constants.CPU_PWR_RATIOS, self.CPU_FREQ_STEP)
+        self.wifi = self._compile("Wifi", constants.WIFI_LINK_SPEEDS,
+                                  constants.WIFI_LINK_RATIOS,
+                                  self.WIFI_SPEED_STEP)
+
+        self.cpu_min_freq = self.cpu.xs[0] if len(self.cpu) > 0 else 0
+        self.cpu_max_freq = self.cpu.xs[-1] if len(self.cpu) > 0 else 0
+
+        # mW of the Wifi power states, and of each GPS power state
+        self.wifi_low_pwr = self._compile_power("Wifi low",
+                                                constants.WIFI_LOW_PWR)
+        self.wifi_high_pwr = self._compile_power("Wifi high",
+                                                 constants.WIFI_HIGH_PWR)
+        self.gps_state_pwrs = self._compile_state_powers(
+            "GPS", constants.GPS_STATE_PWRS, self.GPS_STATES)
+
+    def _compile(self, component, xs, ys, step):
+        if len(ys) == 0:
+            # Not calibrated
+            return PiecewiseLinear((), (), step)
+
+        self.validate(component, xs, ys)
+        return PiecewiseLinear(xs, ys, step)
+
+    def _compile_power(self, component, power):
+        if power is None:
+            # Not calibrated
+            return 0
+
+        if power < 0:
+            raise ValueError("{0} {1}: negative power {2}".format(
+                self.name, component, power))
+        return power
+
+    def _compile_state_powers(self, component, powers, nstates):
+        if len(powers) == 0:
+            # Not calibrated
+            return ()
+
+        if len(powers) != nstates:
+            raise ValueError("{0} {1}: {2} states but {3} powers".format(
+                self.name, component, nstates, len(powers)))
+        return tuple(self._compile_power(component, power) for power in
+                     powers)
+
+    def validate(self, component, xs, ys):
+        if len(xs) != len(ys):
+            raise ValueError("{0} {1}: {2} points but {3} ratios".format(
+                self.name, component, len(xs), len(ys)))
+
+        for i in xrange(1, len(xs)):
+            if xs[i] <= xs[i - 1]:
+                raise ValueError("{0} {1}: points not increasing at {2}".format(
+                    self.name, component, xs[i]))
+
+    def get_cpu_ratio(self, freq):
+        """ Return power ratio of CPU running at freq MHz. Frequencies out of
+        the table are clamped to it """
+        if len(self.cpu) > 1:
+            if freq < self.cpu_min_freq:
+                freq = self.cpu_min_freq
+            if freq > self.cpu_max_freq:
+                freq = self.cpu_max_freq
+
+        return self.cpu.get(freq)
+
+    def get_wifi_ratio(self, speed):
+        """ Return power ratio of Wifi link at speed Mbps """
+        return self.wifi.get(speed)
+
+    def get_cpu_power(self, freq, usr_perc, sys_perc):
+        """ Return power of CPU running at freq MHz with usage percentages """
+        if len(self.cpu) == 0:
+            return 0
+
+        return max(0, self.get_cpu_ratio(freq) * (usr_perc + sys_perc))
+
+    def get_cpu_powers(self, freqs, usr_percs, sys_percs):
+        """ Column version of get_cpu_power. Return power of every row of
+        (freq, usr_perc, sys_perc), the same get_cpu_power would return for
+        each of them """
+        if len(self.cpu) == 0:
+            return [0] * len(freqs)
+
+        # Usage is reported on a handful of frequencies only, so the ratio of
+        # each one is computed once. { freq : ratio }
+        freq_ratios = {}
+        powers = []
+
+        for freq, usr_perc, sys_perc in izip(freqs, usr_percs, sys_percs):
+            ratio = freq_ratios.get(freq, None)
+
+            if ratio is None:
+                ratio = freq_ratios[freq] = self.get_cpu_ratio(freq)
+
+            powers.append(max(0, ratio * (usr_perc + sys_perc)))
+
+        return powers
+
+    def get_wifi_power(self, on, pwr_state, speed, tx_rate):
+        """ Return power of Wifi in power state, sending tx_rate packets per
+        second over a link of speed Mbps """
+        if not on:
+            return 0
+        if pwr_state == Wifi.POWER_STATE_LOW:
+            return self.wifi_low_pwr
+
+        ratio = 0
+
+        if pwr_state == Wifi.POWER_STATE_HIGH:
+            # Interpolate the ratio for this link speed from the two nearest
+            # speed/ratio pairs. If there is only one set speed we have to use
+            # its ratio as we have nothing else to use
+            ratio = self.get_wifi_ratio(speed)
+
+        return max(0, self.wifi_high_pwr + ratio * tx_rate)
+
+    def get_wifi_powers(self, ons, pwr_states, speeds, tx_rates):
+        """ Column version of get_wifi_power. Return power of every row of
+        (on, pwr_state, speed, tx_rate) """
+        low_pwr = self.wifi_low_pwr
+        high_pwr = self.wifi_high_pwr
+        powers = []
+
+        for on, pwr_state, speed, tx_rate in izip(ons, pwr_states, speeds,
+                                                  tx_rates):
+            if not on:
+                powers.append(0)
+                continue
+            if pwr_state == Wifi.POWER_STATE_LOW:
+                powers.append(low_pwr)
+                continue
+
+            ratio = 0
+
+            if pwr_state == Wifi.POWER_STATE_HIGH:
+                ratio = self.get_wifi_ratio(speed)
+
+            powers.append(max(0, high_pwr + ratio * tx_rate))
+
+        return powers
+
+    def get_gps_power(self, state_times):
+        """ Return power of GPS spending state_times in each power state """
+        return sum(time * power for time, power in
+                   zip(state_times, self.gps_state_pwrs))
+
+    def get_gps_powers(self, state_times):
+        """ Column version of get_gps_power """
+        pwrs = self.gps_state_pwrs
+        return [sum(time * power for time, power in zip(times, pwrs)) for
+                times in state_times]
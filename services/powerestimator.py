@@ -1,16 +1,28 @@
 #!/usr/bin/env python
 
 from __future__ import division
-from libs.clock import SystemClock
+from itertools import izip
+from libs.clock import clock
+from libs.profiler import profiler
 from libs.settings import Settings
+from monitors.devicemonitor import DeviceMonitor
+from monitors.scheduler import MonitorScheduler
 from services.uidinfo import UidInfo
 from utils.batterystats import BatteryStats
 from utils.counter import Counter
+from utils.fdcache import fdcache
 from utils.hardware import Hardware
+from utils.logsegments import SegmentedFile
+from utils.logwriter import BackgroundWriter
 from utils.powerbuffer import PowerBuffer
+from utils.powerlog import PowerLogWriter
+from utils.powerlog import index_segment
+from utils.powermatrix import PowerMatrix
 from utils.systeminfo import SystemInfo
+from utils.trace import tracer
+from utils.weightedaverage import WeightedAverage
 
-import math
+import logging
 import threading
 import time
 
@@ -19,11 +31,51 @@ class PowerEstimator(threading.Thread):
 
     POLYNOMIAL_WEIGHT = 0.2
     ITERATION_INTERVAL = 1000  # 1 second
-
-    def __init__(self, phone):
+    HISTORY_SIZE = 5 * 60       # iterations of per-iteration power history
+    # Log segments are named LOG_FILE.<number>. They roll over every
+    # LOG_SEGMENT_SIZE bytes or LOG_SEGMENT_AGE seconds, and the oldest ones
+    # go once they take over LOG_MAX_SIZE bytes
+    LOG_FILE = "powerlog.bin"
+    LOG_SEGMENT_SIZE = 4 * 1024 * 1024
+    LOG_SEGMENT_AGE = 60 * 60
+    LOG_MAX_SIZE = 64 * 1024 * 1024
+    LOG_FLUSH_INTERVAL = 1      # iterations
+    # Records waiting for storage before the oldest get dropped, or before
+    # the estimator waits with LOG_POLICY BackgroundWriter.BLOCK
+    LOG_QUEUE_SIZE = 10 * 60
+    LOG_POLICY = BackgroundWriter.DROP_OLDEST
+    # Trace of monitor inputs recorded on the device for replaying them off
+    # Android, see utils.trace. None: not recording. Unlike log records,
+    # trace records are never dropped: once TRACE_QUEUE_SIZE of them wait
+    # for storage, recording waits too
+    TRACE_FILE = None
+    TRACE_QUEUE_SIZE = 10 * 60
+
+    logger = logging.getLogger("PowerEstimator")
+
+    def __init__(self, phone, use_scheduler=False, monitor_periods=None):
+        """With use_scheduler, monitors run from the estimator thread instead
+        of a thread each, every monitor_periods[name] iterations (default 1)
+        """
         super(PowerEstimator, self).__init__(target=self._run)
         self.daemon = True
 
+        # Monitors keep their counter files open, see utils.fdcache
+        fdcache.raise_limit()
+
+        self._phone = phone
+        self._iter_num = -1
+        # Power drawn by the monitor itself shows up under this UID
+        self._self_uid = SystemInfo.get_self_uid()
+
+        # Runs the monitors and then this estimator on every iteration
+        self._scheduler = None
+        if use_scheduler:
+            self._scheduler = MonitorScheduler(self._phone.hardware.values(),
+                                               self.ITERATION_INTERVAL,
+                                               monitor_periods,
+                                               self._process_iteration)
+
         self._avg_power = 0.0
 
         # Used to interrupt thread
@@ -31,192 +83,297 @@ class PowerEstimator(threading.Thread):
         # Running apps: { uid : app_name }
         self._running_apps = {}
 
-        self._phone = phone
-
-        self._pwr_history = dict(self._phone.hardware.keys(), PowerBuffer(300))
+        # Counters of power drawn by each component, and per-iteration history
+        # of all components in a single matrix
+        self._pwr_history = {name: PowerBuffer(0, self.POLYNOMIAL_WEIGHT)
+                             for name in self._phone.hardware.keys()}
+        self._pwr_matrix = PowerMatrix(self._phone.hardware.keys(),
+                                       self.HISTORY_SIZE)
         self._oled_pwr_history = PowerBuffer(0)
-
-        self._log = open("powerlog.log", "w")
+        # Minute, quarter and hour rollups of power drawn by each UID over all
+        # components
+        self._pwr_rollups = PowerBuffer(0, rollups=True)
+        # Weighted average of power drawn by each UID over all components:
+        # { uid : WeightedAverage }
+        self._avg_powers = {}
+
+        # Binary log, see utils.powerlog for reading or exporting it to text.
+        # Written from a thread of its own, so that iterations never wait on
+        # storage. Segments are indexed once closed, as offsets of the writer
+        # don't account for rollovers
+        segments = SegmentedFile(self.LOG_FILE, self.LOG_SEGMENT_SIZE,
+                                 self.LOG_SEGMENT_AGE, self.LOG_MAX_SIZE,
+                                 on_close=index_segment)
+        self._log_writer = BackgroundWriter(segments, self.LOG_QUEUE_SIZE,
+                                            self.LOG_POLICY)
+        self._log = PowerLogWriter(self._log_writer,
+                                   self._phone.hardware.keys(),
+                                   self._phone.constants.MODEL_NAME,
+                                   self.LOG_FLUSH_INTERVAL)
+
+        # Phone of the inputs recorded to a trace, if any, see utils.trace.
+        # Inputs monitors read when created are only in it if the trace was
+        # started before the phone
+        self.start_trace()
+        if tracer.recording:
+            tracer.record_hardware(self._phone.constants.MODEL_NAME,
+                                   self._phone.hardware.keys())
 
         self._appslock = threading.Lock()
         self._iterlock = threading.Lock()
-        self._loglock = threading.Lock()
 
         # self.start()
 
     def __del__(self):
         self._log.close()
 
+    @classmethod
+    def start_trace(cls):
+        """Start recording monitor inputs to TRACE_FILE, if set and not
+        recording yet. Call before creating the phone, so that inputs
+        monitors read once when created make it to the trace"""
+        if cls.TRACE_FILE is None or tracer.recording:
+            return
+
+        try:
+            out = open(cls.TRACE_FILE, "wb")
+        except IOError as e:
+            cls.logger.warn("Could not record trace to {0}: {1}".format(
+                cls.TRACE_FILE, e))
+            return
+
+        tracer.start(BackgroundWriter(out, cls.TRACE_QUEUE_SIZE,
+                                      BackgroundWriter.BLOCK),
+                     cls.ITERATION_INTERVAL)
+
     def _run(self):
         """Loop that keeps updating the power profile"""
+        if self._scheduler is not None:
+            self._run_scheduler()
+        else:
+            self._run_threads()
+
+        self._log.close()
+        if self.TRACE_FILE is not None:
+            tracer.stop()
 
-        start_time = SystemClock.elapsedRealtime()
+    def _run_threads(self):
+        """Every monitor runs on its own thread. Collect their data at the
+        end of each iteration"""
+        start_time = clock.tick()
 
         for hw in self._phone.hardware.values():
             hw.init(start_time, self.ITERATION_INTERVAL)
             hw.start()
 
         self._running.set()
-        iter_num = 0
+        # First iteration not processed yet
+        next_iter = 0
 
         while self.is_running():
-            now = SystemClock.elapsedRealtime()
+            now = clock.tick()
 
             # Compute the next iteration that we can make the ending of. We
             # wait for the end of the iteration so that the monitors have a
             # chance to collect data
-            iter_num = max(iter_num, (now - start_time) //
+            iter_num = max(next_iter, (now - start_time) //
                            self.ITERATION_INTERVAL)
 
             # sleep until the next iteration completes
-            time.sleep(start_time + iter_num *
-                       self.ITERATION_INTERVAL - now)
+            time.sleep(max(0, start_time + iter_num *
+                           self.ITERATION_INTERVAL - now) / 1000)
 
             # Check if service was interrupted while sleeping
             if not self.is_running():
                 break
 
-            total_power = 0
-
-            hw_data = {}
-
-            if iter_num % (30 * 60) == 0:
-                self._log_sys_settings()
-
-            if iter_num % 60 == 0:
-                self._log_battery()
-
-            for name, hw in self._phone.hardware.iteritems():
-                data = hw.get_data(iter_num)
-
-                if data is None:
-                    continue
-
-                hw_data[name] = data
-
-                for uid, usage in data.uid_usage.iteritems():
-
-                    power = self._phone.power_function[name](usage)
-                    usage.power = power
-                    self._pwr_history[name].add(uid, iter_num, power)
-                    if uid == SystemInfo.AID_ALL:
-                        total_power += power
-
-                    # Update list of running apps
-                    with self._appslock:
-                        self._running_apps.setdefault(uid,
-                                                      SystemInfo.get_uid_name(
-                                                      uid))
-
-                    if name == "OLED" and usage.pix_pwr >= 0:
-                        self._oled_pwr_history.add_power(uid, iter_num,
-                                                         1000 * data.pix_pwr)
-
-                    self._log_uid_power(self, uid, name, power)
-
-                # Only log app names for the first time
-                if iter_num == 0:
-                    self._log_app_names()
+            # Catch up on iterations missed while oversleeping, as far back as
+            # monitors keep their data
+            first_iter = max(next_iter,
+                             iter_num - DeviceMonitor.DATA_SLOTS + 1)
+            if first_iter != next_iter:
+                self.logger.warn("Fell behind, skipping iterations {0} to "
+                                 "{1}".format(next_iter, first_iter - 1))
 
-                self._log_power(total_power, hw_data)
-                self._update_avg_power()
+            for i in xrange(first_iter, iter_num + 1):
+                self._process_iteration(i)
+            next_iter = iter_num + 1
 
         # Wait for all hardware monitors to finish
         for hw in self._phone.hardware.values():
             hw.stop()
             hw.join()
 
+    def _run_scheduler(self):
+        """All monitors run from this thread, followed by the estimator on
+        each iteration"""
+        self._running.set()
+        # Scheduler loop runs on the estimator thread
+        self._scheduler.run()
+
+    def _process_iteration(self, iter_num):
+        """Compute power drawn during iteration from data of all monitors"""
+        total_power = 0
+
+        # Power drawn by each UID during this iteration
+        uid_powers = {}
+        # Energy drawn by each UID since the last iteration, which also
+        # accounts for iterations skipped by monitors
+        uid_energies = {}
+        # Logged powers: [ (uid, name, power) ]
+        log_powers = []
+        # Powers backfilling skipped iterations: { span : [ (uid, name,
+        # power) ] }
+        log_catchups = {}
+
+        if iter_num % (30 * 60) == 0:
+            self._log_sys_settings(iter_num)
+
+        if iter_num % 60 == 0:
+            self._log_battery(iter_num)
+            self._log.write_profile(iter_num, self._self_uid,
+                                    profiler.get_profiles())
+
+        for name, hw in self._phone.hardware.iteritems():
+            data, span = hw.get_data_span(iter_num)
+
+            if data is None:
+                continue
+
+            uids = data.uid_usage.keys()
+            usages = data.uid_usage.values()
+
+            for uid, usage, power in izip(uids, usages,
+                                          self._get_powers(name, usages)):
+                usage.power = power
+                self._pwr_history[name].add_power(uid, iter_num, power, span)
+                self._pwr_matrix.add_power(uid, name, iter_num, power, span)
+                uid_powers[uid] = uid_powers.get(uid, 0) + power
+                uid_energies[uid] = uid_energies.get(uid, 0) + power * span
+                if uid == SystemInfo.AID_ALL:
+                    total_power += power
+
+                # Update list of running apps
+                if uid not in self._running_apps:
+                    self._add_running_app(uid)
+
+                if name == "OLED" and usage.pix_pwr >= 0:
+                    self._oled_pwr_history.add_power(uid, iter_num,
+                                                     1000 * data.pix_pwr,
+                                                     span)
+
+                log_powers.append((uid, name, power))
+                if span > 1:
+                    log_catchups.setdefault(span, []).append((uid, name,
+                                                              power))
+
+        self._log.write_power(iter_num, total_power, log_powers)
+        for span, powers in log_catchups.iteritems():
+            self._log.write_catchup(iter_num - 1, span - 1, powers)
+        self._update_avg_power(uid_powers)
+
+        # Energy of skipped iterations lands on this one, as those were
+        # rolled up already
+        for uid, energy in uid_energies.iteritems():
+            self._pwr_rollups.add_power(uid, iter_num, energy)
+
+        with self._iterlock:
+            self._iter_num = iter_num
+
+        if tracer.recording:
+            tracer.end_iteration(iter_num, clock.now())
+
+    def _get_powers(self, name, usages):
+        """ Return power drawn by each usage of hardware component. All usages
+        are computed at once when the phone has a column version of the power
+        function """
+        batch_function = self._phone.power_batch_function.get(name, None)
+
+        if batch_function is None:
+            power_function = self._phone.power_function[name]
+            return [power_function(usage) for usage in usages]
+
+        columns = self._phone.power_batch_columns[name]
+        return batch_function(*[[getattr(usage, column) for usage in usages]
+                                for column in columns])
+
     def stop(self):
         self._running.clear()
+        if self._scheduler is not None:
+            self._scheduler.stop()
 
     def is_running(self):
         return self._running.isSet()
 
-    def _log_battery(self):
-        # TODO: Check what happens if values are not returned correctly
-        out = "batt-charge: {} batt-temp: {} batt-voltage: {} " \
-              "batt-current: {}\n".format(BatteryStats.get_charge(),
-                                          BatteryStats.get_temperature(),
-                                          BatteryStats.get_voltage(),
-                                          BatteryStats.get_current())
-        with self._loglock:
-            self._log.write("== BATTERY INFO START ==\n")
-            self._log.write(out)
-            self._log.write("== BATTERY INFO END ==\n")
-
-    def _log_sys_settings(self):
-        out = "time {}\nmodel {}\n".format(time.time(),
-                                           self._phone.constants.MODEL_NAME)
-
-        out += "screen-brightness: {}"
+    def get_log_dropped_records(self):
+        """Return number of log records dropped as storage fell behind"""
+        return self._log_writer.dropped_records
 
-        if Settings.get_display_brightness_mode() != 0:
-            out.format("automatic")
-        else:
-            out.format(Settings.get_display_brightness())
+    def get_monitor_profiles(self):
+        """Return overhead of each monitor since it started, as { monitor
+        name : libs.profiler.MonitorProfile }"""
+        return profiler.get_profiles()
 
-        out += "screen-timeout: {}\n".format(Settings.get_display_timeout())
+    def get_self_uid(self):
+        """Return UID the monitor runs as, whose power is its own
+        overhead"""
+        return self._self_uid
 
-        with self._loglock:
-            self._log.write("== SYSTEM SETTINGS START ==\n")
-            self._log.write(out)
-            self._log.write("== SYSTEM SETTINGS END ==\n")
+    def get_self_hw_report(self, countertype):
+        """Return report on power drawn by HW components for the monitor
+        itself, e.g. to subtract its overhead from totals"""
+        return self.get_uid_hw_report(self._self_uid, countertype)
 
-    def _log_uid_power(self, uid, name, power):
-        out = ""
-        if uid == SystemInfo.AID_ALL:
-            out = "{} {%.3f}".format(name, power)
-        else:
-            out = "{}-{} {%.2f}".format(name, uid, power)
+    def _add_running_app(self, uid):
+        """Add uid to running apps. Its name is logged the first time"""
+        app_name = SystemInfo.get_uid_name(uid)
 
-        with self._loglock:
-            self._log.write(out)
+        with self._appslock:
+            self._running_apps[uid] = app_name
 
-    def _log_power(self, power, hw_data):
-        out = "total-power {%.2f}\n".format(power)
+        self._log.write_app_name(uid, app_name)
 
-        # Finish this
-        for uid, usage in hw_data.iteritems():
+    def _log_battery(self, iter_num):
+        # TODO: Check what happens if values are not returned correctly
+        self._log.write_battery(iter_num, BatteryStats.get_charge(),
+                                BatteryStats.get_temperature(),
+                                BatteryStats.get_voltage(),
+                                BatteryStats.get_current())
 
-        with self._loglock:
-            self._log.write("== POWER START ==\n")
-            self._log.write(out)
-            self._log.write("== POWER END ==\n")
+    def _log_sys_settings(self, iter_num):
+        if Settings.get_display_brightness_mode() != 0:
+            # Automatic
+            brightness = -1
+        else:
+            brightness = Settings.get_display_brightness()
+
+        self._log.write_settings(iter_num, time.time(), brightness,
+                                 Settings.get_display_timeout())
+
+    def _update_avg_power(self, uid_powers):
+        """Fold powers drawn by each UID during the last iteration into their
+        running averages"""
+        for uid, power in uid_powers.iteritems():
+            avg = self._avg_powers.get(uid, None)
+            if avg is None:
+                avg = WeightedAverage(self.POLYNOMIAL_WEIGHT)
+                self._avg_powers[uid] = avg
+            avg.add(power)
+
+        self._avg_power = self.get_uid_avg_power(SystemInfo.AID_ALL)
+        return self._avg_power
+
+    def get_uid_avg_power(self, uid, name="ALL"):
+        """Return weighted average power (mW) drawn by uid. Name "ALL"
+        averages power of all components together"""
+        if name == "ALL":
+            avg = self._avg_powers.get(uid, None)
+            return avg.get() if avg is not None else 0
 
-    def _log_app_names(self):
-        out = ""
+        if name not in self._pwr_history:
+            return None
 
-        with self._appslock:
-            for uid, app_name in self._running_apps.iteritems():
-                out += "associate {} {}\n".format(uid, app_name)
-
-        with self._loglock:
-            self._log.write("== APPNAMES START ==\n")
-            self._log.write(out)
-            self._log.write("== APPNAMES END ==\n")
-
-    def _update_avg_power(self):
-        hw_history = self.get_hardware_history(5 * 60, "ALL",
-                                               SystemInfo.AID_ALL, self._)
-        avg = 0
-        weighted_pwr = 0
-        cnt = 0
-
-        inv_poly_weight = 1.0 - self.POLYNOMIAL_WEIGHT
-        for power in hw_history.values():
-            # Skip zero-powers to save cycles
-            if power != 0:
-                cnt += 1
-                weighted_pwr *= inv_poly_weight
-                weighted_pwr += (self.POLYNOMIAL_WEIGHT * power / 1000)
-
-        if cnt > 0:
-            avg = weighted_pwr / (1.0 - math.pow(inv_poly_weight, cnt))
-            # Return power in mW
-            avg *= 1000
-
-        self._avg_power = avg
-        return avg
+        return self._pwr_history[name].get_uid_avg_power(uid)
 
     def get_hardware_names(self):
         return self._phone.hardware.keys()
@@ -237,39 +394,51 @@ class PowerEstimator(threading.Thread):
         return mask
 
     def get_hardware_history(self, count, name, uid, iter_num):
+        """Return the last count powers drawn by uid up to iter_num, most
+        recent first. Name "ALL" sums powers of all components"""
         if name == "ALL":
-            result = dict(self._pwr_history.keys(), 0)
-            powers = dict(self._pwr_history.keys(), 0)
-            for k, pwrbuf in self._pwr_history.iteritems():
-                powers[k] = pwrbuf.get_powers_up_to_timestamp(uid, iter_num,
-                                                              count)
-
-                for i, value in enumerate(powers):
-                    result[k] += value
-
-            return result
+            return self._pwr_matrix.get_total_powers(uid, iter_num, count)
 
         if name not in self._phone.hardware.keys():
             return None
 
-        return self._pwr_history[name].get_power_up_to_timestamp(uid, iter_num,
-                                                                 count)
+        return self._pwr_matrix.get_powers(uid, name, iter_num, count)
+
+    def get_uid_rollup_history(self, count, uid, tier):
+        """Return average power drawn by uid over all components in the last
+        count buckets of a PowerBuffer rollup tier, most recent first. E.g.
+        the last 24 hours are 96 buckets of tier ROLLUP_QUARTER"""
+        with self._iterlock:
+            iter_num = self._iter_num
+
+        return self._pwr_rollups.get_rollup_averages(uid, tier, iter_num,
+                                                     count)
+
+    def _get_counter_iter_num(self):
+        """Return last iteration completed, for counters to slide their
+        windows up to. None before the first one"""
+        with self._iterlock:
+            iter_num = self._iter_num
+
+        return iter_num if iter_num >= 0 else None
 
     def get_uid_hw_report(self, uid, countertype):
         """Return report on power drawn by HW components for given UID"""
         power = {}
+        iter_num = self._get_counter_iter_num()
 
         for name, hw_pwrbuf in self._pwr_history.iteritems():
-            power[name] = (hw_pwrbuf.get_total(uid, countertype) *
-                           self.ITERATION_INTERVAL // 1000)
+            total = hw_pwrbuf.get_uid_total(uid, countertype, iter_num)
+            power[name] = total * self.ITERATION_INTERVAL // 1000
 
         return power
 
     def get_uid_runtime(self, uid, countertype):
         runtime = 0
+        iter_num = self._get_counter_iter_num()
 
         for name, hw_pwrbuf in self._pwr_history.iteritems():
-            bcount = hw_pwrbuf.get_uid_buffer_count(uid, countertype)
+            bcount = hw_pwrbuf.get_uid_buffer_count(uid, countertype, iter_num)
             if bcount > runtime:
                 runtime = bcount
 
@@ -290,37 +459,29 @@ class PowerEstimator(threading.Thread):
     def get_power_report(self, countertype, ignore_mask):
         report = {}
 
-        self._appslock.acquire()
-
-        for uid in self._running_apps.keys():
-            for i, hw_pwrbuf in enumerate(self._pwr_history.values()):
-                pwr = 0.0
-
-                with self._iterlock:
-                    # TODO: Fix invalid reference to _iter
-                    iter_num = self._iter
+        # Components are masked in the same order as get_hw_uid_mask
+        names = [name for i, name in enumerate(self._phone.hardware.keys())
+                 if (ignore_mask & 1 << i) == 0]
+        scale = self.ITERATION_INTERVAL / 1000
 
-                if (ignore_mask & 1 << i) == 0:
-                    counters = hw_pwrbuf.get(uid, iter_num, 1)
-                    pwr += counters[Counter.COUNTER_MINUTE]
+        with self._iterlock:
+            iter_num = self._iter_num
 
-                scale = self.ITERATION_INTERVAL / 1000
-
-                energy = self._filter_sum(self.get_uid_hw_report(uid,
-                                                                 countertype),
-                                          ignore_mask * scale)
+        with self._appslock:
+            for uid in self._running_apps.keys():
+                pwr = self._pwr_matrix.get_uid_sum(uid, iter_num, 1, names)
+                energy = (self._filter_sum(self.get_uid_hw_report(uid,
+                                                                  countertype),
+                                           ignore_mask) * scale)
                 runtime = (self.get_uid_runtime(uid, countertype) * scale)
-                uid_info = UidInfo(uid, pwr, energy, runtime)
-                report[uid] = uid_info
-
-        self._appslock.release()
+                report[uid] = UidInfo(uid, pwr, energy, runtime)
 
         return report
 
     @classmethod
     def _filter_sum(cls, hw_powers, ignore_mask):
         """Return the sum of values for list elements not on ignore mask"""
-        return sum(x for i, x in hw_powers.values().enumerate()
+        return sum(x for i, x in enumerate(hw_powers.values())
                    if (ignore_mask & (1 << i)) == 0)
 
     def get_uid_oled_power(self, uid):
@@ -331,8 +492,9 @@ class PowerEstimator(threading.Thread):
         if entries <= 0:
             return 0
 
-        norm = self._oled_pwr_history.get_uid_total(uid, Counter.COUNTER_TOTAL /
-                                                    1000) / entries
+        norm = (self._oled_pwr_history.get_uid_total(uid,
+                                                     Counter.COUNTER_TOTAL) /
+                1000 / entries)
 
         result = (norm * 255 /
                   self._phone.constants.get_max_power(Hardware.OLED) -
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+from StringIO import StringIO
+from benchmarks.batchreplay import BatchSummary
+from benchmarks.batchreplay import get_energies
+from benchmarks.batchreplay import load_model
+from benchmarks.batchreplay import replay_trace
+from benchmarks.batchreplay import replay_traces
+from benchmarks.fixtures import ProcTree
+from benchmarks.fixtures import record_trace
+from benchmarks.iterations import BenchPhone
+from utils import powerlog
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestBatchReplay(unittest.TestCase):
+
+    ITERATIONS = 4
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.paths = []
+
+        for i in xrange(3):
+            tree = ProcTree(os.path.join(self.root, "device{0}".format(i)),
+                            npids=10, nuids=4, ncores=1)
+            path = os.path.join(self.root, "trace{0}.bin".format(i))
+            with open(path, "wb") as out:
+                record_trace(tree, out, self.ITERATIONS, ["CPU0", "Wifi"])
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_load_model(self):
+        self.assertTrue(load_model("benchmarks.iterations.BenchPhone") is
+                        BenchPhone)
+        self.assertRaises(ValueError, load_model, "benchmarks.iterations.No")
+        self.assertRaises(ValueError, load_model, "nomodule.Phone")
+        self.assertRaises(ValueError, load_model, "Phone")
+
+    def test_get_energies(self):
+        records = [(powerlog.RECORD_APP_NAME, 10000, "app"),
+                   (powerlog.RECORD_POWER, 0, 300.0, [(10000, "CPU", 100.0),
+                                                      (-1, "CPU", 300.0)]),
+                   (powerlog.RECORD_POWER, 3, 100.0, [(10000, "CPU", 50.0)]),
+                   (powerlog.RECORD_CATCHUP, 2, 2, [(10000, "CPU", 50.0)])]
+
+        energies, names = get_energies(records, 1000)
+        self.assertEqual(energies, {(10000, "CPU"): 0.25, (-1, "CPU"): 0.3})
+        self.assertEqual(names, {10000: "app"})
+
+    def test_merge(self):
+        """ Energies of traces replayed in parallel add up to those of each
+        trace replayed alone """
+        summary = replay_traces(self.paths, processes=2)
+
+        expected = BatchSummary()
+        for path in self.paths:
+            expected.add(replay_trace((path, "benchmarks.iterations."
+                                             "BenchPhone")))
+
+        self.assertEqual((summary.traces, summary.iterations, summary.span),
+                         (3, 3 * self.ITERATIONS, 3000 * self.ITERATIONS))
+        self.assertEqual(summary.components, set(["CPU0", "Wifi"]))
+        self.assertEqual(sorted(summary.energies), sorted(expected.energies))
+        for uid, energies in expected.energies.iteritems():
+            for component, energy in energies.iteritems():
+                self.assertAlmostEqual(summary.energies[uid][component],
+                                       energy)
+
+        rows = summary.get_rows()
+        self.assertEqual(rows[0][0], -1)
+        self.assertEqual([row[2] for row in rows],
+                         sorted([row[2] for row in rows], reverse=True))
+
+    def test_failed_trace(self):
+        broken = os.path.join(self.root, "broken.bin")
+        with open(broken, "wb") as out:
+            out.write(b"PWRL")
+
+        summary = replay_traces(self.paths[:1] + [broken], processes=2)
+        self.assertEqual(summary.traces, 1)
+        self.assertEqual(sorted(summary.failed), [broken])
+
+        out = StringIO()
+        summary.export_text(out)
+        self.assertTrue("Failed {0}".format(broken) in out.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
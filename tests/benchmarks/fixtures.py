@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+from benchmarks.fixtures import ProcTree
+from benchmarks.fixtures import redirect
+from benchmarks.iterations import Benchmark
+from benchmarks.iterations import WARMUP
+from utils.batterystats import BatteryStats
+from utils.fdcache import fdcache
+from utils.systeminfo import SystemInfo
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestProcTree(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.tree = ProcTree(self.root, npids=10, nuids=4, ncores=2)
+        self.restore = redirect(self.root)
+
+    def tearDown(self):
+        self.restore()
+        fdcache.clear()
+        shutil.rmtree(self.root)
+
+    def test_read(self):
+        self.assertEqual(sorted(SystemInfo.get_running_pids()),
+                         self.tree.pids)
+        self.assertEqual(sorted(SystemInfo.get_uids()), self.tree.uids)
+        self.assertEqual(SystemInfo.get_uid_for_pid(101), self.tree.uids[1])
+        self.assertEqual(sorted(SystemInfo.get_cpus_usr_sys_total_times()),
+                         [0, 1])
+        self.assertEqual(BatteryStats.get_voltage(), 3.9)
+
+    def test_tick(self):
+        """ Counters move forward, also through descriptors kept open """
+        before = SystemInfo.get_cpus_usr_sys_total_times()[0]
+        self.tree.tick()
+        after = SystemInfo.get_cpus_usr_sys_total_times()[0]
+
+        self.assertTrue(after[2] > before[2])
+
+    def test_restore(self):
+        self.restore()
+        self.assertEqual(SystemInfo.PROC_STAT_FILE, "/proc/stat")
+        self.restore = lambda: None
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.benchmark = Benchmark(self.root, npids=20, nuids=5, ncores=2)
+
+    def tearDown(self):
+        self.benchmark.close()
+        shutil.rmtree(self.root)
+
+    def test_run(self):
+        """ All monitors and the estimator run off Android """
+        latencies = self.benchmark.run(3)
+
+        self.assertEqual(sorted(latencies), sorted(
+            ["CPU0", "CPU1", "Wifi", "3G", "Battery", "Estimator", "Total"]))
+        self.assertTrue(all(len(values) == 3 for values in
+                            latencies.itervalues()))
+        self.assertEqual(len(self.benchmark.run_memory(2)), 7)
+
+    def test_no_opens(self):
+        """ Once warm, iterations open no file at a realistic scale """
+        benchmark = Benchmark(os.path.join(self.root, "large"), npids=400,
+                              nuids=300, ncores=4)
+        try:
+            benchmark.run(WARMUP)
+            self.assertEqual(benchmark.run_opens(3), 0)
+        finally:
+            benchmark.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+from benchmarks.fixtures import ProcTree
+from benchmarks.fixtures import record_trace
+from benchmarks.replay import Replay
+from services.powerestimator import PowerEstimator
+from utils import powerlog
+from utils.powerlog import PowerLogSegments
+from utils.trace import TraceRecorder
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class UnclosedBytesIO(io.BytesIO):
+    """ Keep contents readable after the recorder closes it """
+
+    def close(self):
+        pass
+
+
+class TestReplay(unittest.TestCase):
+
+    ITERATIONS = 5
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.tree = ProcTree(os.path.join(self.root, "device"), npids=10,
+                             nuids=4, ncores=2)
+        out = UnclosedBytesIO()
+        record_trace(self.tree, out, self.ITERATIONS,
+                     ["CPU0", "CPU1", "Wifi", "GPS"])
+        self.trace = out.getvalue()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _replay(self, iterations=None):
+        log_file = os.path.join(self.root, "powerlog.bin")
+        replay = Replay(io.BytesIO(self.trace), os.path.join(self.root, "fs"),
+                        log_file)
+        try:
+            result = replay.run(iterations)
+        finally:
+            replay.close()
+
+        return result, list(PowerLogSegments(log_file))
+
+    def test_replay(self):
+        """ Every recorded iteration goes through monitors and estimator """
+        (iterations, span), records = self._replay()
+
+        self.assertEqual((iterations, span), (self.ITERATIONS,
+                                              1000 * self.ITERATIONS))
+        powers = [record for record in records if record[0] ==
+                  powerlog.RECORD_POWER]
+        self.assertEqual([record[1] for record in powers],
+                         range(self.ITERATIONS))
+        components = set(name for record in powers for _, name, _ in
+                         record[3])
+        self.assertEqual(components, set(["CPU0", "CPU1", "Wifi"]))
+        # Processes show up under the UIDs recorded for them
+        uids = set(uid for record in powers for uid, _, _ in record[3])
+        self.assertTrue(uids & set(self.tree.uids))
+
+    def test_partial(self):
+        (iterations, span), _ = self._replay(2)
+        self.assertEqual((iterations, span), (2, 2000))
+
+    def test_device_log_settings(self):
+        """ Records of traces spanning many segments of the device log are
+        all kept """
+        settings = {"LOG_SEGMENT_SIZE": 200, "LOG_SEGMENT_AGE": 1,
+                    "LOG_MAX_SIZE": 300, "LOG_QUEUE_SIZE": 1}
+        saved = {name: getattr(PowerEstimator, name) for name in settings}
+        for name, value in settings.iteritems():
+            setattr(PowerEstimator, name, value)
+        try:
+            _, records = self._replay()
+        finally:
+            for name, value in saved.iteritems():
+                setattr(PowerEstimator, name, value)
+
+        self.assertEqual([record[1] for record in records if record[0] ==
+                          powerlog.RECORD_POWER], range(self.ITERATIONS))
+
+    def test_no_hardware(self):
+        recorder = TraceRecorder()
+        out = UnclosedBytesIO()
+        recorder.start(out, 1000)
+        recorder.end_iteration(0, 0)
+        recorder.stop()
+
+        self.assertRaises(ValueError, Replay, io.BytesIO(out.getvalue()),
+                          os.path.join(self.root, "fs"), "unused")
+
+if __name__ == "__main__":
+    unittest.main()
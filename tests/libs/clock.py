@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+from libs.clock import Clock
+from libs.clock import VirtualClock
+
+import unittest
+
+
+class TestClock(unittest.TestCase):
+
+    def setUp(self):
+        self.source = VirtualClock(1000)
+        self.clock = Clock(self.source)
+
+    def test_now_cached(self):
+        """ Time only moves on tick """
+        self.source.advance(500)
+        self.assertEqual(self.clock.now(), 1000)
+        self.assertEqual(self.clock.elapsed_realtime(), 1500)
+
+        self.assertEqual(self.clock.tick(), 1500)
+        self.assertEqual(self.clock.now(), 1500)
+
+    def test_tick_monotonic(self):
+        self.source.advance(-100)
+        self.assertEqual(self.clock.tick(), 1000)
+
+    def test_set_source(self):
+        self.clock.set_source(VirtualClock(5))
+        self.assertEqual(self.clock.now(), 5)
+
+    def test_default_source(self):
+        """ System source counts milliseconds forward """
+        clock = Clock()
+        start = clock.now()
+        self.assertTrue(clock.tick() >= start)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+from libs.profiler import MonitorProfile
+from libs.profiler import SelfProfiler
+
+import threading
+import unittest
+
+
+class FakeTime(object):
+    """ Time source (s) moving by step on every read """
+
+    def __init__(self, step):
+        self.time = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.time += self.step
+        return self.time
+
+
+class TestSelfProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = SelfProfiler(FakeTime(0.5), FakeTime(0.25))
+
+    def _calc(self, nbytes):
+        self.profiler.count_open()
+        self.profiler.count_read(nbytes)
+        self.profiler.count_jni(2)
+        return nbytes
+
+    def test_run(self):
+        self.assertEqual(self.profiler.run("CPU", 0, self._calc, 100), 100)
+        self.profiler.run("CPU", 300, self._calc, 20)
+
+        profile = self.profiler.get_profiles()["CPU"]
+        self.assertEqual(profile.iterations, 2)
+        self.assertEqual(profile.wall_time, 1000.0)
+        self.assertEqual(profile.cpu_time, 500.0)
+        self.assertEqual(profile.max_wall_time, 500.0)
+        self.assertEqual(profile.file_opens, 2)
+        self.assertEqual(profile.bytes_read, 120)
+        self.assertEqual(profile.jni_calls, 4)
+        self.assertEqual(profile.lag_hist, [1, 0, 0, 0, 1, 0, 0])
+
+    def test_lag_hist(self):
+        for lag in (-5, 9, 10, 999, 1000, 5000):
+            self.profiler.run("CPU", lag, lambda: None)
+
+        self.assertEqual(self.profiler.get_profiles()["CPU"].lag_hist,
+                         [2, 1, 0, 0, 0, 1, 2])
+
+    def test_count_outside_iteration(self):
+        """ Counts outside of an iteration or from another thread are not
+        charged to any monitor """
+        self.profiler.count_open()
+
+        def calc():
+            thread = threading.Thread(target=self.profiler.count_jni)
+            thread.start()
+            thread.join()
+
+        self.profiler.run("GPS", 0, calc)
+
+        profile = self.profiler.get_profiles()["GPS"]
+        self.assertEqual((profile.file_opens, profile.jni_calls), (0, 0))
+
+    def test_nested(self):
+        def outer():
+            self.profiler.run("inner", 0, self._calc, 1)
+            self.profiler.count_read(10)
+
+        self.profiler.run("outer", 0, outer)
+
+        profiles = self.profiler.get_profiles()
+        self.assertEqual(profiles["inner"].bytes_read, 1)
+        self.assertEqual(profiles["outer"].bytes_read, 10)
+
+    def test_failed_iteration(self):
+        def fail():
+            raise ValueError("Broken monitor")
+
+        self.assertRaises(ValueError, self.profiler.run, "CPU", 0, fail)
+        self.assertEqual(self.profiler.get_profiles()["CPU"].iterations, 1)
+
+    def test_no_thread_time(self):
+        profiler = SelfProfiler(FakeTime(0.5), None)
+        profiler._thread_time = None
+        profiler.run("CPU", 0, lambda: None)
+
+        profile = profiler.get_profiles()["CPU"]
+        self.assertEqual((profile.wall_time, profile.cpu_time), (500.0, 0))
+
+    def test_profiles_copied(self):
+        self.profiler.run("CPU", 0, lambda: None)
+        profile = self.profiler.get_profiles()["CPU"]
+        profile.lag_hist[0] = 10
+
+        self.assertEqual(self.profiler.get_profiles()["CPU"].lag_hist[0], 1)
+        self.assertTrue(isinstance(profile, MonitorProfile))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 
 from monitors.cpu import CPU
+from monitors.cpu import CPUPollScheduler
 from monitors.cpu import CPUState
 from monitors.cpu import CPUUsage
 from phones.device import DeviceConstants
 from StringIO import StringIO
+from utils.fdcache import fdcache
 
 import __builtin__  # for open
 import mox          # for mock testing
@@ -66,8 +68,8 @@ class TestCPU(unittest.TestCase):
     def test_read_cpu_freq_sysfs(self):
         """ Test reading CPU frequency from mock sysfs
         """
-        self.m.StubOutWithMock(__builtin__, 'open')
-        open(self.sysfs_filename).AndReturn(StringIO("1200"))
+        self.m.StubOutWithMock(fdcache, 'read_int')
+        fdcache.read_int(self.sysfs_filename).AndReturn(1200000)
         self.m.ReplayAll()
 
         cpu = CPU(self.constants, 0)
@@ -79,10 +81,11 @@ class TestCPU(unittest.TestCase):
     def test_read_cpu_freq_cpuinfo(self):
         """ Test reading CPU frequency from mock /proc/cpuinfo
         """
+        self.m.StubOutWithMock(fdcache, 'read_int')
         self.m.StubOutWithMock(__builtin__, 'open')
 
-       # Force sysfs exception so that frequency is read from /proc/cpuinfo
-        open(self.sysfs_filename, 'r').AndRaises(IOError)
+       # Force sysfs failure so that frequency is read from /proc/cpuinfo
+        fdcache.read_int(self.sysfs_filename).AndReturn(-1)
         open(CPU.CPU_FREQ_FILE, 'r').AndReturn(StringIO(self.PROCINFO_OUT))
         self.m.ReplayAll()
 
@@ -92,10 +95,11 @@ class TestCPU(unittest.TestCase):
 
     def test_read_cpu_freq_fail(self):
         """ Test reading CPU frequency failure """
+        self.m.StubOutWithMock(fdcache, 'read_int')
         self.m.StubOutWithMock(__builtin__, 'open')
 
-       # Force sysfs exception so that frequency is read from /proc/cpuinfo
-        open(self.sysfs_filename, 'r').AndRaises(IOError)
+       # Force sysfs failure so that frequency is read from /proc/cpuinfo
+        fdcache.read_int(self.sysfs_filename).AndReturn(-1)
         open('/proc/cpuinfo', 'r').AndRaises(IOError)
         self.m.ReplayAll()
 
@@ -150,15 +154,38 @@ class TestCPUCase(unittest.TestCase):
         """ Test instance state after call to update() """
         self._state.update(self.TEST_USR_TIME, self.TEST_SYS_TIME,
                 self.TEST_TOTAL_TIME, self.TEST_ITERATION2)
-        self.assertEqual(self._state._delta_usr, self.TEST_USR_TIME)
-        self.assertEqual(self._state._delta_sys, self.TEST_SYS_TIME)
+        self.assertEqual(self._state._delta_usr, 0)
+        self.assertEqual(self._state._delta_sys, 0)
         self.assertEqual(self._state._delta_total, self.TEST_TOTAL_TIME)
         self.assertEqual(self._state._last_update, self.TEST_ITERATION2)
         self.assertEqual(self._state._inactive_iters, 0)
 
+        self._state.update(2 * self.TEST_USR_TIME, 2 * self.TEST_SYS_TIME,
+                2 * self.TEST_TOTAL_TIME, self.TEST_ITERATION2 + 1)
+        self.assertEqual(self._state._delta_usr, self.TEST_USR_TIME)
+        self.assertEqual(self._state._delta_sys, self.TEST_SYS_TIME)
+        self.assertEqual(self._state._delta_total, self.TEST_TOTAL_TIME)
+
+    def test_update_charge_back(self):
+        """ Time used while skipped is charged over the next iterations """
+        self._state.update(0, 0, 0, 0)
+        self._state.skip_update(1, 100)
+        self._state.update(120, 30, 200, 2)
+        self.assertAlmostEqual(self._state._delta_usr, 80)
+        self.assertAlmostEqual(self._state._delta_sys, 20)
+
+        self._state.skip_update(3, 300)
+        self.assertAlmostEqual(self._state._delta_usr, 40)
+        self.assertAlmostEqual(self._state._delta_sys, 10)
+
+        self._state.skip_update(4, 400)
+        self.assertAlmostEqual(self._state._delta_usr, 0)
+        self.assertAlmostEqual(self._state._delta_sys, 0)
+
     def test_absorb(self):
         """ Test instance state after call to absorb() """
         state2 = CPUState(self.TEST_UID)
+        state2.update(0, 0, 0, self.TEST_ITERATION1)
         state2.update(self.TEST_USR_TIME, self.TEST_SYS_TIME,
                 self.TEST_TOTAL_TIME, self.TEST_ITERATION2)
 
@@ -182,11 +209,42 @@ class TestCPUCase(unittest.TestCase):
     def test_is_alive_fail(self):
         self.assertFalse(self._state.is_alive(self.TEST_ITERATION2))
 
-    def test_is_stale(self):
-        self.assertTrue(self._state.is_stale(self.TEST_ITERATION2))
 
-    def test_is_stale_fail(self):
-        self.assertFalse(self._state.is_stale(self.TEST_ITERATION1))
+
+class TestCPUPollScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = CPUPollScheduler(periods=(1, 2, 4), read_budget=2,
+                                          warm_after=1, cold_after=3)
+
+    def _get_state(self, last_update, inactive_iters):
+        state = CPUState(1000)
+        state.update(0, 0, 0, last_update)
+        state._inactive_iters = inactive_iters
+        return state
+
+    def test_get_tier(self):
+        self.assertEqual(self.scheduler.get_tier(self._get_state(0, 0)),
+                         CPUPollScheduler.TIER_HOT)
+        self.assertEqual(self.scheduler.get_tier(self._get_state(0, 2)),
+                         CPUPollScheduler.TIER_WARM)
+        self.assertEqual(self.scheduler.get_tier(self._get_state(0, 3)),
+                         CPUPollScheduler.TIER_COLD)
+
+    def test_select_due(self):
+        """ Only processes whose tier period has elapsed are read """
+        running = [(1, self._get_state(9, 0)), (2, self._get_state(9, 5)),
+                   (3, self._get_state(6, 5))]
+        self.assertEqual(self.scheduler.select(running, 10), set([1, 3]))
+
+    def test_select_budget(self):
+        """ New processes come first, then the most overdue """
+        running = [(1, self._get_state(9, 0)), (2, CPUState(1000)),
+                   (3, self._get_state(0, 5))]
+        self.assertEqual(self.scheduler.select(running, 10), set([2, 3]))
+
+    def test_invalid_periods(self):
+        self.assertRaises(ValueError, CPUPollScheduler, (1, 2))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+from monitors.devicemonitor import DeviceMonitor
+
+import threading
+import unittest
+
+
+class TestDeviceMonitorSlots(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = DeviceMonitor("test", None)
+        self.monitor.init(0, 1000)
+
+    def test_catch_up(self):
+        """ Data of several iterations back is still there """
+        for iter_num in xrange(5):
+            self.monitor.publish(iter_num, "data{0}".format(iter_num))
+
+        self.assertEqual([self.monitor.get_data(i) for i in xrange(5)],
+                         ["data{0}".format(i) for i in xrange(5)])
+        # Reading doesn't consume
+        self.assertEqual(self.monitor.get_data(3), "data3")
+
+    def test_overwritten(self):
+        slots = DeviceMonitor.DATA_SLOTS
+        for iter_num in xrange(slots + 2):
+            self.monitor.publish(iter_num, iter_num)
+
+        self.assertEqual(self.monitor.get_data(1), None)
+        self.assertEqual(self.monitor.get_data(2), 2)
+        self.assertEqual(self.monitor.get_data(slots + 1), slots + 1)
+
+    def test_missing(self):
+        self.monitor.publish(0, "data0")
+        self.monitor.publish(1, None)
+
+        self.assertEqual(self.monitor.get_data(1), None)
+        self.assertEqual(self.monitor.get_data(2), None)
+
+    def test_span(self):
+        """ Data covers iterations skipped since the last one published """
+        self.monitor.publish(0, "data0")
+        self.monitor.publish(3, "data3")
+        self.monitor.publish(4, None)
+        self.monitor.publish(6, "data6")
+
+        self.assertEqual(self.monitor.get_data_span(0), ("data0", 1))
+        self.assertEqual(self.monitor.get_data_span(3), ("data3", 3))
+        self.assertEqual(self.monitor.get_data_span(4), (None, 0))
+        self.assertEqual(self.monitor.get_data_span(6), ("data6", 2))
+
+    def test_concurrent(self):
+        """ A reader never sees data of another iteration """
+        count = 20000
+        wrong = []
+
+        def produce():
+            for iter_num in xrange(count):
+                self.monitor.publish(iter_num, iter_num)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        for iter_num in xrange(count):
+            data = self.monitor.get_data(iter_num)
+            if data is not None and data != iter_num:
+                wrong.append((iter_num, data))
+        producer.join()
+
+        self.assertEqual(wrong, [])
+
+if __name__ == "__main__":
+    unittest.main()
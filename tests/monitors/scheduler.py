@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+from libs.profiler import profiler
+from monitors.devicemonitor import DeviceMonitor
+from monitors.scheduler import MonitorScheduler
+
+import logging
+import unittest
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class FakeMonitor(DeviceMonitor):
+
+    def __init__(self, name, fail=False):
+        super(FakeMonitor, self).__init__(name, None)
+        self.fail = fail
+        self.iterations = []
+
+    def calc_iteration(self, iter_num):
+        if self.fail:
+            raise ValueError("Broken monitor")
+
+        self.iterations.append(iter_num)
+        return "data{0}".format(iter_num)
+
+
+class TestMonitorScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.fast = FakeMonitor("fast")
+        self.slow = FakeMonitor("slow")
+        self.done = []
+        self.scheduler = MonitorScheduler([self.fast, self.slow, None], 1000,
+                                          {"slow": 2}, self.done.append)
+
+        for monitor in (self.fast, self.slow):
+            monitor.init(0, 1000)
+
+    def test_run_iteration_periods(self):
+        for iter_num in xrange(4):
+            self.scheduler.run_iteration(iter_num)
+
+        self.assertEqual(self.fast.iterations, [0, 1, 2, 3])
+        self.assertEqual(self.slow.iterations, [0, 2])
+        self.assertEqual(self.done, [0, 1, 2, 3])
+
+    def test_get_data(self):
+        """ Data is published as if monitors ran on their own thread """
+        self.scheduler.run_iteration(0)
+        self.scheduler.run_iteration(1)
+
+        self.assertEqual(self.fast.get_data(0), "data0")
+        self.assertEqual(self.fast.get_data(1), "data1")
+        self.assertEqual(self.slow.get_data(1), None)
+
+    def test_expected_gaps(self):
+        """ Only data missing on iterations a monitor is due is warned of """
+        handler = RecordingHandler()
+        self.slow.logger.addHandler(handler)
+        self.scheduler.run_iteration(0)
+        self.scheduler.run_iteration(1)
+
+        try:
+            self.assertEqual(self.slow.get_data_span(1), (None, 0))
+            self.assertEqual(handler.records, [])
+            self.assertEqual(self.slow.get_data_span(2), (None, 0))
+            self.assertEqual(len(handler.records), 1)
+        finally:
+            self.slow.logger.removeHandler(handler)
+
+    def test_failing_monitor(self):
+        """ One monitor failing doesn't stop the others """
+        broken = FakeMonitor("broken", fail=True)
+        broken.init(0, 1000)
+        scheduler = MonitorScheduler([broken, self.fast], 1000)
+        scheduler.run_iteration(0)
+
+        self.assertEqual(self.fast.iterations, [0])
+        self.assertEqual(broken.get_data(0), None)
+
+    def test_profiled(self):
+        """ Iterations are profiled under the monitor name """
+        profiler.reset()
+        for iter_num in xrange(4):
+            self.scheduler.run_iteration(iter_num)
+
+        profiles = profiler.get_profiles()
+        self.assertEqual(profiles["fast"].iterations, 4)
+        self.assertEqual(profiles["slow"].iterations, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 
+from libs.clock import VirtualClock
+from libs.clock import clock
+from libs.notification import NotificationProxy
 from monitors.sensors import Sensors
 from monitors.sensors import SensorState
 from monitors.sensors import SensorUsage
@@ -212,3 +215,59 @@ class TestSensorState(unittest.TestCase):
 
         self.assertEqual(state.started_sensors, 0)
         self.m.VerifyAll()
+
+class TestSensorsEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_sensors = Sensors.SENSORS
+        Sensors.SENSORS = ['accelerometer', 'magnetometer']
+
+    def tearDown(self):
+        Sensors.SENSORS = self.saved_sensors
+
+    def test_fold_events(self):
+        """ Queued events are folded at the time they happened """
+        sensors = Sensors.__new__(Sensors)
+        sensors._state = SensorState()
+        sensors._uid_states = {}
+        start = sensors._state._timestamp
+
+        sensors.fold_events([
+            (start + 10, NotificationProxy.ON_START_SENSOR,
+             (10001, 'accelerometer')),
+            (start + 40, NotificationProxy.ON_STOP_SENSOR,
+             (10001, 'accelerometer')),
+            (start + 50, NotificationProxy.ON_START_SENSOR, (10002, 'compass')),
+        ])
+
+        self.assertEqual(sensors._state._on_times['accelerometer'], 30)
+        self.assertEqual(sensors._state.started_sensors, 0)
+        self.assertEqual(sensors._uid_states[10002].started_sensors, 0)
+
+    def test_fold_events_new_uid(self):
+        """ On-time of a UID first seen in queued events counts from the
+        start of the iteration """
+        source = VirtualClock(1000)
+        clock.set_source(source)
+
+        sensors = Sensors.__new__(Sensors)
+        sensors._state = SensorState()
+        sensors._uid_states = {}
+
+        # Events queued during the iteration are folded at its end
+        source.advance(100)
+        clock.tick()
+        sensors.fold_events([
+            (1010, NotificationProxy.ON_START_SENSOR,
+             (10001, 'accelerometer')),
+            (1040, NotificationProxy.ON_STOP_SENSOR,
+             (10001, 'accelerometer')),
+        ])
+
+        self.assertEqual(sensors._uid_states[10001].get_times(),
+                         {'accelerometer': 0.3, 'magnetometer': 0})
+        self.assertEqual(sensors._state.get_times(),
+                         {'accelerometer': 0.3, 'magnetometer': 0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+from monitors.wifi import Wifi
+from phones.powermodel import PiecewiseLinear
+from phones.powermodel import PowerModel
+
+import random
+import unittest
+
+
+class TestPiecewiseLinear(unittest.TestCase):
+
+    SPEEDS = [1, 2, 5.5, 6, 9, 11, 12, 18, 24, 36, 48, 54]
+    RATIOS = [47.122645, 46.354821, 43.667437, 43.283525, 40.980053, 39.44422,
+              38.676581, 34.069637, 29.462693, 20.248805, 11.034917, 6.427122]
+
+    @classmethod
+    def _interpolate(cls, xs, ys, x):
+        """ Search and interpolation as the power calculators used to do """
+        lo = 0
+        hi = len(xs)
+        while lo < hi:
+            mid = lo + (hi - lo) // 2
+            if xs[mid] <= x:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        i = min(max(lo, 1), len(xs) - 1)
+        return (ys[i - 1] + (ys[i] - ys[i - 1]) / (xs[i] - xs[i - 1]) *
+                (x - xs[i - 1]))
+
+    def test_get(self):
+        """ Same results as searching and interpolating from scratch """
+        table = PiecewiseLinear(self.SPEEDS, self.RATIOS, 0.5)
+        rand = random.Random(7)
+        values = ([rand.uniform(-5, 70) for _ in xrange(1000)] + self.SPEEDS +
+                  [x + 0.25 for x in self.SPEEDS] + [0, 0.5, 54.5, 100])
+
+        for x in values:
+            self.assertEqual(repr(table.get(x)),
+                             repr(self._interpolate(self.SPEEDS, self.RATIOS,
+                                                    x)))
+
+    def test_get_coarse_step(self):
+        """ Several points falling in the same step """
+        table = PiecewiseLinear(self.SPEEDS, self.RATIOS, 10)
+        for x in (1.5, 5.7, 6, 11.5, 12):
+            count = sum(1 for speed in self.SPEEDS if speed <= x)
+            self.assertEqual(table.get_segment(x),
+                             min(max(count, 1), len(self.SPEEDS) - 1))
+
+    def test_get_single_point(self):
+        self.assertEqual(PiecewiseLinear([998], [5.7296], 1).get(100), 5.7296)
+
+    def test_get_empty(self):
+        self.assertEqual(PiecewiseLinear([], [], 1).get(100), 0)
+
+
+class TestPowerModel(unittest.TestCase):
+
+    class Constants(object):
+        MODEL_NAME = "test"
+        CPU_FREQS = [245, 384, 460]
+        CPU_PWR_RATIOS = [1.1273, 1.5907, 1.8736]
+        WIFI_LINK_SPEEDS = [1, 2, 5.5]
+        WIFI_LINK_RATIOS = []
+        WIFI_LOW_PWR = 34.37
+        WIFI_HIGH_PWR = 404.46
+        GPS_STATE_PWRS = [0, 17.5, 268.94]
+
+    def test_cpu_ratio_clamped(self):
+        model = PowerModel(self.Constants)
+        self.assertEqual(model.get_cpu_ratio(100), 1.1273)
+        self.assertEqual(model.get_cpu_ratio(1000), 1.8736)
+
+    def test_uncalibrated(self):
+        """ Missing ratios are not an error """
+        model = PowerModel(self.Constants)
+        self.assertEqual(len(model.wifi), 0)
+        self.assertEqual(model.get_wifi_ratio(2), 0)
+
+    def test_powers(self):
+        model = PowerModel(self.Constants)
+        self.assertEqual((model.wifi_low_pwr, model.wifi_high_pwr),
+                         (34.37, 404.46))
+        self.assertEqual(model.gps_state_pwrs, (0, 17.5, 268.94))
+
+    def test_uncalibrated_powers(self):
+        class Constants(self.Constants):
+            WIFI_LOW_PWR = None
+            WIFI_HIGH_PWR = None
+            GPS_STATE_PWRS = []
+
+        model = PowerModel(Constants)
+        self.assertEqual((model.wifi_low_pwr, model.wifi_high_pwr), (0, 0))
+        self.assertEqual(model.gps_state_pwrs, ())
+
+    def test_negative_power(self):
+        class Constants(self.Constants):
+            WIFI_HIGH_PWR = -1
+
+        self.assertRaises(ValueError, PowerModel, Constants)
+
+    def test_gps_states_mismatch(self):
+        class Constants(self.Constants):
+            GPS_STATE_PWRS = [17.5, 268.94]
+
+        self.assertRaises(ValueError, PowerModel, Constants)
+
+    def test_length_mismatch(self):
+        class Constants(self.Constants):
+            CPU_FREQS = [245, 384]
+
+        self.assertRaises(ValueError, PowerModel, Constants)
+
+    def test_not_increasing(self):
+        class Constants(self.Constants):
+            WIFI_LINK_RATIOS = [47.1, 46.3, 43.6]
+            WIFI_LINK_SPEEDS = [1, 5.5, 2]
+
+        self.assertRaises(ValueError, PowerModel, Constants)
+
+
+class TestPowerModelPowers(unittest.TestCase):
+    """ Scalar and column power functions against the power calculators as
+    they were before models were compiled, bit for bit """
+
+    class Constants(object):
+        MODEL_NAME = "test"
+        CPU_FREQS = [245, 384, 460, 499, 576, 614, 652, 691, 768, 806, 845,
+                     998]
+        CPU_PWR_RATIOS = [1.1273, 1.5907, 1.8736, 2.1745, 2.6031, 2.9612,
+                          3.1858, 3.4878, 3.8532, 4.4697, 4.9291, 5.7296]
+        GPS_STATE_PWRS = [0.0, 173.55, 429.55]
+        WIFI_LOW_PWR = 34
+        WIFI_HIGH_PWR = 710
+        WIFI_LINK_SPEEDS = [1, 2, 5.5, 6, 9, 11, 12, 18, 24, 36, 48, 54]
+        WIFI_LINK_RATIOS = [47.122645, 46.354821, 43.667437, 43.283525,
+                            40.980053, 39.44422, 38.676581, 34.069637,
+                            29.462693, 20.248805, 11.034917, 6.427973]
+
+    @classmethod
+    def _upper_bound(cls, value, list_):
+        lo = 0
+        hi = len(list_)
+
+        while lo < hi:
+            mid = lo + (hi - lo) // 2
+            if list_[mid] <= value:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    @classmethod
+    def _get_cpu_power(cls, c, freq, usr_perc, sys_perc):
+        """ BasePowerCalculator.get_cpu_power before models, clamping freq
+        to CPU_FREQS rather than to CPU_PWR_RATIOS """
+        if len(c.CPU_PWR_RATIOS) == 0:
+            return 0
+        elif len(c.CPU_PWR_RATIOS) == 1:
+            ratio = c.CPU_PWR_RATIOS[0]
+        else:
+            if freq < c.CPU_FREQS[0]:
+                freq = c.CPU_FREQS[0]
+            if freq > c.CPU_FREQS[-1]:
+                freq = c.CPU_FREQS[-1]
+
+            i = cls._upper_bound(freq, c.CPU_FREQS)
+
+            if i == 0:
+                i += 1
+            elif i == len(c.CPU_FREQS):
+                i -= 1
+
+            ratio = (c.CPU_PWR_RATIOS[i - 1] +
+                     (c.CPU_PWR_RATIOS[i] - c.CPU_PWR_RATIOS[i - 1]) /
+                     (c.CPU_FREQS[i] - c.CPU_FREQS[i - 1]) *
+                     (freq - c.CPU_FREQS[i - 1]))
+
+        return max(0, ratio * (usr_perc + sys_perc))
+
+    @classmethod
+    def _get_wifi_power(cls, c, on, pwr_state, speed, tx_rate):
+        """ BasePowerCalculator.get_wifi_power before models """
+        ratio = 0
+
+        if not on:
+            return 0
+        if pwr_state == Wifi.POWER_STATE_LOW:
+            return c.WIFI_LOW_PWR
+        if pwr_state == Wifi.POWER_STATE_HIGH:
+            if len(c.WIFI_LINK_SPEEDS) == 1:
+                ratio = c.WIFI_LINK_RATIOS[0]
+            else:
+                i = cls._upper_bound(speed, c.WIFI_LINK_SPEEDS)
+                if i == 0:
+                    i += 1
+                elif i == len(c.WIFI_LINK_SPEEDS):
+                    i -= 1
+
+                ratio = (c.WIFI_LINK_RATIOS[i - 1] +
+                         (c.WIFI_LINK_RATIOS[i] - c.WIFI_LINK_RATIOS[i - 1]) /
+                         (c.WIFI_LINK_SPEEDS[i] - c.WIFI_LINK_SPEEDS[i - 1]) *
+                         (speed - c.WIFI_LINK_SPEEDS[i - 1]))
+
+        return max(0, c.WIFI_HIGH_PWR + ratio * tx_rate)
+
+    def setUp(self):
+        self.random = random.Random(42)
+
+    def _assert_same(self, expected, powers):
+        self.assertEqual([repr(power) for power in expected],
+                         [repr(power) for power in powers])
+
+    def _check_cpu(self, constants, freqs):
+        model = PowerModel(constants)
+        rows = [(self.random.choice(freqs), self.random.uniform(0, 50),
+                 self.random.uniform(0, 50)) for _ in xrange(200)]
+        expected = [self._get_cpu_power(constants, *row) for row in rows]
+
+        self._assert_same(expected, [model.get_cpu_power(*row) for row in
+                                     rows])
+        self._assert_same(expected, model.get_cpu_powers(*zip(*rows)))
+
+    def test_cpu_power(self):
+        self._check_cpu(self.Constants,
+                        self.Constants.CPU_FREQS + [0, 100, 300, 1200])
+
+    def test_cpu_power_single_ratio(self):
+        class Constants(self.Constants):
+            CPU_FREQS = [998]
+            CPU_PWR_RATIOS = [5.7296]
+
+        self._check_cpu(Constants, [100, 998, 1200])
+
+    def test_cpu_power_uncalibrated(self):
+        class Constants(self.Constants):
+            CPU_FREQS = []
+            CPU_PWR_RATIOS = []
+
+        self._check_cpu(Constants, [100, 998])
+
+    def _check_wifi(self, constants):
+        model = PowerModel(constants)
+        states = [Wifi.POWER_STATE_LOW, Wifi.POWER_STATE_HIGH]
+        speeds = constants.WIFI_LINK_SPEEDS + [0, 7, 60]
+        rows = [(self.random.random() > 0.2, self.random.choice(states),
+                 self.random.choice(speeds), self.random.uniform(0, 20))
+                for _ in xrange(200)]
+        expected = [self._get_wifi_power(constants, *row) for row in rows]
+
+        self._assert_same(expected, [model.get_wifi_power(*row) for row in
+                                     rows])
+        self._assert_same(expected, model.get_wifi_powers(*zip(*rows)))
+
+    def test_wifi_power(self):
+        self._check_wifi(self.Constants)
+
+    def test_wifi_power_single_speed(self):
+        class Constants(self.Constants):
+            WIFI_LINK_SPEEDS = [54]
+            WIFI_LINK_RATIOS = [6.427973]
+
+        self._check_wifi(Constants)
+
+    def test_gps_power(self):
+        model = PowerModel(self.Constants)
+        state_times = [[self.random.uniform(0, 1) for _ in xrange(3)] for _ in
+                       xrange(50)]
+        expected = [sum(time * power for time, power in
+                        zip(times, self.Constants.GPS_STATE_PWRS)) for times
+                    in state_times]
+
+        self._assert_same(expected, [model.get_gps_power(times) for times in
+                                     state_times])
+        self._assert_same(expected, model.get_gps_powers(state_times))
+
+if __name__ == "__main__":
+    unittest.main()
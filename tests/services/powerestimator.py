@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+from benchmarks.iterations import Benchmark
+from services.powerestimator import PowerEstimator
+from utils import trace
+from utils.trace import TraceReader
+from utils.trace import tracer
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestPowerEstimatorTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "trace.bin")
+        PowerEstimator.TRACE_FILE = self.path
+
+    def tearDown(self):
+        PowerEstimator.TRACE_FILE = None
+        tracer.stop()
+        shutil.rmtree(self.root)
+
+    def test_trace_file(self):
+        """ Estimator records iterations of its phone to TRACE_FILE """
+        PowerEstimator.start_trace()
+        self.assertTrue(tracer.recording)
+
+        bench = Benchmark(self.root, npids=4, nuids=2, ncores=1)
+        try:
+            bench.run(3)
+        finally:
+            bench.close()
+        tracer.stop()
+
+        with open(self.path, "rb") as fp:
+            records = list(TraceReader(fp))
+        hardware = [record for record in records if record[0] ==
+                    trace.TRACE_HARDWARE]
+        self.assertEqual(len(hardware), 1)
+        self.assertEqual(set(hardware[0][2]), set(["CPU0", "Wifi", "3G"]))
+        self.assertEqual([record[1] for record in records if record[0] ==
+                          trace.TRACE_ITERATION], [0, 1, 2])
+        self.assertTrue(any(record[0] == trace.TRACE_FILE for record in
+                            records))
+
+    def test_no_trace_file(self):
+        PowerEstimator.TRACE_FILE = None
+        PowerEstimator.start_trace()
+        self.assertFalse(tracer.recording)
+
+    def test_unwritable_trace_file(self):
+        PowerEstimator.TRACE_FILE = os.path.join(self.root, "none", "t.bin")
+        PowerEstimator.start_trace()
+        self.assertFalse(tracer.recording)
+
+if __name__ == "__main__":
+    unittest.main()
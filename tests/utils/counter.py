@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+from utils.counter import Counter
+
+import unittest
+
+
+class TestCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.counter = Counter()
+
+    def test_get_total(self):
+        self.counter.add(1.5, 0)
+        self.counter.add(2, 0)
+        self.counter.add(3, 7200)
+
+        self.assertEqual(self.counter.get(Counter.COUNTER_TOTAL), 6.5)
+
+    def test_get_minute(self):
+        for i in xrange(90):
+            self.counter.add(1, i)
+
+        # Last 60 seconds, each in its own bucket, plus the one just dropped
+        # as the current bucket has just started
+        self.assertEqual(self.counter.get(Counter.COUNTER_MINUTE), 61)
+        self.assertEqual(self.counter.get(Counter.COUNTER_HOUR), 90)
+
+    def test_get_same_iteration(self):
+        """ Adds on the same iteration land in the same bucket """
+        self.counter.add(1, 5)
+        self.counter.add(2, 5)
+
+        self.assertEqual(self.counter.get(Counter.COUNTER_MINUTE), 3)
+
+    def test_get_after_gap(self):
+        """ Buckets older than the window are left out after a long gap """
+        self.counter.add(5, 0)
+        self.counter.add(1, 10 * 60)
+
+        self.assertEqual(self.counter.get(Counter.COUNTER_MINUTE), 1)
+        self.assertEqual(self.counter.get(Counter.COUNTER_HOUR), 6)
+
+    def test_get_later_iteration(self):
+        """ Window slides up to the iteration asked for """
+        self.counter.add(5, 0)
+
+        self.assertEqual(self.counter.get(Counter.COUNTER_MINUTE, 30), 5)
+        self.assertEqual(self.counter.get(Counter.COUNTER_MINUTE, 120), 0)
+
+    def test_get_dropped_bucket(self):
+        """ Bucket just sliding out of the window still counts while the
+        current bucket is starting """
+        counter = Counter(iter_interval=500)
+        counter.add(4, 0)
+        counter.add(1, 120)
+
+        self.assertEqual(counter.get(Counter.COUNTER_MINUTE), 5)
+        self.assertEqual(counter.get(Counter.COUNTER_MINUTE, 121), 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+from libs.clock import VirtualClock
+from libs.clock import clock
+from utils.eventqueue import EventQueue
+
+import threading
+import unittest
+
+
+class TestEventQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.source = VirtualClock(1000)
+        clock.set_source(self.source)
+        self.queue = EventQueue()
+
+    def test_push_drain(self):
+        """ Events come out oldest first, stamped with push time """
+        self.queue.push(1, 10000, 'a')
+        self.source.advance(5)
+        self.queue.push(2, 10001)
+
+        self.assertEqual(len(self.queue), 2)
+        self.assertEqual(self.queue.drain(), [(1000, 1, (10000, 'a')),
+                                              (1005, 2, (10001,))])
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(self.queue.drain(), [])
+
+    def test_concurrent_push(self):
+        """ No event is lost nor reordered with several producers """
+        def produce(kind):
+            for i in xrange(1000):
+                self.queue.push(kind, i)
+
+        threads = [threading.Thread(target=produce, args=(kind,)) for kind in
+                   xrange(4)]
+        events = []
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            events.extend(self.queue.drain())
+        for thread in threads:
+            thread.join()
+        events.extend(self.queue.drain())
+
+        self.assertEqual(len(events), 4000)
+        for kind in xrange(4):
+            self.assertEqual([args[0] for _, k, args in events if k == kind],
+                             range(1000))
+
+if __name__ == "__main__":
+    unittest.main()
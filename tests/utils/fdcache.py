@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+from libs.clock import VirtualClock
+from libs.clock import clock
+from utils.fdcache import DescriptorCache
+
+import os
+import resource
+import shutil
+import tempfile
+import unittest
+
+
+class TestDescriptorCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = DescriptorCache(max_size=2)
+        self.source = VirtualClock(0)
+        clock.set_source(self.source)
+
+    def tearDown(self):
+        self.cache.clear()
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as fp:
+            fp.write(data)
+        return path
+
+    def test_read_int(self):
+        path = self._write("tcp_snd", "1024\n")
+        self.assertEqual(self.cache.read_int(path), 1024)
+
+    def test_read_int_missing(self):
+        path = os.path.join(self.dir, "missing")
+        self.assertEqual(self.cache.read_int(path), -1)
+        self.assertEqual(self.cache.read_int(path, None), None)
+
+    def test_reread_changed_value(self):
+        """ Kept descriptor sees new contents of the same file """
+        path = self._write("tcp_rcv", "10")
+        self.assertEqual(self.cache.read_int(path), 10)
+
+        with open(path, "r+") as fp:
+            fp.write("20")
+
+        self.assertEqual(self.cache.read_int(path), 20)
+
+    def test_cyclic_reads(self):
+        """ Files read in a cycle larger than the cache keep the ones open
+        reused instead of closing each one before it is read again """
+        paths = [self._write(str(i), str(i)) for i in xrange(3)]
+        for _ in xrange(3):
+            for path in paths:
+                self.assertEqual(self.cache.read(path), path[-1])
+            clock.tick()
+
+        self.assertEqual(sorted(self.cache._fds.keys()), paths[:2])
+        # Two files opened once, the third one on every round
+        self.assertEqual(self.cache.opens, 2 + 3)
+
+    def test_idle_eviction(self):
+        """ Files not read for IDLE_TIME make room for new ones """
+        paths = [self._write(str(i), str(i)) for i in xrange(3)]
+        self.cache.read(paths[0])
+        self.cache.read(paths[1])
+
+        self.source.advance(DescriptorCache.IDLE_TIME)
+        clock.tick()
+        self.cache.read(paths[1])
+        self.cache.read(paths[2])
+
+        self.assertEqual(list(self.cache._fds.keys()), paths[1:])
+
+    def test_default_size(self):
+        """ Default size follows the limit of open files, left as is """
+        limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+        cache = DescriptorCache()
+        self.assertTrue(cache._max_size >= DescriptorCache.MIN_SIZE)
+        self.assertEqual(resource.getrlimit(resource.RLIMIT_NOFILE), limit)
+
+    def test_raise_limit(self):
+        """ Raising the limit of open files grows a cache of default size
+        only """
+        limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if limit[1] != resource.RLIM_INFINITY and limit[1] <= (
+                DescriptorCache.MIN_SIZE * 2):
+            self.skipTest("Hard limit of open files too low")
+
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE,
+                               (DescriptorCache.MIN_SIZE * 2, limit[1]))
+            cache = DescriptorCache()
+            self.assertEqual(cache._max_size, DescriptorCache.MIN_SIZE)
+
+            cache.raise_limit()
+            self.cache.raise_limit()
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, limit)
+
+        self.assertTrue(cache._max_size > DescriptorCache.MIN_SIZE)
+        self.assertEqual(self.cache._max_size, 2)
+
+    def test_invalidate(self):
+        path = self._write("stat", "1")
+        self.cache.read(path)
+        self.cache.invalidate(path)
+
+        self.assertEqual(len(self.cache._fds), 0)
+
+if __name__ == "__main__":
+    unittest.main()
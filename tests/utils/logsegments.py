@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+from libs.clock import VirtualClock
+from libs.clock import clock
+from utils.logsegments import SegmentedFile
+from utils.logsegments import get_segments
+from utils.logsegments import open_segment
+from utils.logwriter import BackgroundWriter
+from utils.powerlog import PowerLogFile
+from utils.powerlog import PowerLogSegments
+from utils.powerlog import PowerLogWriter
+from utils.powerlog import index_segment
+
+import os
+import shutil
+import tempfile
+import unittest
+import utils.powerlog
+
+
+class TestSegmentedFile(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.dir, "powerlog.bin")
+        self.source = VirtualClock(0)
+        clock.set_source(self.source)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _read_segments(self):
+        contents = []
+        for _, path in get_segments(self.prefix):
+            with open_segment(path) as fp:
+                contents.append(fp.read())
+        return contents
+
+    def test_rotate_by_size(self):
+        """ Every segment starts with the header and holds whole records """
+        out = SegmentedFile(self.prefix, max_size=10, max_age=None)
+        out.write(b"HH")
+        out.writelines([b"aaaa", b"bbbb", b"cccc", b"dd"])
+        out.writelines([b"e"])
+        out.close()
+
+        self.assertEqual(self._read_segments(), [b"HHaaaabbbb", b"HHccccdde"])
+        self.assertTrue(all(path.endswith(".gz") for _, path in
+                            get_segments(self.prefix)))
+
+    def test_rotate_by_age(self):
+        out = SegmentedFile(self.prefix, max_size=None, max_age=60,
+                            compress=False)
+        out.write(b"H")
+        out.writelines([b"a"])
+        self.source.advance(59 * 1000)
+        out.writelines([b"b"])
+        self.source.advance(1000)
+        out.writelines([b"c"])
+        out.close()
+
+        self.assertEqual(self._read_segments(), [b"Hab", b"Hc"])
+
+    def test_retention(self):
+        """ Oldest segments go once over budget """
+        out = SegmentedFile(self.prefix, max_size=100, max_age=None,
+                            max_total=250, compress=False)
+        out.write(b"H")
+        for _ in xrange(5):
+            out.writelines([b"x" * 99])
+        out.close()
+
+        self.assertEqual([number for number, _ in get_segments(self.prefix)],
+                         [4, 5])
+
+    def test_resume(self):
+        """ New segments follow the ones of a previous run, which get
+        compressed """
+        with open(self.prefix + ".000007", "wb") as fp:
+            fp.write(b"old")
+
+        out = SegmentedFile(self.prefix)
+        out.write(b"new")
+        out.close()
+
+        self.assertEqual([os.path.basename(path) for _, path in
+                          get_segments(self.prefix)],
+                         ["powerlog.bin.000007.gz", "powerlog.bin.000008.gz"])
+        self.assertEqual(self._read_segments(), [b"old", b"new"])
+
+    def test_sidecars(self):
+        """ Files made on close stay along compressed segments and go with
+        them """
+        def on_close(path):
+            with open(path + ".idx", "wb") as fp:
+                fp.write(b"i")
+
+        out = SegmentedFile(self.prefix, max_size=100, max_age=None,
+                            max_total=100, on_close=on_close)
+        out.write(b"H")
+        for _ in xrange(5):
+            out.writelines([b"x" * 99])
+        out.close()
+
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ["powerlog.bin.000005.gz",
+                          "powerlog.bin.000005.idx"])
+
+
+class TestPowerLogSegments(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.dir, "powerlog.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_read_across_segments(self):
+        out = SegmentedFile(self.prefix, max_size=200, max_age=None)
+        writer = PowerLogWriter(out, ["CPU"], "passion", flush_interval=1)
+        for i in xrange(100):
+            writer.write_power(i, 1.0, [(10045, "CPU", float(i))])
+        writer.close()
+
+        self.assertTrue(len(get_segments(self.prefix)) > 5)
+
+        segments = PowerLogSegments(self.prefix)
+        self.assertEqual(segments.model_name, "passion")
+        self.assertEqual([record[1] for record in segments], range(100))
+        self.assertEqual(segments.get_uid_powers(10045, 40, 42),
+                         [(40, "CPU", 40.0), (41, "CPU", 41.0),
+                          (42, "CPU", 42.0)])
+
+    def test_background_writer(self):
+        """ Headers written through a BackgroundWriter, as the estimator
+        does, start every segment """
+        out = BackgroundWriter(SegmentedFile(self.prefix, max_size=200,
+                                             max_age=None),
+                               policy=BackgroundWriter.BLOCK)
+        writer = PowerLogWriter(out, ["CPU"], "passion", flush_interval=1)
+        for i in xrange(50):
+            writer.write_power(i, 1.0, [(10045, "CPU", float(i))])
+        writer.close()
+
+        self.assertTrue(len(get_segments(self.prefix)) > 1)
+        self.assertEqual([record[1] for record in
+                          PowerLogSegments(self.prefix)], range(50))
+
+    def _write_indexed(self, count):
+        out = SegmentedFile(self.prefix, max_size=400, max_age=None,
+                            on_close=index_segment)
+        writer = PowerLogWriter(out, ["CPU"], "passion", flush_interval=1)
+        for i in xrange(count):
+            writer.write_power(i, 1.0, [(10045, "CPU", float(i))])
+        writer.close()
+
+    def test_indexed_segments(self):
+        """ Compressed segments keep their index, through which ranges are
+        found without reading the segments before them """
+        interval = PowerLogFile.INDEX_INTERVAL
+        PowerLogFile.INDEX_INTERVAL = 4
+        try:
+            self._write_indexed(200)
+        finally:
+            PowerLogFile.INDEX_INTERVAL = interval
+
+        paths = [path for _, path in get_segments(self.prefix)]
+        self.assertTrue(len(paths) > 5)
+        for path in paths:
+            self.assertTrue(path.endswith(".gz"))
+            self.assertTrue(os.path.exists(path[:-3] + ".idx"))
+
+        segments = PowerLogSegments(self.prefix)
+        opened = []
+
+        def open_segment_(path):
+            opened.append(path)
+            return open_segment(path)
+
+        utils.powerlog.open_segment = open_segment_
+        try:
+            records = list(segments.get_records(150, 152))
+        finally:
+            utils.powerlog.open_segment = open_segment
+
+        self.assertEqual([record[1] for record in records], [150, 151, 152])
+        self.assertTrue(len(set(opened)) <= 2)
+
+        self.assertEqual([record[1] for record in
+                          segments.get_records(0, 199)], range(200))
+
+    def test_wrong_index(self):
+        """ A segment disagreeing with its index is read from its start """
+        self._write_indexed(100)
+
+        path = get_segments(self.prefix)[0][1]
+        with open(path[:-3] + ".idx", "r+b") as fp:
+            # Offset of first entry
+            fp.seek(5 + 8)
+            fp.write(b"\x07")
+
+        segments = PowerLogSegments(self.prefix)
+        self.assertEqual([record[1] for record in
+                          segments.get_records(0, 99)], range(100))
+
+if __name__ == "__main__":
+    unittest.main()
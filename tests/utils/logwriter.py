@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+from utils.logwriter import BackgroundWriter
+
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+
+class StalledFile(io.BytesIO):
+    """ In-memory file whose writes wait until released, like slow flash """
+
+    def __init__(self):
+        super(StalledFile, self).__init__()
+        self.release = threading.Event()
+        self.entered = threading.Event()
+        self.contents = None
+
+    def writelines(self, lines):
+        self.entered.set()
+        self.release.wait()
+        super(StalledFile, self).writelines(lines)
+
+    def close(self):
+        self.contents = self.getvalue()
+        super(StalledFile, self).close()
+
+
+class TestBackgroundWriter(unittest.TestCase):
+
+    def test_write_order(self):
+        out = StalledFile()
+        out.release.set()
+        writer = BackgroundWriter(out, 10)
+
+        writer.write(b"HEAD")
+        writer.writelines([b"a", b"b"])
+        writer.writelines([b"c"])
+        writer.close()
+
+        self.assertEqual(out.contents, b"HEADabc")
+        self.assertEqual(writer.written_records, 3)
+        self.assertEqual(writer.dropped_records, 0)
+
+    def test_drop_oldest(self):
+        """ Oldest records go first once full, but never the header """
+        out = StalledFile()
+        writer = BackgroundWriter(out, 2, BackgroundWriter.DROP_OLDEST)
+
+        writer.writelines([b"0"])
+        # Thread is now stuck writing the first record
+        out.entered.wait()
+        writer.write(b"H")
+        writer.writelines([b"1", b"22", b"3"])
+
+        self.assertEqual(writer.dropped_records, 1)
+        self.assertEqual(writer.dropped_bytes, 1)
+
+        out.release.set()
+        writer.close()
+        self.assertEqual(out.contents, b"0H223")
+        self.assertEqual(writer.written_records, 3)
+
+    def test_block(self):
+        """ Writers wait for room instead of dropping """
+        out = StalledFile()
+        writer = BackgroundWriter(out, 1, BackgroundWriter.BLOCK)
+
+        writer.writelines([b"0"])
+        out.entered.wait()
+        writer.writelines([b"1"])
+
+        blocked = threading.Thread(target=writer.writelines, args=([b"2"],))
+        blocked.start()
+        blocked.join(0.1)
+        self.assertTrue(blocked.is_alive())
+
+        out.release.set()
+        blocked.join()
+        writer.close()
+        self.assertEqual(out.contents, b"012")
+        self.assertEqual(writer.dropped_records, 0)
+
+    def test_block_many(self):
+        """ More records at once than the queue holds """
+        out = io.BytesIO()
+        writer = BackgroundWriter(out, 1, BackgroundWriter.BLOCK)
+        # Thread idle, waiting for records
+        writer.write(b"H")
+        writer.flush()
+        writer.writelines([b"0", b"1", b"2"])
+        writer.flush()
+
+        self.assertEqual(out.getvalue(), b"H012")
+
+    def test_flush(self):
+        out = StalledFile()
+        out.release.set()
+        writer = BackgroundWriter(out)
+
+        writer.writelines([b"abc"])
+        writer.flush()
+        self.assertEqual(out.getvalue(), b"abc")
+        writer.close()
+
+    def test_real_file(self):
+        """ Descriptor path, through writev when available """
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            writer = BackgroundWriter(open(path, "wb"))
+            writer.write(b"HEAD")
+            writer.writelines([b"x" * 100] * 2000)
+            writer.close()
+
+            with open(path, "rb") as fp:
+                data = fp.read()
+            self.assertEqual(len(data), 4 + 100 * 2000 -
+                             100 * writer.dropped_records)
+            self.assertTrue(data.startswith(b"HEAD"))
+        finally:
+            os.remove(path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+from utils.fdcache import fdcache
+from utils.pidindex import PidIndex
+from utils.systeminfo import SystemInfo
+
+import mox
+import unittest
+
+
+class TestPidIndex(unittest.TestCase):
+
+    TEST_PID = 1234
+    TEST_UID = 10042
+    TEST_START_TIME = 3742
+
+    def setUp(self):
+        self.m = mox.Mox()
+        self.index = PidIndex()
+
+    def tearDown(self):
+        self.m.UnsetStubs()
+
+    def test_get_uid_known(self):
+        """ UID of a known process is looked up only once """
+        self.m.StubOutWithMock(SystemInfo, 'get_uid_for_pid')
+        SystemInfo.get_uid_for_pid(self.TEST_PID).AndReturn(self.TEST_UID)
+        self.m.ReplayAll()
+
+        for _ in xrange(2):
+            self.assertEqual(self.index.get_uid(self.TEST_PID,
+                                                self.TEST_START_TIME),
+                             self.TEST_UID)
+
+        self.m.VerifyAll()
+
+    def test_get_uid_reused(self):
+        """ PID taken by a new process is looked up again """
+        self.m.StubOutWithMock(SystemInfo, 'get_uid_for_pid')
+        SystemInfo.get_uid_for_pid(self.TEST_PID).AndReturn(self.TEST_UID)
+        SystemInfo.get_uid_for_pid(self.TEST_PID).AndReturn(SystemInfo.AID_APP)
+        self.m.ReplayAll()
+
+        self.index.get_uid(self.TEST_PID, self.TEST_START_TIME)
+        self.assertEqual(self.index.get_uid(self.TEST_PID,
+                                            self.TEST_START_TIME + 1),
+                         SystemInfo.AID_APP)
+
+        self.m.VerifyAll()
+
+    def test_get_uid_fail(self):
+        """ Failed lookups are not kept """
+        self.m.StubOutWithMock(SystemInfo, 'get_uid_for_pid')
+        SystemInfo.get_uid_for_pid(self.TEST_PID).AndReturn(-1)
+        self.m.ReplayAll()
+
+        self.assertEqual(self.index.get_uid(self.TEST_PID,
+                                            self.TEST_START_TIME), -1)
+        self.assertEqual(len(self.index), 0)
+
+        self.m.VerifyAll()
+
+    def test_prune(self):
+        self.m.StubOutWithMock(SystemInfo, 'get_uid_for_pid')
+        self.m.StubOutWithMock(fdcache, 'invalidate')
+        SystemInfo.get_uid_for_pid(self.TEST_PID).AndReturn(self.TEST_UID)
+        fdcache.invalidate(SystemInfo.PID_STAT_MASK.format(self.TEST_PID))
+        self.m.ReplayAll()
+
+        self.index.get_uid(self.TEST_PID, self.TEST_START_TIME)
+        self.index.prune([1, 2])
+        self.assertEqual(len(self.index), 0)
+
+        self.m.VerifyAll()
+
+if __name__ == "__main__":
+    unittest.main()
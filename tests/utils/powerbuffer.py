@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+from utils.counter import Counter
+from utils.powerbuffer import PowerBuffer
+
+import unittest
+
+
+class TestPowerBuffer(unittest.TestCase):
+
+    TEST_UID = 10045
+    TEST_SIZE = 4
+
+    def setUp(self):
+        self.buffer = PowerBuffer(self.TEST_SIZE)
+
+    def test_get_powers_unknown_uid(self):
+        self.assertEqual(self.buffer.get_powers_up_to_timestamp(
+            self.TEST_UID, -1, 3), [0, 0, 0])
+
+    def test_get_powers_latest(self):
+        """ Most recent sample comes first """
+        for i, power in enumerate([1.0, 2.0, 3.0]):
+            self.buffer.add_power(self.TEST_UID, i, power)
+
+        self.assertEqual(self.buffer.get_powers_up_to_timestamp(
+            self.TEST_UID, -1, 3), [3.0, 2.0, 1.0])
+
+    def test_get_powers_zero_power_gap(self):
+        """ Zero powers are not stored but still read back as zero """
+        self.buffer.add_power(self.TEST_UID, 0, 1.0)
+        self.buffer.add_power(self.TEST_UID, 1, 0)
+        self.buffer.add_power(self.TEST_UID, 2, 3.0)
+
+        self.assertEqual(self.buffer.get_powers_up_to_timestamp(
+            self.TEST_UID, 2, 3), [3.0, 0, 1.0])
+
+    def test_get_powers_evicted(self):
+        """ Samples older than the buffer capacity are overwritten """
+        for i in xrange(2 * self.TEST_SIZE):
+            self.buffer.add_power(self.TEST_UID, i, i + 1.0)
+
+        self.assertEqual(self.buffer.get_powers_up_to_timestamp(
+            self.TEST_UID, -1, 2 * self.TEST_SIZE), [8.0, 7.0, 6.0, 5.0])
+        self.assertEqual(self.buffer.get_powers_up_to_timestamp(
+            self.TEST_UID, 3, 2), [0, 0])
+
+    def test_get_powers_before_first_iteration(self):
+        self.buffer.add_power(self.TEST_UID, 1, 2.0)
+
+        self.assertEqual(self.buffer.get_powers_up_to_timestamp(
+            self.TEST_UID, 1, 4), [2.0, 0, 0, 0])
+
+    def test_get_uid_buffer_count(self):
+        self.buffer.add_power(self.TEST_UID, 0, 0)
+        self.buffer.add_power(self.TEST_UID, 1, 2.0)
+
+        self.assertEqual(self.buffer.get_uid_buffer_count(
+            self.TEST_UID, Counter.COUNTER_TOTAL), 2)
+        self.assertEqual(self.buffer.get_uid_total(
+            self.TEST_UID, Counter.COUNTER_TOTAL), 2.0)
+
+    def test_add_span(self):
+        """ Power of a span counts once per iteration it covers """
+        self.buffer.add_power(self.TEST_UID, 0, 1.0)
+        self.buffer.add_power(self.TEST_UID, 3, 2.0, 3)
+
+        self.assertEqual(self.buffer.get_powers_up_to_timestamp(
+            self.TEST_UID, -1, 4), [2.0, 2.0, 2.0, 1.0])
+        self.assertEqual(self.buffer.get_uid_buffer_count(
+            self.TEST_UID, Counter.COUNTER_TOTAL), 4)
+        self.assertEqual(self.buffer.get_uid_total(
+            self.TEST_UID, Counter.COUNTER_TOTAL), 7.0)
+
+
+class TestPowerBufferRollups(unittest.TestCase):
+
+    TEST_UID = 10045
+
+    def setUp(self):
+        self.buffer = PowerBuffer(0, rollups=True)
+
+    def test_get_rollups(self):
+        """ Samples are aggregated per minute, zero powers included """
+        for i, power in enumerate([1.0, 0, 3.0] + [2.0] * 60):
+            self.buffer.add_power(self.TEST_UID, i, power)
+
+        self.assertEqual(self.buffer.get_rollups(
+            self.TEST_UID, PowerBuffer.ROLLUP_MINUTE, -1, 3),
+            [(6.0, 3, 2.0, 2.0), (118.0, 60, 0, 3.0), (0, 0, 0, 0)])
+        self.assertEqual(self.buffer.get_rollups(
+            self.TEST_UID, PowerBuffer.ROLLUP_HOUR, -1, 1),
+            [(124.0, 63, 0, 3.0)])
+
+    def test_get_rollups_evicted(self):
+        """ Buckets older than a tier keeps are overwritten """
+        size = PowerBuffer.ROLLUP_SIZES[PowerBuffer.ROLLUP_MINUTE]
+        self.buffer.add_power(self.TEST_UID, 0, 1.0)
+        self.buffer.add_power(self.TEST_UID, 60 * size, 2.0)
+
+        self.assertEqual(self.buffer.get_rollups(
+            self.TEST_UID, PowerBuffer.ROLLUP_MINUTE, 0, 1), [(0, 0, 0, 0)])
+
+    def test_get_rollups_bounded(self):
+        size = PowerBuffer.ROLLUP_SIZES[PowerBuffer.ROLLUP_QUARTER]
+        self.assertEqual(len(self.buffer.get_rollups(
+            self.TEST_UID, PowerBuffer.ROLLUP_QUARTER, -1, 2 * size)), size)
+
+    def test_get_rollup_averages(self):
+        for i, power in enumerate([1.0, 2.0, 3.0]):
+            self.buffer.add_power(self.TEST_UID, i, power)
+
+        self.assertEqual(self.buffer.get_rollup_averages(
+            self.TEST_UID, PowerBuffer.ROLLUP_MINUTE, -1, 2), [2.0, 0])
+
+    def test_no_rollups(self):
+        buffer_ = PowerBuffer(0)
+        buffer_.add_power(self.TEST_UID, 0, 1.0)
+
+        self.assertEqual(buffer_.get_rollups(
+            self.TEST_UID, PowerBuffer.ROLLUP_MINUTE, -1, 1), [(0, 0, 0, 0)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+from StringIO import StringIO
+from libs.profiler import MonitorProfile
+from utils import powerlog
+from utils.logwriter import BackgroundWriter
+from utils.powerlog import PowerLogFile
+from utils.powerlog import PowerLogReader
+from utils.powerlog import PowerLogWriter
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class UnclosedBytesIO(io.BytesIO):
+    """ Keep contents readable after the writer closes it """
+
+    def close(self):
+        pass
+
+
+class TestPowerLog(unittest.TestCase):
+
+    COMPONENTS = ["CPU", "Wifi", "GPS"]
+
+    def setUp(self):
+        self.out = UnclosedBytesIO()
+        self.writer = PowerLogWriter(self.out, self.COMPONENTS, "passion",
+                                     flush_interval=2)
+
+    def _read(self, data=None, chunk_size=None):
+        reader = PowerLogReader(io.BytesIO(self.out.getvalue() if data is None
+                                           else data))
+        if chunk_size is not None:
+            reader.CHUNK_SIZE = chunk_size
+        return reader
+
+    def test_round_trip(self):
+        self.writer.write_app_name(10045, u"com.example.app")
+        self.writer.write_power(0, 512.5, [(-1, "CPU", 500.25),
+                                           (10045, "Wifi", 12.25),
+                                           (300000, "GPS", 0.0)])
+        self.writer.write_battery(0, 1500.0, 30.5, 3.75, -0.25)
+        self.writer.write_settings(1, 1381328633.5, -1, 30000)
+        self.writer.close()
+
+        reader = self._read(chunk_size=3)
+        self.assertEqual(reader.model_name, "passion")
+        self.assertEqual(reader.components, self.COMPONENTS)
+        self.assertEqual(list(reader), [
+            (powerlog.RECORD_APP_NAME, 10045, u"com.example.app"),
+            (powerlog.RECORD_POWER, 0, 512.5, [(-1, "CPU", 500.25),
+                                               (10045, "Wifi", 12.25),
+                                               (300000, "GPS", 0.0)]),
+            (powerlog.RECORD_BATTERY, 0, 1500.0, 30.5, 3.75, -0.25),
+            (powerlog.RECORD_SETTINGS, 1, 1381328633.5, -1, 30000),
+        ])
+
+    def test_catchup(self):
+        """ Catch-up powers show up on every iteration of their span """
+        self.writer.write_power(4, 3.0, [(10045, "GPS", 2.0)])
+        self.writer.write_catchup(3, 2, [(10045, "GPS", 2.0)])
+        self.writer.close()
+
+        records = list(self._read())
+        self.assertEqual(records[1], (powerlog.RECORD_CATCHUP, 3, 2,
+                                      [(10045, "GPS", 2.0)]))
+        self.assertEqual(powerlog._get_uid_powers(records, 10045),
+                         [(4, "GPS", 2.0), (2, "GPS", 2.0), (3, "GPS", 2.0)])
+
+    def test_profile(self):
+        profile = MonitorProfile()
+        profile.add_iteration(20, 1.5, 0.75)
+        profile.file_opens = 3
+        profile.bytes_read = 4096
+        profile.jni_calls = 200
+        self.writer.write_profile(60, 10080, {"CPU": profile})
+        self.writer.close()
+
+        self.assertEqual(list(self._read()), [
+            (powerlog.RECORD_PROFILE, 60, 10080,
+             [("CPU", 1, 1.5, 0.75, 1.5, 3, 4096, 200,
+               [0, 1, 0, 0, 0, 0, 0])]),
+        ])
+
+    def test_flush_interval(self):
+        """ Records are only written every flush_interval iterations """
+        self.writer.write_power(0, 1.0, [])
+        self.writer.write_power(1, 1.0, [])
+        self.assertEqual(list(self._read()), [])
+
+        self.writer.write_power(2, 1.0, [])
+        self.assertEqual(len(list(self._read())), 3)
+
+    def test_truncated(self):
+        """ A record cut short ends the log """
+        for i in xrange(3):
+            self.writer.write_power(i, 1.0, [(10001, "CPU", 2.0)])
+        self.writer.close()
+
+        records = list(self._read(self.out.getvalue()[:-3]))
+        self.assertEqual([record[1] for record in records], [0, 1])
+
+    def test_not_a_log(self):
+        self.assertRaises(ValueError, self._read, b"powerlog text")
+        self.assertRaises(ValueError, self._read, b"PWR")
+
+    def test_export_text(self):
+        self.writer.write_app_name(10045, u"com.example.app")
+        self.writer.write_power(3, 10.0, [(-1, "CPU", 8.5),
+                                          (10045, "CPU", 1.5)])
+        self.writer.close()
+
+        out = StringIO()
+        reader = self._read()
+        powerlog.export_text(reader, out, reader.model_name)
+
+        self.assertEqual(out.getvalue(), "model passion\n"
+                                         "associate 10045 com.example.app\n"
+                                         "== POWER START ==\n"
+                                         "iteration 3\n"
+                                         "total-power 10.00\n"
+                                         "CPU 8.500\n"
+                                         "CPU-10045 1.50\n"
+                                         "== POWER END ==\n")
+
+
+class TestPowerLogFile(unittest.TestCase):
+
+    COMPONENTS = ["CPU", "Wifi"]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "powerlog.bin")
+        self.index_path = self.path + powerlog.INDEX_SUFFIX
+        self.saved_interval = PowerLogFile.INDEX_INTERVAL
+        PowerLogFile.INDEX_INTERVAL = 8
+
+    def tearDown(self):
+        PowerLogFile.INDEX_INTERVAL = self.saved_interval
+        shutil.rmtree(self.dir)
+
+    def _write(self, niters, out=None):
+        writer = PowerLogWriter(out or open(self.path, "wb"), self.COMPONENTS,
+                                "passion", index=open(self.index_path, "wb"),
+                                index_interval=8)
+        for i in xrange(niters):
+            if i % 10 == 0:
+                writer.write_battery(i, 1.0, 2.0, 3.0, 4.0)
+            writer.write_power(i, float(i), [(-1, "CPU", float(i)),
+                                             (10045, "Wifi", i / 2.0)])
+        writer.close()
+
+    def _open(self):
+        return PowerLogFile(self.path)
+
+    def test_get_uid_powers(self):
+        self._write(100)
+        log = self._open()
+
+        self.assertEqual(log.get_uid_powers(10045, 36, 40),
+                         [(i, "Wifi", i / 2.0) for i in xrange(36, 41)])
+        self.assertEqual(log.get_uid_powers(10045, 98, 200),
+                         [(98, "Wifi", 49.0), (99, "Wifi", 49.5)])
+        self.assertEqual(log.get_uid_powers(10046, 0, 100), [])
+        self.assertEqual([record[:2] for record in log.get_records(19, 21)],
+                         [(powerlog.RECORD_POWER, 19),
+                          (powerlog.RECORD_BATTERY, 20),
+                          (powerlog.RECORD_POWER, 20),
+                          (powerlog.RECORD_POWER, 21)])
+        log.close()
+
+    def test_seek_through_index(self):
+        """ Records before the range aren't read """
+        self._write(100)
+        log = self._open()
+
+        seeks = []
+        seek = log._reader.seek
+        log._reader.seek = lambda offset: seeks.append(offset) or seek(offset)
+
+        log.get_uid_powers(10045, 50, 50)
+        self.assertEqual(seeks, [log._offsets[50 // 8]])
+        self.assertTrue(seeks[0] > log._data_start)
+        log.close()
+
+    def test_rebuild_truncated_index(self):
+        self._write(100)
+        with open(self.index_path, "rb") as fp:
+            index = fp.read()
+        with open(self.index_path, "wb") as fp:
+            fp.write(index[:len(index) // 2 + 3])
+
+        log = self._open()
+        self.assertEqual(log._iters, range(0, 100, 8))
+        self.assertEqual(log.get_uid_powers(10045, 90, 91),
+                         [(90, "Wifi", 45.0), (91, "Wifi", 45.5)])
+        log.close()
+
+        # Saved back in full
+        with open(self.index_path, "rb") as fp:
+            self.assertEqual(fp.read(), index)
+
+    def test_rebuild_after_drops(self):
+        """ Entries pointing past dropped records are replaced """
+        self._write(100, BackgroundWriter(open(self.path, "wb"), 4))
+
+        log = self._open()
+        iters = [record[1] for record in log.get_records(0, 100) if
+                 record[0] == powerlog.RECORD_POWER]
+        for iter_num, offset in zip(log._iters, log._offsets):
+            self.assertEqual(log._get_power_iter(offset), iter_num)
+        self.assertEqual([iters[i] for i in xrange(0, len(iters), 8)],
+                         log._iters)
+        log.close()
+
+if __name__ == "__main__":
+    unittest.main()
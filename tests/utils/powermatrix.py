@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+from utils.powermatrix import PowerMatrix
+
+import unittest
+
+
+class TestPowerMatrix(unittest.TestCase):
+
+    TEST_UID = 10045
+    TEST_SIZE = 4
+
+    def setUp(self):
+        self.matrix = PowerMatrix(["CPU", "Wifi"], self.TEST_SIZE)
+
+        # Six iterations, the first two of which get overwritten
+        for i in xrange(6):
+            self.matrix.add_power(self.TEST_UID, "CPU", i, i + 1.0)
+            self.matrix.add_power(self.TEST_UID, "Wifi", i, 10 * (i + 1.0))
+
+    def test_get_powers(self):
+        self.assertEqual(self.matrix.get_powers(self.TEST_UID, "CPU", -1, 6),
+                         [6.0, 5.0, 4.0, 3.0])
+
+    def test_get_powers_overwritten(self):
+        self.assertEqual(self.matrix.get_powers(self.TEST_UID, "CPU", 3, 4),
+                         [4.0, 3.0, 0, 0])
+
+    def test_get_powers_future(self):
+        self.assertEqual(self.matrix.get_powers(self.TEST_UID, "Wifi", 7, 4),
+                         [0, 0, 60.0, 50.0])
+
+    def test_get_total_powers(self):
+        self.assertEqual(self.matrix.get_total_powers(self.TEST_UID, -1, 3),
+                         [66.0, 55.0, 44.0])
+
+    def test_get_uid_sum(self):
+        self.assertEqual(self.matrix.get_uid_sum(self.TEST_UID, -1, 2), 121.0)
+        self.assertEqual(self.matrix.get_uid_sum(self.TEST_UID, -1, 4,
+                                                 ["CPU"]), 18.0)
+
+    def test_get_uid_sum_unknown_uid(self):
+        self.assertEqual(self.matrix.get_uid_sum(0, -1, 4), 0.0)
+
+    def test_skipped_iterations_cleared(self):
+        """ Rows of iterations without any data must not keep stale powers """
+        self.matrix.add_power(self.TEST_UID, "CPU", 9, 5.0)
+
+        self.assertEqual(self.matrix.get_powers(self.TEST_UID, "CPU", -1, 4),
+                         [5.0, 0.0, 0.0, 0.0])
+        self.assertEqual(self.matrix.get_uid_sum(self.TEST_UID, -1, 4), 5.0)
+
+    def test_add_span(self):
+        """ Span fills rows of the iterations it covers still held """
+        self.matrix.add_power(self.TEST_UID, "CPU", 8, 7.0, 3)
+
+        self.assertEqual(self.matrix.get_powers(self.TEST_UID, "CPU", -1, 4),
+                         [7.0, 7.0, 7.0, 6.0])
+
+    def test_uid_churn(self):
+        """ Slots of UIDs gone from the window get reused """
+        for i in xrange(6, 1000):
+            self.matrix.add_power(i, "CPU", i, 1.0)
+            self.matrix.add_power(self.TEST_UID, "Wifi", i, 0.0)
+
+        self.assertLessEqual(self.matrix.slot_count, self.TEST_SIZE + 1)
+        self.assertEqual(self.matrix.get_powers(997, "CPU", -1, 4),
+                         [0.0, 0.0, 1.0, 0.0])
+        self.assertEqual(self.matrix.get_uid_sum(self.TEST_UID, -1, 4), 0.0)
+
+    def test_reused_slot_cleared(self):
+        self.matrix.add_power(self.TEST_UID, "CPU", 10, 0.0)
+        self.matrix.add_power(1000, "Wifi", 10, 2.0)
+
+        self.assertEqual(self.matrix.slot_count, 1)
+        self.assertEqual(self.matrix.get_total_powers(1000, -1, 4),
+                         [2.0, 0.0, 0.0, 0.0])
+        self.assertEqual(self.matrix.get_uid_sum(self.TEST_UID, -1, 4), 0.0)
+
+    def test_zero_power_kept_in_window(self):
+        """ UIDs with power left in the window keep their slot """
+        self.matrix.add_power(self.TEST_UID, "CPU", 8, 0.0)
+
+        self.assertEqual(self.matrix.get_powers(self.TEST_UID, "CPU", -1, 4),
+                         [0.0, 0.0, 0.0, 6.0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+from utils.statparser import parse_all_cpu_times
+from utils.statparser import parse_cpu_times
+from utils.statparser import parse_pid_times
+
+import unittest
+
+
+class TestParsePidTimes(unittest.TestCase):
+
+    PID_STAT = (b"1234 (Binder (thread) 2) S 1 1234 0 0 -1 4194624 3171 0 0 0 "
+                b"1517 442 0 0 20 0 19 0 3742 550277120 11292\n")
+
+    def test_parse(self):
+        """ Command name holding spaces and parentheses """
+        buf = bytearray(self.PID_STAT)
+        self.assertEqual(parse_pid_times(buf, len(buf)), (1517, 442, 3742))
+
+    def test_parse_reused_buffer(self):
+        """ Only the first end bytes of the buffer are parsed """
+        buf = bytearray(b"x" * 512)
+        buf[:len(self.PID_STAT)] = self.PID_STAT
+        self.assertEqual(parse_pid_times(buf, len(self.PID_STAT)),
+                         (1517, 442, 3742))
+
+    def test_parse_truncated(self):
+        self.assertEqual(parse_pid_times(self.PID_STAT, 60), ())
+
+    def test_parse_invalid(self):
+        self.assertEqual(parse_pid_times(b"1234 (sh", 8), ())
+
+
+class TestParseCPUTimes(unittest.TestCase):
+
+    PROC_STAT = (b"cpu  36104 1226 24419 1230213 2305 1 488 0 0 0\n"
+                 b"cpu0 9305 318 6574 306121 670 1 311 0 0 0\n"
+                 b"cpu2 9101 312 5952 307761 561 0 46 0 0 0\n"
+                 b"intr 2260541 0 0 0\n")
+
+    def test_parse_cpu(self):
+        self.assertEqual(parse_cpu_times(self.PROC_STAT, len(self.PROC_STAT),
+                                         2), (9413, 358, 318093))
+
+    def test_parse_offline_cpu(self):
+        self.assertEqual(parse_cpu_times(self.PROC_STAT, len(self.PROC_STAT),
+                                         1), ())
+
+    def test_parse_all(self):
+        self.assertEqual(parse_all_cpu_times(self.PROC_STAT,
+                                             len(self.PROC_STAT)),
+                         {0: (9623, 630, 317044), 2: (9413, 358, 318093)})
+
+    def test_parse_all_truncated(self):
+        """ Line cut short by the end of the buffer is left out """
+        end = self.PROC_STAT.index(b"cpu2") + 30
+        self.assertEqual(parse_all_cpu_times(self.PROC_STAT, end),
+                         {0: (9623, 630, 317044)})
+
+if __name__ == "__main__":
+    unittest.main()
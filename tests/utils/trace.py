@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+from libs.clock import VirtualClock
+from libs.clock import clock
+from utils import trace
+from utils.eventqueue import EventQueue
+from utils.fdcache import DescriptorCache
+from utils.trace import TraceReader
+from utils.trace import tracer
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class UnclosedBytesIO(io.BytesIO):
+    """ Keep contents readable after the recorder closes it """
+
+    def close(self):
+        pass
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.out = UnclosedBytesIO()
+        tracer.start(self.out, 1000)
+
+    def tearDown(self):
+        tracer.stop()
+
+    def _read(self):
+        tracer.stop()
+        return TraceReader(io.BytesIO(self.out.getvalue()))
+
+    def test_round_trip(self):
+        tracer.record_file("/proc/stat", b"cpu  1 2 3\n")
+        tracer.record_file("/proc/100/stat", None)
+        tracer.record_listdir("/proc", ["101", "100"])
+        tracer.record_value("wifi.state", 3)
+        tracer.record_value("wifi.name", u"wlan0")
+        tracer.record_value("screen.on", False)
+        tracer.record_event("GPS", 1500, 3, (10001, -1, 0.5, None))
+        tracer.record_hardware("passion", ["CPU0", "Wifi"])
+        tracer.end_iteration(7, 2000)
+
+        reader = self._read()
+        self.assertEqual(reader.iter_interval, 1000)
+        self.assertEqual(list(reader), [
+            (trace.TRACE_FILE, "/proc/stat", b"cpu  1 2 3\n"),
+            (trace.TRACE_FILE, "/proc/100/stat", None),
+            (trace.TRACE_LISTDIR, "/proc", ["100", "101"]),
+            (trace.TRACE_VALUE, "wifi.state", 3),
+            (trace.TRACE_VALUE, "wifi.name", u"wlan0"),
+            (trace.TRACE_VALUE, "screen.on", False),
+            (trace.TRACE_EVENT, "GPS", 1500, 3, (10001, -1, 0.5, None)),
+            (trace.TRACE_HARDWARE, "passion", ["CPU0", "Wifi"]),
+            (trace.TRACE_ITERATION, 7, 2000)])
+
+    def test_unchanged_inputs(self):
+        """ Inputs equal to the ones recorded last are left out """
+        for iter_num in xrange(2):
+            tracer.record_file("/proc/meminfo", b"MemTotal: 1 kB\n")
+            tracer.record_listdir("/proc/uid_stat/", ["10000"])
+            self.assertEqual(tracer.traced("wifi.speed", 54), 54)
+            tracer.end_iteration(iter_num, iter_num * 1000)
+        tracer.record_file("/proc/meminfo", None)
+
+        types = [record[0] for record in self._read()]
+        self.assertEqual(types, [trace.TRACE_FILE, trace.TRACE_LISTDIR,
+                                 trace.TRACE_VALUE, trace.TRACE_ITERATION,
+                                 trace.TRACE_ITERATION, trace.TRACE_FILE])
+
+    def test_not_recording(self):
+        tracer.stop()
+        tracer.record_value("wifi.speed", 54)
+        self.assertEqual(tracer.traced("wifi.speed", 11), 11)
+
+        self.assertEqual(list(self._read()), [])
+
+    def test_fdcache_reads(self):
+        root = tempfile.mkdtemp()
+        try:
+            path = os.path.join(root, "tx_bytes")
+            with open(path, "w") as fp:
+                fp.write("1200\n")
+
+            cache = DescriptorCache()
+            self.assertEqual(cache.read_int(path), 1200)
+            buf = bytearray(16)
+            cache.read_into(path, buf)
+            cache.read(os.path.join(root, "gone"))
+            cache.clear()
+        finally:
+            shutil.rmtree(root)
+
+        self.assertEqual(list(self._read()), [
+            (trace.TRACE_FILE, path, b"1200\n"),
+            (trace.TRACE_FILE, os.path.join(root, "gone"), None)])
+
+    def test_named_queue(self):
+        """ Events of named queues only are recorded """
+        clock.set_source(VirtualClock(1000))
+        EventQueue("Sensors").push(1, 10000, 2)
+        EventQueue().push(2, 10000)
+
+        self.assertEqual(list(self._read()), [
+            (trace.TRACE_EVENT, "Sensors", 1000, 1, (10000, 2))])
+
+    def test_unrecordable(self):
+        """ Inputs of types traces don't hold are left out, not raised """
+        tracer.record_value("gps.status", object())
+        EventQueue("GPS").push(1, object())
+        tracer.record_value("gps.status", 4)
+
+        self.assertEqual(tracer.failed_records, 2)
+        self.assertEqual(list(self._read()), [
+            (trace.TRACE_VALUE, "gps.status", 4)])
+
+    def test_cut_short(self):
+        tracer.end_iteration(0, 0)
+        tracer.end_iteration(1, 1000)
+        tracer.stop()
+
+        data = self.out.getvalue()
+        records = list(TraceReader(io.BytesIO(data[:-1])))
+        self.assertEqual(records, [(trace.TRACE_ITERATION, 0, 0)])
+        self.assertRaises(ValueError, TraceReader, io.BytesIO(b"PWRL"))
+
+if __name__ == "__main__":
+    unittest.main()
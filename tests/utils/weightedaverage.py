@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+from utils.weightedaverage import WeightedAverage
+
+import math
+import unittest
+
+
+class TestWeightedAverage(unittest.TestCase):
+
+    TEST_WEIGHT = 0.2
+    TEST_VALUES = [120.0, 0, 80.5, 300.0, 0, 0, 42.0]
+
+    def setUp(self):
+        self.avg = WeightedAverage(self.TEST_WEIGHT)
+
+    def test_get_empty(self):
+        self.assertEqual(self.avg.get(), 0)
+
+    def test_get_zeros(self):
+        self.avg.add(0)
+        self.assertEqual(self.avg.get(), 0)
+
+    def test_get_single(self):
+        """ Bias correction makes the first sample its own average """
+        self.avg.add(120.0)
+        self.assertAlmostEqual(self.avg.get(), 120.0)
+
+    def test_get_matches_rescan(self):
+        """ Incremental average matches rescanning the whole history """
+        weighted = 0
+        cnt = 0
+        for value in self.TEST_VALUES:
+            self.avg.add(value)
+            if value != 0:
+                cnt += 1
+                weighted *= 1.0 - self.TEST_WEIGHT
+                weighted += self.TEST_WEIGHT * value
+
+        expected = weighted / (1.0 - math.pow(1.0 - self.TEST_WEIGHT, cnt))
+        self.assertAlmostEqual(self.avg.get(), expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,28 +2,31 @@
 
 from __future__ import division
 
-import os
+from utils.fdcache import fdcache
 
 
 class BatteryStats(object):
     _SYSFS_MASK = "/sys/class/power_supply/battery/{0}"
 
+    @classmethod
+    def _read(cls, name):
+        """Return value of sysfs battery file or None if it can't be read.
+        Files are kept open between reads"""
+        return fdcache.read_int(cls._SYSFS_MASK.format(name), None)
+
     @classmethod
     def get_voltage(cls):
         """Return battery voltage in volts"""
-        filename = cls._SYSFS_MASK.format("voltage_now")
+        voltage = cls._read("voltage_now")
         # Transform source from mV to V
         factor = 1e-6
 
-        if not os.path.exists(filename):
-            filename = cls._SYSFS_MASK.format("batt_vol")
+        if voltage is None:
+            voltage = cls._read("batt_vol")
             # Transform source from uV to V
             factor = 1e-3
 
-        try:
-            with open(filename) as fp:
-                voltage = int(fp.read().strip())
-        except (IOError, ValueError):
+        if voltage is None:
             return 0
 
         return voltage * factor
@@ -31,14 +34,11 @@ class BatteryStats(object):
     @classmethod
     def get_current(cls):
         """Return battery current in ampers"""
-        filename = cls._SYSFS_MASK.format("current_now")
+        current = cls._read("current_now")
         # Transform source from uA to A
         factor = 1e-6
 
-        try:
-            with open(filename) as fp:
-                current = int(fp.read().strip())
-        except (IOError, ValueError):
+        if current is None:
             return 0
 
         return current * factor
@@ -46,16 +46,13 @@ class BatteryStats(object):
     @classmethod
     def get_temperature(cls):
         """Return battery temperature in Celsius degrees"""
-        filename = cls._SYSFS_MASK.format("temp")
+        temperature = cls._read("temp")
         factor = 1e-1
 
-        if not os.path.exists(filename):
-            filename = cls._SYSFS_MASK.format("batt_temp")
+        if temperature is None:
+            temperature = cls._read("batt_temp")
 
-        try:
-            with open(filename) as fp:
-                temperature = int(fp.read().strip())
-        except (IOError, ValueError):
+        if temperature is None:
             return 0
 
         return temperature * factor
@@ -63,14 +60,11 @@ class BatteryStats(object):
     @classmethod
     def get_capacity(cls):
         """Return remaining batt capacity in percentage"""
-        filename = cls._SYSFS_MASK.format("capacity")
+        capacity = cls._read("capacity")
         # Transform source from percentage to 1
         factor = 0.01
 
-        try:
-            with open(filename) as fp:
-                capacity = int(fp.read().strip())
-        except (IOError, ValueError):
+        if capacity is None:
             return 0
 
         return capacity * factor
@@ -78,34 +72,25 @@ class BatteryStats(object):
     @classmethod
     def get_full_capacity(cls):
         """Return battery at full capacity in V"""
-        filename = cls._SYSFS_MASK.format("full_bat")
+        full_capacity = cls._read("full_bat")
 
-        # Transform source from mAh to 
+        # Transform source from mAh to
         # 0.0036 = 60 * 60 * 1e-6
         factor = 0.0036
 
-        try:
-            with open(filename) as fp:
-                full_capacity = int(fp.read().strip())
-        except (IOError, ValueError):
+        if full_capacity is None:
             return 0
 
         return full_capacity * factor
 
     @classmethod
     def get_charge(cls):
-        filename = cls._SYSFS_MASK.format("charge_counter")
+        charge = cls._read("charge_counter")
         # Transform from mAh to voltage
         # 0.0036 = 60 * 60 * 1e-6
         factor = 0.0036
 
-        if not os.path.exists(filename):
+        if charge is None:
             return cls.get_capacity() * cls.get_full_capacity()
 
-        try:
-            with open(filename) as fp:
-                charge = int(fp.read().strip())
-        except (IOError, ValueError):
-            return 0
-
         return charge * factor
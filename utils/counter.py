@@ -1,10 +1,15 @@
 #!/usr/bin/env python
 
 from __future__ import division
-from libs.clock import SystemClock
+
+from array import array
 
 
 class Counter(object):
+    """Sum of values added over the last minute, hour and day, and overall.
+    Time is given by the iteration number values are added on, so adding
+    never queries the clock"""
+
     COUNTER_MINUTE = 0
     COUNTER_HOUR = 1
     COUNTER_DAY = 2
@@ -18,91 +23,124 @@ class Counter(object):
     COUNTER_DURATIONS = [_COUNTER_DURATION_MINUTE, _COUNTER_DURATION_HOUR,
                          _COUNTER_DURATION_DAY, -1]
 
-    def __init__(self):
-        self._total = 0
-        self._start_time = SystemClock.elapsedRealtime()
+    # Windowed counter types
+    _WINDOWS = (COUNTER_MINUTE, COUNTER_HOUR, COUNTER_DAY)
+
+    DEFAULT_ITER_INTERVAL = 1000    # 1 second
 
-        self._counters = {
-            self.COUNTER_MINUTE: _BucketCounter(),
-            self.COUNTER_HOUR: _BucketCounter(),
-            self.COUNTER_DAY: _BucketCounter(),
-            self.COUNTER_TOTAL: _BucketCounter(),
-        }
+    __slots__ = ['_total', '_iter_interval', '_last_iter', '_counters']
 
-    def add(self, value):
+    def __init__(self, iter_interval=DEFAULT_ITER_INTERVAL):
+        self._total = 0
+        # Milliseconds between iterations
+        self._iter_interval = iter_interval
+        self._last_iter = -1
+        self._counters = [_BucketCounter(self.COUNTER_DURATIONS[type_]) for
+                          type_ in self._WINDOWS]
+
+    def add(self, value, iter_num):
+        """Add value drawn on iteration iter_num. Iterations should only
+        increase accross adds"""
         self._total += value
-        now = SystemClock.elapsedRealtime() - self._start_time
-        for type_, counter in self._counters.iteritems():
-            counter.add(value, now * _BucketCounter.BUCKET_NUM /
-                               Counter.COUNTER_DURATIONS[type_])
 
-    def get(self, type_):
+        if iter_num == self._last_iter:
+            # Same iteration as the last add. Its buckets are still current
+            for counter in self._counters:
+                counter.add_current(value)
+            return
+
+        self._last_iter = iter_num
+        now = iter_num * self._iter_interval
+
+        for counter in self._counters:
+            counter.add(value, now)
+
+    def get(self, type_, iter_num=None):
+        """Return sum of values over counter type as of iteration iter_num,
+        which defaults to the last one a value was added on"""
         assert (Counter.COUNTER_MINUTE <= type_ <= Counter.COUNTER_TOTAL)
 
         if type_ == Counter.COUNTER_TOTAL:
             return self._total
 
-        now = SystemClock.elapsedRealtime() - self._start_time
-        timestamp = (now * _BucketCounter.BUCKET_NUM /
-                     Counter.COUNTER_DURATIONS[type_])
-        progress = ((now * _BucketCounter.BUCKET_NUM %
-                     Counter.COUNTER_DURATIONS[type_]) /
-                    Counter.COUNTER_DURATIONS[type_])
-        return self._counters[type_].get(timestamp, progress)
+        if iter_num is None:
+            iter_num = max(self._last_iter, 0)
+
+        return self._counters[type_].get(iter_num * self._iter_interval)
 
 
 class _BucketCounter(object):
-    """Keep track of data added to timeline for later syncing and summing. Each
-    bucket holds a counter for a given second"""
+    """Sum of values added over a sliding window of duration milliseconds,
+    kept in BUCKET_NUM buckets. A bucket slot remembers which bucket it holds,
+    so buckets left behind by a gap are cleared when their slot is next
+    used instead of one by one"""
+
+    BUCKET_NUM = 60         # Hold up to 60 buckets of data
 
-    BUCKET_NUM = 60         # Hold up to 60 seconds of data
+    __slots__ = ['_duration', '_stamps', '_buckets', '_current', '_slot',
+                 '_dropped', '_dropped_stamp']
 
-    def __init__(self):
+    def __init__(self, duration):
+        self._duration = duration
+        # Bucket number held by each slot
+        self._stamps = array('l', [-1]) * self.BUCKET_NUM
         self._buckets = [0] * self.BUCKET_NUM
-        self._total = 0
-        self._base = 0
-        self._base_idx = 0
+        # Bucket and slot of the last add
+        self._current = -1
+        self._slot = 0
+        # Value of the bucket that last slid out of the window when its slot
+        # was reused, and the bucket that reused it
         self._dropped = 0
+        self._dropped_stamp = -1
 
-    def _sync(self, timestamp):
-        """Synchronize time-based buckets to given timestamp, removing old
-        data"""
-        self._dropped = 0
+    def add(self, value, now):
+        """Add value to bucket of time now (ms)"""
+        stamp = now * self.BUCKET_NUM // self._duration
 
-        # It's been a while since we synchronized. Let's start freshly new.
-        if self._base + 2 * self.BUCKET_NUM <= timestamp:
-            # Clear the whole data structure
-            self._buckets = [0] * self.BUCKET_NUM
-            self._total = 0
-            self._base = timestamp
-            self._base_idx = 0
-        else:
-            # Clean the old data buckets holding up to timestamp
-            while self._base + self.BUCKET_NUM <= timestamp:
-                self._dropped = self._buckets[self._base_idx]
-                self._total -= self._dropped
-                self._buckets[self._base_idx] = 0
-                self._base += 1
-                if self._base_idx + 1 == self.BUCKET_NUM:
-                    self._base_idx = 0
-                else:
-                    self._base_idx += 1
+        if stamp != self._current:
+            slot = stamp % self.BUCKET_NUM
 
-    def add(self, value, timestamp):
-        """Add value to bucket corresponding to timestamp"""
-        self._sync(timestamp)
-        self._total += value
-        idx = (self._base_idx + timestamp - self._base)
-        if idx >= _BucketCounter.BUCKET_NUM:
-            idx -= _BucketCounter.BUCKET_NUM
-        self._buckets[idx] += value
-
-    def get(self, timestamp, progress):
-        # timestamp gives the time slice that we want information about.
-        # progress (between 0 and 1) refers to location inside requested
-        # timeslice with 0 indicating that it just started and 1 indicating
-        # that it is about to end
-        assert (0.0 <= progress <= 1.0)
-
-        self._sync(timestamp)
-        return self._total + int((1.0 - progress) * self._dropped)
+            if self._stamps[slot] != stamp:
+                # Slot still holds an older bucket. If it is the one just
+                # sliding out of the window, keep it for get()
+                if self._stamps[slot] == stamp - self.BUCKET_NUM:
+                    self._dropped = self._buckets[slot]
+                else:
+                    self._dropped = 0
+                self._dropped_stamp = stamp
+                self._stamps[slot] = stamp
+                self._buckets[slot] = 0
+
+            self._current = stamp
+            self._slot = slot
+
+        self._buckets[self._slot] += value
+
+    def add_current(self, value):
+        """Add value to bucket of the last add"""
+        self._buckets[self._slot] += value
+
+    def get(self, now):
+        """Return sum of buckets in window ending at time now (ms). The bucket
+        that just slid out of the window is weighted by how much of the
+        current bucket is still to go"""
+        scaled = now * self.BUCKET_NUM
+        stamp = scaled // self._duration
+        # Location inside current bucket, from 0 (just started) to 1
+        progress = (scaled % self._duration) / self._duration
+
+        total = 0
+        dropped = 0
+        oldest = stamp - self.BUCKET_NUM
+
+        for slot in xrange(self.BUCKET_NUM):
+            slot_stamp = self._stamps[slot]
+            if oldest < slot_stamp <= stamp:
+                total += self._buckets[slot]
+            elif slot_stamp == oldest:
+                dropped = self._buckets[slot]
+
+        if self._dropped_stamp == stamp:
+            dropped = self._dropped
+
+        return total + int((1.0 - progress) * dropped)
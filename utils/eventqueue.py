@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+from collections import deque
+from libs.clock import clock
+from utils.trace import tracer
+
+
+class EventQueue(object):
+    """Events pushed by callback threads for a single consumer to fold in
+    batches. deque appends and pops are atomic, so pushing never takes a lock
+    nor waits on the consumer. Events are (timestamp, kind, args) tuples,
+    timestamp being the clock time (ms) the event was pushed at. Events of a
+    named queue are recorded to traces, see utils.trace"""
+
+    __slots__ = ['_events', 'name']
+
+    def __init__(self, name=None):
+        self._events = deque()
+        self.name = name
+
+    def __len__(self):
+        return len(self._events)
+
+    def push(self, kind, *args):
+        timestamp = clock.elapsed_realtime()
+        self._events.append((timestamp, kind, args))
+        if tracer.recording and self.name is not None:
+            tracer.record_event(self.name, timestamp, kind, args)
+
+    def drain(self):
+        """Return events pushed so far, oldest first. Events pushed while
+        draining are either returned or left for the next drain"""
+        events = []
+        popleft = self._events.popleft
+
+        # Stop at current length, so that a busy producer can't keep us here.
+        # Being the only consumer, those events can't go away meanwhile
+        for _ in xrange(len(self._events)):
+            events.append(popleft())
+
+        return events
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+__all__ = ['fdcache', 'DescriptorCache']
+
+from collections import OrderedDict
+from libs.clock import clock
+from libs.profiler import profiler
+from utils.trace import tracer
+
+import errno
+import logging
+import os
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+if hasattr(os, "pread"):
+    _pread = os.pread
+else:
+    def _pread(fd, size, offset):
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+if hasattr(os, "preadv"):
+    def _pread_into(fd, buf):
+        return os.preadv(fd, [buf], 0)
+elif hasattr(os, "readv"):
+    def _pread_into(fd, buf):
+        os.lseek(fd, 0, os.SEEK_SET)
+        return os.readv(fd, [buf])
+else:
+    def _pread_into(fd, buf):
+        # No way to read into an existing buffer. Copy instead
+        data = _pread(fd, len(buf), 0)
+        buf[:len(data)] = data
+        return len(data)
+
+
+def _get_default_size():
+    """Return descriptors the cache may keep open: what the process may open
+    under its current soft limit, less room for everything else"""
+    if resource is None:
+        return DescriptorCache.MIN_SIZE
+
+    try:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ValueError, resource.error):
+        return DescriptorCache.MIN_SIZE
+
+    if soft == resource.RLIM_INFINITY:
+        return DescriptorCache.MAX_SIZE
+    return max(DescriptorCache.MIN_SIZE,
+               min(DescriptorCache.MAX_SIZE,
+                   soft - DescriptorCache.RESERVED_FDS))
+
+
+class DescriptorCache(object):
+    """Keep hot procfs/sysfs counter files open and re-read them from offset
+    zero instead of opening and closing them on every iteration. A file that
+    fails to be read is closed and dropped, which is what happens once the
+    PID or UID it belongs to goes away.
+
+    Monitors read the same files in the same order on every iteration, which
+    is the worst case for least recently used eviction: once files outnumber
+    the cache, each one gets closed right before it is read again. So files
+    are only closed when full to make room for new ones if they haven't been
+    read for IDLE_TIME. Otherwise new files are read without being kept open,
+    so that files already open keep being reused. The cache holds up to as
+    many files as the process may open, less RESERVED_FDS for everything
+    else, which fits thousands of PIDs and UIDs."""
+
+    MIN_SIZE = 256
+    MAX_SIZE = 8192
+    # Descriptors left for sockets, logs and the like
+    RESERVED_FDS = 256
+    # Files not read for as long (ms) make room for new ones
+    IDLE_TIME = 60 * 1000
+    READ_SIZE = 4096
+
+    # Errors telling that the file no longer exists
+    GONE_ERRNOS = (errno.ENOENT, errno.ESTALE, errno.ESRCH)
+
+    logger = logging.getLogger("DescriptorCache")
+
+    def __init__(self, max_size=None):
+        self._sized = max_size is not None
+        self._max_size = (max_size if max_size is not None else
+                          _get_default_size())
+        # { path : [fd, time last read] } in least to most recently read order
+        self._fds = OrderedDict()
+        # Reads happen under the lock too, so that a descriptor is never
+        # closed and its number reused by another file while being read
+        self._lock = threading.Lock()
+        # Files opened so far, kept open or not
+        self.opens = 0
+
+    def __len__(self):
+        return len(self._fds)
+
+    def raise_limit(self):
+        """Raise the soft limit of descriptors the process may open, as far
+        as allowed, for the cache to hold up to MAX_SIZE files. A cache not
+        given a size grows to the new limit. Left to the process using the
+        cache, as it affects everything running in it"""
+        if resource is None:
+            return
+
+        try:
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            wanted = self.MAX_SIZE + self.RESERVED_FDS
+            if soft != resource.RLIM_INFINITY and soft < wanted:
+                soft = wanted if hard == resource.RLIM_INFINITY else min(
+                    wanted, hard)
+                resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        except (ValueError, resource.error):
+            self.logger.warn("Failed to raise limit of open files")
+            return
+
+        if not self._sized:
+            self._max_size = _get_default_size()
+
+    def read(self, path, size=READ_SIZE):
+        """Return up to size bytes from the start of path or None if it could
+        not be read"""
+        data = self._read(path, _pread, size, 0)
+        if data is not None:
+            profiler.count_read(len(data))
+        if tracer.recording:
+            tracer.record_file(path, data)
+        return data
+
+    def read_into(self, path, buf):
+        """Read start of path into bytearray buf. Return number of bytes read
+        or -1 if it could not be read"""
+        nbytes = self._read(path, _pread_into, buf)
+        if tracer.recording:
+            tracer.record_file(path, bytes(buf[:nbytes]) if nbytes is not
+                               None else None)
+        if nbytes is None:
+            return -1
+        profiler.count_read(nbytes)
+        return nbytes
+
+    def _make_room(self, now):
+        """Close least recently read file if idle. Return whether there is
+        room for another file"""
+        if len(self._fds) < self._max_size:
+            return True
+
+        path, entry = next(self._fds.iteritems())
+        if now - entry[1] < self.IDLE_TIME:
+            return False
+
+        del self._fds[path]
+        os.close(entry[0])
+        return True
+
+    def _read(self, path, reader, *args):
+        now = clock.now()
+
+        with self._lock:
+            entry = self._fds.pop(path, None)
+            fd = entry[0] if entry is not None else None
+
+            try:
+                if fd is None:
+                    fd = os.open(path, os.O_RDONLY)
+                    self.opens += 1
+                    profiler.count_open()
+                data = reader(fd, *args)
+            except OSError as e:
+                if fd is not None:
+                    os.close(fd)
+                if e.errno not in self.GONE_ERRNOS:
+                    self.logger.warn("Failed to read {0}: {1}".format(
+                        path, e.strerror))
+                return None
+
+            if entry is not None:
+                entry[1] = now
+                self._fds[path] = entry
+            elif self._make_room(now):
+                self._fds[path] = [fd, now]
+            else:
+                os.close(fd)
+
+        return data
+
+    def read_int(self, path, default=-1):
+        """Return contents of path as an integer or default on failure"""
+        data = self.read(path)
+
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            return default
+
+    def invalidate(self, path):
+        """Close descriptor of path if it is open"""
+        with self._lock:
+            entry = self._fds.pop(path, None)
+            if entry is not None:
+                os.close(entry[0])
+
+    def clear(self):
+        with self._lock:
+            for fd, _ in self._fds.itervalues():
+                os.close(fd)
+            self._fds.clear()
+
+
+fdcache = DescriptorCache()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+"""
+Log split into segment files that roll over by size or age. Segments are
+named after a prefix and a sequence number, e.g. powerlog.bin.000042. Closed
+segments are gzipped into .gz files by a background thread, and the oldest
+ones are removed once all segments take more than a byte budget. Files kept
+next to a segment, such as its index, are named after the plain segment and
+go away with it, compressed or not.
+"""
+
+__all__ = ['SegmentedFile', 'get_segments', 'open_segment']
+
+from Queue import Queue
+from libs.clock import clock
+
+import gzip
+import logging
+import os
+import re
+import threading
+import time
+
+COMPRESSED_SUFFIX = ".gz"
+
+logger = logging.getLogger("SegmentedFile")
+
+
+def _get_segment_re(prefix):
+    return re.compile(r"^{0}\.(\d{{6}})({1})?$".format(
+        re.escape(os.path.basename(prefix)), re.escape(COMPRESSED_SUFFIX)))
+
+
+def get_segments(prefix):
+    """Return [(number, path)] of segments of log prefix, oldest first. A
+    segment being compressed is only listed once"""
+    directory = os.path.dirname(prefix) or "."
+    segment_re = _get_segment_re(prefix)
+    segments = {}
+
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+
+    for name in names:
+        match = segment_re.match(name)
+        if match is None:
+            continue
+        number = int(match.group(1))
+        # Until compression is over, the plain segment is the complete one
+        if number not in segments or match.group(2) is None:
+            segments[number] = os.path.join(directory, name)
+
+    return sorted(segments.iteritems())
+
+
+def open_segment(path):
+    """Open segment for reading, whether compressed or not"""
+    if path.endswith(COMPRESSED_SUFFIX):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+class SegmentedFile(object):
+    """File-like object writing into a new segment every max_size bytes or
+    max_age seconds. Data given to write() is the file header, repeated at
+    the start of every segment. Records given to writelines() never get
+    split across segments. Not thread safe, as meant to be written by a
+    single BackgroundWriter"""
+
+    DEFAULT_MAX_SIZE = 4 * 1024 * 1024
+    DEFAULT_MAX_AGE = 60 * 60               # seconds
+    DEFAULT_MAX_TOTAL = 64 * 1024 * 1024
+
+    # Compression works on chunks of this many bytes, pausing in between so
+    # as to leave storage and CPU to the monitor
+    COMPRESS_CHUNK = 64 * 1024
+    COMPRESS_PAUSE = 0.005                  # seconds
+
+    # Files kept next to segments (see utils.powerlog.INDEX_SUFFIX)
+    SIDECAR_SUFFIXES = (".idx",)
+
+    def __init__(self, prefix, max_size=DEFAULT_MAX_SIZE,
+                 max_age=DEFAULT_MAX_AGE, max_total=DEFAULT_MAX_TOTAL,
+                 compress=True, on_close=None):
+        """on_close(path) is called from the background thread with every
+        closed segment before it gets compressed, e.g. to index it"""
+        self._prefix = prefix
+        self._max_size = max_size
+        self._max_age = max_age * 1000 if max_age is not None else None
+        self._max_total = max_total
+        self._compress = compress
+        self._on_close = on_close
+
+        self._header = b""
+        self._out = None
+        self._size = 0
+        self._opened_at = None
+
+        segments = get_segments(prefix)
+        self._number = segments[-1][0] + 1 if segments else 1
+
+        # Closed segments waiting for compression and retention
+        self._closed = Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+        # Left behind by a previous run
+        for _, path in segments:
+            if not path.endswith(COMPRESSED_SUFFIX):
+                self._closed.put(path)
+
+        self._open_segment()
+
+    def _get_path(self, number):
+        return "{0}.{1:06d}".format(self._prefix, number)
+
+    def _open_segment(self):
+        self._out = open(self._get_path(self._number), "wb")
+        self._out.write(self._header)
+        self._size = len(self._header)
+        self._opened_at = clock.elapsed_realtime()
+
+    def _rotate(self):
+        self._out.close()
+        self._closed.put(self._get_path(self._number))
+        self._number += 1
+        self._open_segment()
+
+    def _is_full(self):
+        if self._size <= len(self._header):
+            # Nothing but the header yet
+            return False
+
+        if self._max_size is not None and self._size >= self._max_size:
+            return True
+
+        return (self._max_age is not None and clock.elapsed_realtime() -
+                self._opened_at >= self._max_age)
+
+    def write(self, data):
+        self._header += data
+        self._out.write(data)
+        self._size += len(data)
+
+    def writelines(self, records):
+        for record in records:
+            if self._is_full():
+                self._rotate()
+            self._out.write(record)
+            self._size += len(record)
+
+    def flush(self):
+        self._out.flush()
+
+    def close(self):
+        """Close current segment and wait for closed ones to be handled"""
+        if self._out is None:
+            return
+
+        self._out.close()
+        self._closed.put(self._get_path(self._number))
+        self._out = None
+
+        # Tell thread to stop once done
+        self._closed.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            path = self._closed.get()
+            if path is None:
+                return
+
+            try:
+                if self._on_close is not None and os.path.exists(path):
+                    self._on_close(path)
+                if self._compress:
+                    self._compress_segment(path)
+                self._apply_retention()
+            except (IOError, OSError):
+                logger.exception("Failed to handle closed segment "
+                                 "{0}".format(path))
+
+    def _compress_segment(self, path):
+        if not os.path.exists(path):
+            # Already gone to retention
+            return
+
+        tmp_path = path + COMPRESSED_SUFFIX + ".tmp"
+
+        with open(path, "rb") as in_:
+            out = gzip.open(tmp_path, "wb")
+            try:
+                while True:
+                    chunk = in_.read(self.COMPRESS_CHUNK)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    time.sleep(self.COMPRESS_PAUSE)
+            finally:
+                out.close()
+
+        # Readers never see a partly compressed segment under its final name
+        os.rename(tmp_path, path + COMPRESSED_SUFFIX)
+        # Sidecars stay with the compressed segment
+        os.remove(path)
+
+    def _remove(self, path):
+        os.remove(path)
+
+        if path.endswith(COMPRESSED_SUFFIX):
+            path = path[:-len(COMPRESSED_SUFFIX)]
+        for suffix in self.SIDECAR_SUFFIXES:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    def _apply_retention(self):
+        """Remove oldest closed segments until all fit in max_total bytes"""
+        if self._max_total is None:
+            return
+
+        current = self._get_path(self._number)
+        segments = [path for _, path in get_segments(self._prefix)]
+        sizes = [os.path.getsize(path) for path in segments]
+        total = sum(sizes)
+
+        for path, size in zip(segments, sizes):
+            if total <= self._max_total or path == current:
+                break
+            self._remove(path)
+            total -= size
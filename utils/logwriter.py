@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+__all__ = ['BackgroundWriter']
+
+from collections import deque
+
+import logging
+import os
+import threading
+
+# Most buffers a single writev() takes
+_IOV_MAX = 1024
+
+
+def _writev(fd, chunks):
+    """Write all chunks to fd, resuming partial writes"""
+    while chunks:
+        written = os.writev(fd, chunks[:_IOV_MAX])
+        while chunks and written >= len(chunks[0]):
+            written -= len(chunks[0])
+            chunks = chunks[1:]
+        if written > 0:
+            chunks = [chunks[0][written:]] + chunks[1:]
+
+
+class BackgroundWriter(object):
+    """File-like object handing writes over to a thread of its own, so that
+    writers never wait on storage. The thread drains everything queued at
+    once and writes it in a single batch.
+
+    writelines() queues records, of which at most max_records wait at a
+    time. Once full, the policy either drops the oldest waiting records or
+    blocks the writer until the thread catches up. write() queues data that
+    must not be dropped, such as file headers, regardless of room. Both keep
+    to the method they came with down to the file, which may treat them
+    differently, e.g. SegmentedFile repeating headers in every segment.
+    """
+
+    DROP_OLDEST = 0
+    BLOCK = 1
+
+    DEFAULT_MAX_RECORDS = 1024
+
+    logger = logging.getLogger("BackgroundWriter")
+
+    def __init__(self, out, max_records=DEFAULT_MAX_RECORDS,
+                 policy=DROP_OLDEST):
+        if max_records <= 0:
+            raise ValueError("Queue must hold at least one record")
+
+        self._out = out
+        self._max_records = max_records
+        self._policy = policy
+
+        # Batches go straight to the descriptor when the platform has writev
+        self._fd = None
+        if hasattr(os, "writev"):
+            try:
+                self._fd = out.fileno()
+            except (AttributeError, IOError, ValueError):
+                pass
+
+        # Queued (droppable, chunk) and number of records among them
+        self._queue = deque()
+        self._nrecords = 0
+        self._cond = threading.Condition()
+        self._closing = False
+        # Chunks taken by the thread and not written yet
+        self._pending = 0
+
+        # Counters
+        self.written_records = 0
+        self.dropped_records = 0
+        self.dropped_bytes = 0
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, data):
+        with self._cond:
+            self._queue.append((False, bytes(data)))
+            self._cond.notify_all()
+
+    def writelines(self, records):
+        with self._cond:
+            for record in records:
+                if self._nrecords >= self._max_records:
+                    if self._policy == self.BLOCK:
+                        # Records queued so far must go for room to free up
+                        self._cond.notify_all()
+                        while (self._nrecords >= self._max_records and
+                                not self._closing):
+                            self._cond.wait()
+                    else:
+                        self._drop_oldest()
+
+                self._queue.append((True, bytes(record)))
+                self._nrecords += 1
+
+            self._cond.notify_all()
+
+    def _drop_oldest(self):
+        """Drop oldest queued record. Call with _cond held"""
+        for i, (droppable, chunk) in enumerate(self._queue):
+            if droppable:
+                self.dropped_bytes += len(chunk)
+                self.dropped_records += 1
+                self._nrecords -= 1
+                del self._queue[i]
+                return
+
+    def flush(self):
+        """Wait until everything queued so far is written"""
+        with self._cond:
+            while (self._queue or self._pending) and self._thread.is_alive():
+                self._cond.wait(0.1)
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+
+        self._thread.join()
+        self._out.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+
+                if not self._queue:
+                    # Closing with nothing left to write
+                    return
+
+                batch = list(self._queue)
+                nrecords = self._nrecords
+                self._queue.clear()
+                self._nrecords = 0
+                self._pending = len(batch)
+                # Room for blocked writers
+                self._cond.notify_all()
+
+            try:
+                self._write_batch(batch)
+                self.written_records += nrecords
+            except (IOError, OSError):
+                self.logger.exception("Failed to write {0} records".format(
+                    nrecords))
+                self.dropped_records += nrecords
+                self.dropped_bytes += sum(len(chunk) for _, chunk in batch)
+
+            with self._cond:
+                self._pending = 0
+                self._cond.notify_all()
+
+    def _write_batch(self, batch):
+        """Write batch of (droppable, chunk): records with writelines() and
+        other data with write(), in order"""
+        if self._fd is not None:
+            # A plain file doesn't tell them apart. Whatever the file object
+            # buffered goes first
+            self._out.flush()
+            _writev(self._fd, [chunk for _, chunk in batch])
+            return
+
+        records = []
+        for droppable, chunk in batch:
+            if droppable:
+                records.append(chunk)
+                continue
+            if records:
+                self._out.writelines(records)
+                records = []
+            self._out.write(chunk)
+
+        if records:
+            self._out.writelines(records)
+        self._out.flush()
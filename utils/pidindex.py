@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+__all__ = ['pidindex', 'PidIndex']
+
+from utils.fdcache import fdcache
+from utils.systeminfo import SystemInfo
+
+import threading
+
+
+class PidIndex(object):
+    """Map of running PIDs to the UID owning them, shared by all CPU core
+    monitors. Entries are tagged with the start time of the process, so a PID
+    reused by a new process is looked up again instead of being charged to the
+    UID of the previous one. The UID of a known process is never looked up
+    twice."""
+
+    def __init__(self):
+        # { pid : (start time, uid) }
+        self._uids = {}
+        self._lock = threading.Lock()
+
+    def get_uid(self, pid, start_time):
+        """Return UID of process pid started at start_time or a negative
+        number if it could not be found"""
+        entry = self._uids.get(pid, None)
+        if entry is not None and entry[0] == start_time:
+            return entry[1]
+
+        # New process or PID reused since it was last seen
+        uid = SystemInfo.get_uid_for_pid(pid)
+
+        if uid >= 0:
+            with self._lock:
+                self._uids[pid] = (start_time, uid)
+
+        return uid
+
+    def prune(self, pids):
+        """Forget processes that are not in pids anymore, closing their stat
+        files if they were kept open"""
+        running = set(pids)
+
+        with self._lock:
+            gone = [pid for pid in self._uids if pid not in running]
+            for pid in gone:
+                del self._uids[pid]
+
+        for pid in gone:
+            fdcache.invalidate(SystemInfo.PID_STAT_MASK.format(pid))
+
+    def clear(self):
+        with self._lock:
+            self._uids.clear()
+
+    def __len__(self):
+        return len(self._uids)
+
+
+pidindex = PidIndex()
@@ -1,36 +1,74 @@
 #!/usr/bin/env python
 
+from array import array
 from utils.counter import Counter
+from utils.weightedaverage import WeightedAverage
 
 
 class PowerBuffer(object):
-    def __init__(self, max_queue_size):
+    # Rollup tiers. Samples are aggregated into buckets of a minute, fifteen
+    # minutes and an hour, assuming one iteration per second
+    ROLLUP_MINUTE = 0
+    ROLLUP_QUARTER = 1
+    ROLLUP_HOUR = 2
+
+    # Iterations per bucket and buckets kept by each tier: an hour of
+    # minutes, a day of quarters and a week of hours
+    ROLLUP_PERIODS = (60, 15 * 60, 60 * 60)
+    ROLLUP_SIZES = (60, 24 * 4, 7 * 24)
+
+    def __init__(self, max_queue_size, avg_weight=None, rollups=False):
         self._max_queue_size = max_queue_size
+        # Weight of the running average of each UID. No average is kept if
+        # None
+        self._avg_weight = avg_weight
+        self._rollups = rollups
         self.uid_powers = {}
 
-    def add_power(self, uid, iter_num, power):
-        """Contract: iteration should only increase accross adds"""
+    def add_power(self, uid, iter_num, power, span=1):
+        """Add power drawn by uid on each of the span iterations up to
+        iter_num, e.g. when catching up on iterations a monitor missed.
+        Contract: iteration should only increase accross adds"""
 
-        uid_power = self.uid_powers.get(uid, self._UidPower())
-        uid_power.count.add(1)
+        uid_power = self.uid_powers.get(uid, None)
+        if uid_power is None:
+            uid_power = self._UidPower(self._max_queue_size, self._avg_weight)
+            if self._rollups:
+                uid_power.rollups = [self._Rollup(period, size) for
+                                     period, size in zip(self.ROLLUP_PERIODS,
+                                                         self.ROLLUP_SIZES)]
+            self.uid_powers[uid] = uid_power
+
+        uid_power.count.add(span, iter_num)
+
+        # Iterations of span not added already
+        first_iter = max(iter_num - span, uid_power.last_added) + 1
+        uid_power.last_added = iter_num
+
+        # Zero powers count towards the minimum and number of samples of a
+        # bucket
+        if uid_power.rollups is not None:
+            for rollup in uid_power.rollups:
+                for it in xrange(first_iter, iter_num + 1):
+                    rollup.add(it, power)
 
         if power == 0:
             return
 
-        uid_power.total.add(power)
+        # Whole energy of span lands on iter_num
+        uid_power.total.add(power * span, iter_num)
+
+        if uid_power.avg is not None:
+            uid_power.avg.add(power)
 
         if self._max_queue_size == 0:
             return
 
-        # Keep size of queue stable by treating it as circular queue (FILO)
-        if len(uid_power.queue) > self._max_queue_size:
-            uid_power.queue.pop()
-
-        uid_power.queue.insert(0, self._PowerData(iter_num, power))
+        for it in xrange(max(first_iter, iter_num - self._max_queue_size + 1),
+                         iter_num + 1):
+            uid_power.append(it, power)
 
     def get_powers_up_to_timestamp(self, uid, timestamp, number):
-        idx = 0
-
         if number < 0:
             number = 0
 
@@ -40,50 +78,163 @@ class PowerBuffer(object):
         powers = [0] * number
         uid_power = self.uid_powers.get(uid, None)
 
-        if not uid_power or len(uid_power.queue) == 0:
+        if not uid_power or uid_power.last_iter == -1:
             return powers
 
         if timestamp == -1:
-            timestamp = uid_power.queue[0].iter_num
+            timestamp = uid_power.last_iter
 
-        for data in uid_power.queue:
-            while data.iter_num < timestamp and idx < number:
-                idx += 1
-                timestamp -= 1
+        # Samples live in the slot given by their iteration number, so each
+        # requested iteration is a direct lookup. Slots holding a different
+        # iteration were either never written (zero power) or overwritten.
+        iters = uid_power.iters
+        values = uid_power.powers
+        capacity = self._max_queue_size
 
-            if idx == number:
-                break
-
-            if data.iter_num == timestamp:
-                powers[idx] = data.power
-                idx += 1
-                timestamp -= 1
+        for idx in xrange(min(number, timestamp + 1)):
+            iter_num = timestamp - idx
+            slot = iter_num % capacity
+            if iters[slot] == iter_num:
+                powers[idx] = values[slot]
 
         return powers
 
-    def get_uid_total(self, uid, countertype):
+    def get_rollups(self, uid, tier, timestamp, number):
+        """Return (sum, count, min, max) of powers drawn by uid in the last
+        number buckets of rollup tier, up to the one holding iteration
+        timestamp (-1 for the latest). Most recent bucket comes first. Buckets
+        without samples are all zeros"""
+        empty = (0, 0, 0, 0)
+
+        if number < 0:
+            number = 0
+
+        if number > self.ROLLUP_SIZES[tier]:
+            number = self.ROLLUP_SIZES[tier]
+
+        uid_power = self.uid_powers.get(uid, None)
+
+        if uid_power is None or uid_power.rollups is None:
+            return [empty] * number
+
+        rollup = uid_power.rollups[tier]
+
+        if timestamp == -1:
+            last_bucket = rollup.last_bucket
+        else:
+            last_bucket = timestamp // rollup.period
+
+        buckets = [empty] * number
+
+        for idx in xrange(min(number, last_bucket + 1)):
+            bucket = rollup.get(last_bucket - idx)
+            if bucket is not None:
+                buckets[idx] = bucket
+
+        return buckets
+
+    def get_rollup_averages(self, uid, tier, timestamp, number):
+        """Return average power drawn by uid in each of the last number
+        buckets of rollup tier, most recent first"""
+        return [sum_ / count if count > 0 else 0 for sum_, count, _, _ in
+                self.get_rollups(uid, tier, timestamp, number)]
+
+    def get_uid_total(self, uid, countertype, iter_num=None):
+        """Return power drawn by uid over counter type as of iteration
+        iter_num, which defaults to the last one uid drew power on"""
         uid_power = self.uid_powers.get(uid, None)
         if uid_power is not None:
-            return uid_power.total.get(countertype)
+            return uid_power.total.get(countertype, iter_num)
 
         return 0
 
-    def get_uid_buffer_count(self, uid, countertype):
+    def get_uid_buffer_count(self, uid, countertype, iter_num=None):
         uid_power = self.uid_powers.get(uid, None)
         if uid_power is not None:
-            return uid_power.count.get(countertype)
+            return uid_power.count.get(countertype, iter_num)
 
         return 0
 
-    class _UidPower(object):
+    def get_uid_avg_power(self, uid):
+        """Return weighted average of non-zero powers drawn by uid"""
+        uid_power = self.uid_powers.get(uid, None)
+        if uid_power is not None and uid_power.avg is not None:
+            return uid_power.avg.get()
+
+        return 0
 
-        def __init__(self):
-            self.queue = []
+    class _UidPower(object):
+        """Fixed-capacity circular store of per-iteration powers. Slot of a
+        sample is its iteration number modulo capacity, which makes appending
+        and evicting O(1) without allocating per sample"""
+
+        __slots__ = ['iters', 'powers', 'last_iter', 'last_added', 'total',
+                     'count', 'avg', 'rollups']
+
+        def __init__(self, capacity, avg_weight=None):
+            self.iters = array('l', [-1]) * capacity
+            self.powers = array('d', [0.0]) * capacity
+            self.last_iter = -1
+            # Last iteration added, whatever the power
+            self.last_added = -1
             self.total = Counter()
             self.count = Counter()
-
-    class _PowerData(object):
-
-        def __init__(self, iter_num, power):
-            self.iter_num = iter_num
-            self.power = power
+            self.avg = (WeightedAverage(avg_weight) if avg_weight is not None
+                        else None)
+            # Rollup of each tier, if kept
+            self.rollups = None
+
+        def append(self, iter_num, power):
+            slot = iter_num % len(self.iters)
+            self.iters[slot] = iter_num
+            self.powers[slot] = power
+            self.last_iter = iter_num
+
+    class _Rollup(object):
+        """Circular store of (sum, count, min, max) of powers over buckets of
+        period iterations. Like samples, the slot of a bucket is its number
+        modulo capacity, so memory is bounded by the number of buckets"""
+
+        __slots__ = ['period', 'buckets', 'sums', 'counts', 'mins', 'maxs',
+                     'last_bucket']
+
+        def __init__(self, period, capacity):
+            self.period = period
+            self.buckets = array('l', [-1]) * capacity
+            self.sums = array('d', [0.0]) * capacity
+            self.counts = array('l', [0]) * capacity
+            self.mins = array('d', [0.0]) * capacity
+            self.maxs = array('d', [0.0]) * capacity
+            self.last_bucket = -1
+
+        def add(self, iter_num, power):
+            bucket = iter_num // self.period
+            slot = bucket % len(self.buckets)
+
+            if self.buckets[slot] != bucket:
+                # First sample of bucket. Whatever was left in the slot is
+                # older than the tier keeps
+                self.buckets[slot] = bucket
+                self.sums[slot] = power
+                self.counts[slot] = 1
+                self.mins[slot] = power
+                self.maxs[slot] = power
+            else:
+                self.sums[slot] += power
+                self.counts[slot] += 1
+                if power < self.mins[slot]:
+                    self.mins[slot] = power
+                elif power > self.maxs[slot]:
+                    self.maxs[slot] = power
+
+            self.last_bucket = bucket
+
+        def get(self, bucket):
+            """Return (sum, count, min, max) of bucket or None if it holds no
+            samples"""
+            slot = bucket % len(self.buckets)
+            if self.buckets[slot] != bucket:
+                return None
+
+            return (self.sums[slot], self.counts[slot], self.mins[slot],
+                    self.maxs[slot])
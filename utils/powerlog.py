@@ -0,0 +1,796 @@
+#!/usr/bin/env python
+
+"""
+Compact binary power log.
+
+A log starts with a header holding the phone model and the table of hardware
+components, followed by records. A record is a type byte, the varint length
+of its payload and the payload. Integers are varints (signed ones zigzag
+encoded, as UIDs may be negative) and powers are float32, so a power sample
+takes 6 to 8 bytes instead of a formatted line.
+
+A log may also be split into segments, see utils.logsegments, which
+PowerLogSegments reads as a whole.
+
+A sparse index may go along in a file of its own: a header followed by
+(iteration, offset) entries of fixed size pointing at every few power
+records. It only speeds up seeks into the log, see PowerLogFile, and is
+rebuilt from the log whenever it falls behind or disagrees with it. Segments
+get indexed by index_segment() once closed, and keep their index once
+compressed. Random access then covers every closed segment: PowerLogSegments
+picks segments by their first indexed iteration, and starts reading one at
+the last indexed power record up to the range. Compressed segments still get
+decompressed up to that point, but not parsed. The live segment has no index
+and is read from its start.
+
+Usage::
+python -m utils.powerlog powerlog.bin [output.txt]
+
+where powerlog.bin is either a log file or the prefix of log segments.
+"""
+
+__all__ = ['PowerLogWriter', 'PowerLogReader', 'PowerLogFile',
+           'PowerLogSegments', 'index_segment', 'export_text']
+
+from bisect import bisect_right
+from utils.logsegments import COMPRESSED_SUFFIX
+from utils.logsegments import get_segments
+from utils.logsegments import open_segment
+
+import logging
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"PWRL"
+VERSION = 1
+
+INDEX_MAGIC = b"PWRI"
+INDEX_SUFFIX = ".idx"
+
+# Record types
+RECORD_POWER = 1        # iter_num, total power, [(uid, component, power)]
+RECORD_BATTERY = 2      # iter_num, charge, temperature, voltage, current
+RECORD_SETTINGS = 3     # iter_num, time, brightness (-1: auto), timeout
+RECORD_APP_NAME = 4     # uid, app name
+RECORD_CATCHUP = 5      # iter_num, span, [(uid, component, power)]
+RECORD_PROFILE = 6      # iter_num, self uid, [(monitor, overhead...)]
+
+_FLOAT = struct.Struct("<f")
+_DOUBLE = struct.Struct("<d")
+_BATTERY = struct.Struct("<4f")
+_TIMES = struct.Struct("<3d")           # wall, CPU and max wall time
+_INDEX_ENTRY = struct.Struct("<QQ")     # iter_num, offset
+
+# SystemInfo.AID_ALL, without pulling Android bindings in for log tools
+_AID_ALL = -1
+
+logger = logging.getLogger("PowerLog")
+
+
+def _put_varint(buf, value):
+    """Append unsigned value to bytearray buf"""
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _put_svarint(buf, value):
+    """Append signed value to bytearray buf"""
+    _put_varint(buf, (value << 1) if value >= 0 else ((-value) << 1) - 1)
+
+
+def _put_string(buf, value):
+    data = value.encode("utf-8")
+    _put_varint(buf, len(data))
+    buf.extend(data)
+
+
+def _get_varint(buf, pos):
+    """Return unsigned value read from buf at pos and position after it.
+    Raises IndexError if buf ends first"""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _get_svarint(buf, pos):
+    value, pos = _get_varint(buf, pos)
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+
+
+def _get_string(buf, pos):
+    size, pos = _get_varint(buf, pos)
+    if pos + size > len(buf):
+        raise IndexError("string out of buffer")
+    return bytes(buf[pos:pos + size]).decode("utf-8"), pos + size
+
+
+class PowerLogWriter(object):
+    """Serialize power log records, handed out to a binary file with
+    writelines() every flush_interval iterations. The header is written right
+    away with write(), so that a BackgroundWriter never drops it. With an
+    index file, every index_interval power records get an index entry. That
+    only holds for a log written as a single file with nothing dropped, not
+    for segments, see index_segment(). Not thread safe: records are meant to come from the estimator thread only"""
+
+    DEFAULT_FLUSH_INTERVAL = 10     # iterations
+    DEFAULT_INDEX_INTERVAL = 64     # power records
+
+    def __init__(self, out, components, model_name="",
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, index=None,
+                 index_interval=DEFAULT_INDEX_INTERVAL):
+        self._out = out
+        self._flush_interval = flush_interval
+        self._components = {name: i for i, name in enumerate(components)}
+        # Serialized records not handed out yet
+        self._records = []
+        self._flushed_iter = None
+
+        self._index = index
+        self._index_interval = index_interval
+        self._npowers = 0
+        if index is not None:
+            index.write(INDEX_MAGIC + bytes(bytearray([VERSION])))
+
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        _put_string(header, model_name)
+        _put_varint(header, len(components))
+        for name in components:
+            _put_string(header, name)
+        self._out.write(bytes(header))
+        # Offset of next record, provided nothing gets dropped
+        self._offset = len(header)
+
+    def _add_record(self, type_, payload):
+        """Queue record and return its offset"""
+        record = bytearray()
+        record.append(type_)
+        _put_varint(record, len(payload))
+        record.extend(payload)
+        self._records.append(bytes(record))
+
+        offset = self._offset
+        self._offset += len(record)
+        return offset
+
+    def _maybe_flush(self, iter_num):
+        if self._flushed_iter is None:
+            self._flushed_iter = iter_num
+        elif iter_num - self._flushed_iter >= self._flush_interval:
+            self.flush()
+            self._flushed_iter = iter_num
+
+    def _put_powers(self, payload, powers):
+        components = self._components
+        for uid, name, power in powers:
+            _put_svarint(payload, uid)
+            _put_varint(payload, components[name])
+            payload.extend(_FLOAT.pack(power))
+
+    def write_power(self, iter_num, total_power, powers):
+        """Log powers drawn on iteration, as (uid, component, power)"""
+        payload = bytearray()
+        _put_varint(payload, iter_num)
+        payload.extend(_FLOAT.pack(total_power))
+        self._put_powers(payload, powers)
+
+        offset = self._add_record(RECORD_POWER, payload)
+
+        if self._index is not None:
+            if self._npowers % self._index_interval == 0:
+                self._index.write(_INDEX_ENTRY.pack(iter_num, offset))
+            self._npowers += 1
+
+        self._maybe_flush(iter_num)
+
+    def write_catchup(self, iter_num, span, powers):
+        """Log powers drawn on each of the span iterations up to iter_num, as
+        (uid, component, power). Backfills iterations a monitor skipped, its
+        data showing up on a later power record only"""
+        payload = bytearray()
+        _put_varint(payload, iter_num)
+        _put_varint(payload, span)
+        self._put_powers(payload, powers)
+        self._add_record(RECORD_CATCHUP, payload)
+
+    def write_battery(self, iter_num, charge, temperature, voltage, current):
+        payload = bytearray()
+        _put_varint(payload, iter_num)
+        payload.extend(_BATTERY.pack(charge, temperature, voltage, current))
+        self._add_record(RECORD_BATTERY, payload)
+
+    def write_settings(self, iter_num, timestamp, brightness, timeout):
+        """Brightness is -1 when set to automatic"""
+        payload = bytearray()
+        _put_varint(payload, iter_num)
+        payload.extend(_DOUBLE.pack(timestamp))
+        _put_svarint(payload, brightness)
+        _put_svarint(payload, timeout)
+        self._add_record(RECORD_SETTINGS, payload)
+
+    def write_profile(self, iter_num, self_uid, profiles):
+        """Log overhead of each monitor since it started, profiles being
+        { monitor name : libs.profiler.MonitorProfile }, along with the UID
+        the monitor runs as"""
+        payload = bytearray()
+        _put_varint(payload, iter_num)
+        _put_svarint(payload, self_uid)
+
+        for name, profile in sorted(profiles.iteritems()):
+            _put_string(payload, name)
+            _put_varint(payload, profile.iterations)
+            payload.extend(_TIMES.pack(profile.wall_time, profile.cpu_time,
+                                       profile.max_wall_time))
+            _put_varint(payload, profile.file_opens)
+            _put_varint(payload, profile.bytes_read)
+            _put_varint(payload, profile.jni_calls)
+            _put_varint(payload, len(profile.lag_hist))
+            for count in profile.lag_hist:
+                _put_varint(payload, count)
+
+        self._add_record(RECORD_PROFILE, payload)
+
+    def write_app_name(self, uid, app_name):
+        payload = bytearray()
+        _put_svarint(payload, uid)
+        _put_string(payload, app_name)
+        self._add_record(RECORD_APP_NAME, payload)
+
+    def flush(self):
+        """Hand records out to the file, without waiting for them to reach
+        storage"""
+        if len(self._records) == 0:
+            return
+
+        self._out.writelines(self._records)
+        self._records = []
+
+    def close(self):
+        if self._out is None:
+            return
+
+        self.flush()
+        self._out.close()
+        self._out = None
+
+        if self._index is not None:
+            self._index.close()
+
+
+class PowerLogReader(object):
+    """Iterate over records of a binary power log, reading the file in
+    chunks. Records are tuples starting with their type:
+        (RECORD_POWER, iter_num, total_power, [(uid, component, power)])
+        (RECORD_CATCHUP, iter_num, span, [(uid, component, power)])
+        (RECORD_BATTERY, iter_num, charge, temperature, voltage, current)
+        (RECORD_SETTINGS, iter_num, time, brightness, timeout)
+        (RECORD_APP_NAME, uid, app_name)
+        (RECORD_PROFILE, iter_num, self_uid, [(monitor, iterations,
+            wall_time, cpu_time, max_wall_time, file_opens, bytes_read,
+            jni_calls, lag_hist)])
+    A record cut short, as left by a crash, ends the log. Records of unknown
+    types are skipped. The file must be seekable for seek()"""
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, in_):
+        self._in = in_
+        self._data = bytearray()
+        # File offset of _data[0]
+        self._base = 0
+        self._pos = 0
+        self._eof = False
+
+        self._read_header()
+
+    def tell(self):
+        """Return file offset of next record"""
+        return self._base + self._pos
+
+    def seek(self, offset):
+        """Read records from file offset on, which must start a record"""
+        self._in.seek(offset)
+        self._data = bytearray()
+        self._base = offset
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Read next chunk. Return False at end of file"""
+        if self._eof:
+            return False
+
+        chunk = self._in.read(self.CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+
+        del self._data[:self._pos]
+        self._base += self._pos
+        self._pos = 0
+        self._data.extend(chunk)
+        return True
+
+    def _read_header(self):
+        while True:
+            try:
+                if bytes(self._data[:len(MAGIC)]) != MAGIC[:len(self._data)]:
+                    raise ValueError("Not a power log")
+                pos = len(MAGIC)
+                version = self._data[pos]
+                if version != VERSION:
+                    raise ValueError("Unsupported power log version "
+                                     "{0}".format(version))
+                self.model_name, pos = _get_string(self._data, pos + 1)
+                ncomponents, pos = _get_varint(self._data, pos)
+                components = []
+                for _ in xrange(ncomponents):
+                    name, pos = _get_string(self._data, pos)
+                    components.append(name)
+                break
+            except IndexError:
+                if not self._fill():
+                    raise ValueError("Power log header cut short")
+
+        self.components = components
+        self._pos = pos
+
+    def _next_payload(self):
+        """Return file offset, type and payload bounds in _data of next
+        record, or None at end"""
+        while True:
+            try:
+                type_ = self._data[self._pos]
+                size, start = _get_varint(self._data, self._pos + 1)
+                if start + size <= len(self._data):
+                    offset = self._base + self._pos
+                    self._pos = start + size
+                    return offset, type_, start, start + size
+            except IndexError:
+                pass
+
+            if not self._fill():
+                if self._pos < len(self._data):
+                    logger.warn("Power log ends with a truncated record")
+                return None
+
+    def __iter__(self):
+        while True:
+            record = self._next_payload()
+            if record is None:
+                return
+
+            _, type_, start, end = record
+            parsed = self.parse_record(type_, self._data, start, end)
+            if parsed is not None:
+                yield parsed
+
+    def parse_record(self, type_, buf, pos, end):
+        """Return record of type held in buf[pos:end]"""
+        if type_ == RECORD_POWER:
+            iter_num, pos = _get_varint(buf, pos)
+            total_power = _FLOAT.unpack_from(buf, pos)[0]
+            powers = self._parse_powers(buf, pos + _FLOAT.size, end)
+            return RECORD_POWER, iter_num, total_power, powers
+
+        if type_ == RECORD_CATCHUP:
+            iter_num, pos = _get_varint(buf, pos)
+            span, pos = _get_varint(buf, pos)
+            return (RECORD_CATCHUP, iter_num, span,
+                    self._parse_powers(buf, pos, end))
+
+        if type_ == RECORD_BATTERY:
+            iter_num, pos = _get_varint(buf, pos)
+            return (RECORD_BATTERY, iter_num) + _BATTERY.unpack_from(buf, pos)
+
+        if type_ == RECORD_SETTINGS:
+            iter_num, pos = _get_varint(buf, pos)
+            timestamp = _DOUBLE.unpack_from(buf, pos)[0]
+            brightness, pos = _get_svarint(buf, pos + _DOUBLE.size)
+            timeout, pos = _get_svarint(buf, pos)
+            return RECORD_SETTINGS, iter_num, timestamp, brightness, timeout
+
+        if type_ == RECORD_APP_NAME:
+            uid, pos = _get_svarint(buf, pos)
+            app_name, pos = _get_string(buf, pos)
+            return RECORD_APP_NAME, uid, app_name
+
+        if type_ == RECORD_PROFILE:
+            iter_num, pos = _get_varint(buf, pos)
+            self_uid, pos = _get_svarint(buf, pos)
+            profiles = []
+
+            while pos < end:
+                name, pos = _get_string(buf, pos)
+                iterations, pos = _get_varint(buf, pos)
+                times = _TIMES.unpack_from(buf, pos)
+                pos += _TIMES.size
+                counts = []
+                for _ in xrange(3):
+                    count, pos = _get_varint(buf, pos)
+                    counts.append(count)
+                nbuckets, pos = _get_varint(buf, pos)
+                lag_hist = []
+                for _ in xrange(nbuckets):
+                    count, pos = _get_varint(buf, pos)
+                    lag_hist.append(count)
+                profiles.append((name, iterations) + times + tuple(counts) +
+                                (lag_hist,))
+
+            return RECORD_PROFILE, iter_num, self_uid, profiles
+
+        return None
+
+    def _parse_powers(self, buf, pos, end):
+        components = self.components
+        powers = []
+
+        while pos < end:
+            uid, pos = _get_svarint(buf, pos)
+            component, pos = _get_varint(buf, pos)
+            powers.append((uid, components[component],
+                           _FLOAT.unpack_from(buf, pos)[0]))
+            pos += _FLOAT.size
+
+        return powers
+
+
+def _read_index(path):
+    """Return (iter_num, offset) entries of index file"""
+    try:
+        with open(path, "rb") as fp:
+            data = fp.read()
+    except IOError:
+        return []
+
+    start = len(INDEX_MAGIC) + 1
+    if data[:start] != INDEX_MAGIC + bytes(bytearray([VERSION])):
+        return []
+
+    # A partly written entry is just ignored
+    return [_INDEX_ENTRY.unpack_from(data, pos) for pos in
+            xrange(start, len(data) - _INDEX_ENTRY.size + 1,
+                   _INDEX_ENTRY.size)]
+
+
+class PowerLogFile(object):
+    """Random access to a power log through a memory map. Records of a range
+    of iterations are found through the sparse index, without reading what
+    comes before them. Index entries are checked against the log when loaded.
+    The index is rebuilt from the log from the first entry that is wrong or
+    missing on, e.g. once records got dropped or the index was cut short, and
+    saved back when possible. Not thread safe"""
+
+    INDEX_INTERVAL = PowerLogWriter.DEFAULT_INDEX_INTERVAL
+
+    def __init__(self, path, index_path=None):
+        self._fp = open(path, "rb")
+        self._mmap = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._reader = PowerLogReader(self._mmap)
+        self._data_start = self._reader.tell()
+
+        self.model_name = self._reader.model_name
+        self.components = self._reader.components
+
+        self._index_path = (index_path if index_path is not None else
+                            path + INDEX_SUFFIX)
+        # Iteration and offset of indexed power records
+        self._iters = []
+        self._offsets = []
+        self._load_index()
+
+    def close(self):
+        self._mmap.close()
+        self._fp.close()
+
+    def _get_power_iter(self, offset):
+        """Return iteration of power record at offset, None if there is no
+        power record there"""
+        if offset < self._data_start or offset >= len(self._mmap):
+            return None
+
+        self._reader.seek(offset)
+        record = self._reader._next_payload()
+        if record is None or record[1] != RECORD_POWER:
+            return None
+
+        return _get_varint(self._reader._data, record[2])[0]
+
+    def _load_index(self):
+        entries = _read_index(self._index_path)
+
+        for iter_num, offset in entries:
+            if self._iters and (iter_num <= self._iters[-1] or
+                                offset <= self._offsets[-1]):
+                break
+            if self._get_power_iter(offset) != iter_num:
+                break
+            self._iters.append(iter_num)
+            self._offsets.append(offset)
+
+        extended = self._extend_index()
+
+        if extended or len(self._iters) < len(entries):
+            self._save_index()
+
+    def _extend_index(self):
+        """Index power records after the last indexed one. Return whether
+        any entries were added"""
+        if self._offsets:
+            # Skip last indexed record
+            self._reader.seek(self._offsets[-1])
+            self._reader._next_payload()
+            count = 1
+        else:
+            self._reader.seek(self._data_start)
+            count = 0
+
+        added = False
+
+        while True:
+            record = self._reader._next_payload()
+            if record is None:
+                break
+
+            offset, type_, start, _ = record
+            if type_ != RECORD_POWER:
+                continue
+
+            if count % self.INDEX_INTERVAL == 0:
+                self._iters.append(_get_varint(self._reader._data,
+                                               start)[0])
+                self._offsets.append(offset)
+                added = True
+            count += 1
+
+        return added
+
+    def _save_index(self):
+        try:
+            with open(self._index_path, "wb") as fp:
+                fp.write(INDEX_MAGIC + bytes(bytearray([VERSION])))
+                for entry in zip(self._iters, self._offsets):
+                    fp.write(_INDEX_ENTRY.pack(*entry))
+        except IOError:
+            # Read-only storage. The index will be rebuilt next time
+            logger.warn("Could not save power log index {0}".format(
+                self._index_path))
+
+    def get_records(self, start_iter, end_iter):
+        """Yield records of iterations start_iter to end_iter, both included,
+        as PowerLogReader does. App names carry no iteration and are left
+        out"""
+        i = bisect_right(self._iters, start_iter) - 1
+        self._reader.seek(self._offsets[i] if i >= 0 else self._data_start)
+
+        for record in self._reader:
+            type_ = record[0]
+            if type_ == RECORD_APP_NAME:
+                continue
+
+            iter_num = record[1]
+            if iter_num > end_iter:
+                if type_ == RECORD_POWER:
+                    return
+            elif iter_num >= start_iter:
+                yield record
+
+    def get_uid_powers(self, uid, start_iter, end_iter):
+        """Return [(iter_num, component, power)] drawn by uid over iterations
+        start_iter to end_iter, both included"""
+        return _get_uid_powers(self.get_records(start_iter, end_iter), uid)
+
+
+def index_segment(path):
+    """Write the index of a closed log segment, see SegmentedFile on_close"""
+    try:
+        PowerLogFile(path).close()
+    except ValueError:
+        # No header or no record at all, nothing to index
+        logger.warn("Could not index power log segment {0}".format(path))
+
+
+class PowerLogSegments(object):
+    """Read the segments of a log as a single log. Segments may be
+    compressed. A segment that can't be read, e.g. a new one without its
+    header yet, is skipped. Indexes written by index_segment() are trusted
+    as long as they agree with the first record read through them"""
+
+    def __init__(self, prefix):
+        self._paths = [path for _, path in get_segments(prefix)]
+        if not self._paths:
+            raise ValueError("No power log segments for {0}".format(prefix))
+
+        with open_segment(self._paths[0]) as in_:
+            reader = PowerLogReader(in_)
+        self.model_name = reader.model_name
+        self.components = reader.components
+
+    @staticmethod
+    def _get_index(path):
+        """Return (iter_num, offset) entries of the index of segment"""
+        if path.endswith(COMPRESSED_SUFFIX):
+            path = path[:-len(COMPRESSED_SUFFIX)]
+        return _read_index(path + INDEX_SUFFIX)
+
+    def _get_records(self, path, start_iter=None):
+        """Yield records of segment, from the last indexed power record up
+        to start_iter on if given"""
+        entries = (self._get_index(path) if start_iter is not None else [])
+        i = bisect_right(entries, (start_iter, sys.maxint)) - 1
+
+        try:
+            with open_segment(path) as in_:
+                reader = PowerLogReader(in_)
+                data_start = reader.tell()
+
+                if i >= 0:
+                    iter_num, offset = entries[i]
+                    reader.seek(offset)
+                    record = next(iter(reader), None)
+                    if (record is not None and record[0] == RECORD_POWER and
+                            record[1] == iter_num):
+                        yield record
+                    else:
+                        logger.warn("Power log segment {0} disagrees with "
+                                    "its index".format(path))
+                        reader.seek(data_start)
+
+                for record in reader:
+                    yield record
+        except ValueError:
+            logger.warn("Skipping power log segment {0}".format(path))
+
+    def __iter__(self):
+        for path in self._paths:
+            for record in self._get_records(path):
+                yield record
+
+    def _get_first_iter(self, path):
+        """Return iteration of first power record of segment"""
+        # The first power record is always indexed
+        entries = self._get_index(path)
+        if entries:
+            return entries[0][0]
+
+        for record in self._get_records(path):
+            if record[0] == RECORD_POWER:
+                return record[1]
+        return None
+
+    def get_records(self, start_iter, end_iter):
+        """Yield records of iterations start_iter to end_iter, both included.
+        Segments ending before start_iter are not read past their first
+        record, or not at all when indexed"""
+        paths = self._paths
+
+        for i, path in enumerate(paths):
+            if i + 1 < len(paths):
+                next_iter = self._get_first_iter(paths[i + 1])
+                if next_iter is not None and next_iter <= start_iter:
+                    continue
+
+            for record in self._get_records(path, start_iter):
+                if record[0] == RECORD_APP_NAME:
+                    continue
+
+                iter_num = record[1]
+                if iter_num > end_iter:
+                    if record[0] == RECORD_POWER:
+                        return
+                elif iter_num >= start_iter:
+                    yield record
+
+    def get_uid_powers(self, uid, start_iter, end_iter):
+        """Return [(iter_num, component, power)] drawn by uid over iterations
+        start_iter to end_iter, both included"""
+        return _get_uid_powers(self.get_records(start_iter, end_iter), uid)
+
+
+def _get_uid_powers(records, uid):
+    """Return [(iter_num, component, power)] drawn by uid in records. Powers
+    of catch-up records show up on each iteration of their span"""
+    powers = []
+
+    for record in records:
+        type_, iter_num = record[:2]
+
+        if type_ == RECORD_POWER:
+            for record_uid, name, power in record[3]:
+                if record_uid == uid:
+                    powers.append((iter_num, name, power))
+        elif type_ == RECORD_CATCHUP:
+            span = record[2]
+            for record_uid, name, power in record[3]:
+                if record_uid == uid:
+                    powers.extend((it, name, power) for it in
+                                  xrange(iter_num - span + 1, iter_num + 1))
+
+    return powers
+
+
+def export_text(records, out, model_name=""):
+    """Write records as the text log the estimator used to write"""
+    if model_name:
+        out.write("model {0}\n".format(model_name))
+
+    for record in records:
+        type_ = record[0]
+
+        if type_ == RECORD_POWER:
+            _, iter_num, total_power, powers = record
+            out.write("== POWER START ==\n")
+            out.write("iteration {0}\n".format(iter_num))
+            out.write("total-power {0:.2f}\n".format(total_power))
+            for uid, name, power in powers:
+                if uid == _AID_ALL:
+                    out.write("{0} {1:.3f}\n".format(name, power))
+                else:
+                    out.write("{0}-{1} {2:.2f}\n".format(name, uid, power))
+            out.write("== POWER END ==\n")
+        elif type_ == RECORD_CATCHUP:
+            _, iter_num, span, powers = record
+            out.write("== CATCHUP START ==\n")
+            out.write("iterations {0} {1}\n".format(iter_num - span + 1,
+                                                    iter_num))
+            for uid, name, power in powers:
+                if uid == _AID_ALL:
+                    out.write("{0} {1:.3f}\n".format(name, power))
+                else:
+                    out.write("{0}-{1} {2:.2f}\n".format(name, uid, power))
+            out.write("== CATCHUP END ==\n")
+        elif type_ == RECORD_BATTERY:
+            out.write("== BATTERY INFO START ==\n")
+            out.write("batt-charge: {2} batt-temp: {3} batt-voltage: {4} "
+                      "batt-current: {5}\n".format(*record))
+            out.write("== BATTERY INFO END ==\n")
+        elif type_ == RECORD_SETTINGS:
+            _, iter_num, timestamp, brightness, timeout = record
+            out.write("== SYSTEM SETTINGS START ==\n")
+            out.write("time {0}\n".format(timestamp))
+            out.write("screen-brightness: {0}\n".format(
+                "automatic" if brightness == -1 else brightness))
+            out.write("screen-timeout: {0}\n".format(timeout))
+            out.write("== SYSTEM SETTINGS END ==\n")
+        elif type_ == RECORD_APP_NAME:
+            out.write("associate {1} {2}\n".format(*record))
+        elif type_ == RECORD_PROFILE:
+            _, iter_num, self_uid, profiles = record
+            out.write("== PROFILE START ==\n")
+            out.write("self-uid {0}\n".format(self_uid))
+            for profile in profiles:
+                lag_hist = ",".join(str(count) for count in profile[-1])
+                out.write("{0} iterations: {1} wall: {2:.1f} cpu: {3:.1f} "
+                          "max-wall: {4:.1f} opens: {5} read: {6} jni: {7} "
+                          "lag: {8}\n".format(*(profile[:-1] + (lag_hist,))))
+            out.write("== PROFILE END ==\n")
+
+
+def main(path, out_path=None):
+    out = open(out_path, "w") if out_path is not None else sys.stdout
+
+    try:
+        if os.path.isfile(path):
+            with open(path, "rb") as in_:
+                reader = PowerLogReader(in_)
+                export_text(reader, out, reader.model_name)
+        else:
+            segments = PowerLogSegments(path)
+            export_text(segments, out, segments.model_name)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
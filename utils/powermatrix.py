@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+from array import array
+
+
+class PowerMatrix(object):
+    """Per-iteration power history shared by all hardware components. Data is
+    kept as a (time x component x uid-slot) matrix stored column by column:
+    every UID owns a slot holding a flat array of rows, one row per iteration
+    with one entry per component. Rows are reused circularly, so the history
+    of a UID over the last N iterations is one or two contiguous slices of
+    its column. Once none of the iterations held has power of a UID, its
+    slot is freed and reused by the next UID added."""
+
+    def __init__(self, components, max_iters):
+        self._components = list(components)
+        self._comp_idx = {name: i for i, name in enumerate(self._components)}
+        self._ncomps = len(self._components)
+        self._max_iters = max_iters
+
+        # { uid : slot }
+        self._uid_slots = {}
+        self._columns = []
+        # Last iteration each slot got power on, and slots free for reuse
+        self._slot_iters = array('l')
+        self._free_slots = []
+        # Iteration currently held by each row
+        self._row_iters = array('l', [-1]) * max_iters
+        self._zero_row = array('d', [0.0]) * self._ncomps
+        self._zero_column = array('d', [0.0]) * (max_iters * self._ncomps)
+        self._last_iter = -1
+
+    def add_power(self, uid, name, iter_num, power, span=1):
+        """Set power drawn on each of the span iterations up to iter_num, as
+        far back as the matrix holds. Contract: iteration should only
+        increase accross adds"""
+        if self._max_iters == 0:
+            return
+
+        row = iter_num % self._max_iters
+
+        if self._row_iters[row] != iter_num:
+            self._advance(iter_num)
+
+        slot = self._uid_slots.get(uid, None)
+        if slot is None:
+            if power == 0:
+                # Nothing to hold that a missing UID doesn't read as
+                return
+            slot = self._add_uid(uid)
+
+        if power != 0:
+            self._slot_iters[slot] = iter_num
+
+        column = self._columns[slot]
+        comp_idx = self._comp_idx[name]
+
+        if span == 1:
+            column[row * self._ncomps + comp_idx] = power
+            return
+
+        for it in xrange(max(iter_num - span, iter_num - self._max_iters) + 1,
+                         iter_num + 1):
+            row = it % self._max_iters
+            if self._row_iters[row] == it:
+                column[row * self._ncomps + comp_idx] = power
+
+    def _advance(self, iter_num):
+        """Clear rows of every iteration between the last one seen and
+        iter_num so that stale data never shows up in window sums. Free slots
+        of UIDs without power on any iteration held from then on"""
+        first = max(self._last_iter + 1, iter_num - self._max_iters + 1)
+        ncomps = self._ncomps
+        # Iterations up to this one fall out of the window
+        oldest = iter_num - self._max_iters
+        columns = []
+
+        for uid, slot in self._uid_slots.items():
+            if self._slot_iters[slot] <= oldest:
+                del self._uid_slots[uid]
+                self._free_slots.append(slot)
+            else:
+                columns.append(self._columns[slot])
+
+        for it in xrange(first, iter_num + 1):
+            row = it % self._max_iters
+            start = row * ncomps
+            for column in columns:
+                column[start:start + ncomps] = self._zero_row
+            self._row_iters[row] = it
+
+        self._last_iter = iter_num
+
+    def _add_uid(self, uid):
+        if self._free_slots:
+            # Rows of freed slots were left as they were
+            slot = self._free_slots.pop()
+            self._columns[slot][:] = self._zero_column
+        else:
+            slot = len(self._columns)
+            self._columns.append(array('d', self._zero_column))
+            self._slot_iters.append(-1)
+
+        self._uid_slots[uid] = slot
+        return slot
+
+    @property
+    def slot_count(self):
+        """Number of slots allocated, used or free"""
+        return len(self._columns)
+
+    def _get_window(self, timestamp, number):
+        """Return the (first, last) iterations of the requested window that
+        are still held in the matrix, or None if there is nothing to read"""
+        last = min(timestamp, self._last_iter)
+        first = max(timestamp - number + 1, self._last_iter -
+                    self._max_iters + 1, 0)
+
+        if last < first:
+            return None
+
+        return first, last
+
+    def _get_slices(self, column, first, last, comp=None):
+        """Return the slices of column covering iterations first to last. A
+        single component is read with a stride of one row"""
+        ncomps = self._ncomps
+        start = (first % self._max_iters) * ncomps
+        end = (last % self._max_iters + 1) * ncomps
+
+        if comp is None:
+            if start < end:
+                return [column[start:end]]
+            return [column[start:], column[:end]]
+
+        if start < end:
+            return [column[start + comp:end:ncomps]]
+        return [column[start + comp::ncomps], column[comp:end:ncomps]]
+
+    def get_powers(self, uid, name, timestamp, number):
+        """Return power history of component for uid. Most recent iteration
+        comes first"""
+        return self._get_history(uid, timestamp, number, self._comp_idx[name])
+
+    def get_total_powers(self, uid, timestamp, number):
+        """Return power history of uid summed over all components. Most recent
+        iteration comes first"""
+        return self._get_history(uid, timestamp, number)
+
+    def _get_history(self, uid, timestamp, number, comp=None):
+        number = max(0, min(number, self._max_iters))
+        powers = [0] * number
+        slot = self._uid_slots.get(uid, None)
+
+        if timestamp == -1:
+            timestamp = self._last_iter
+
+        window = self._get_window(timestamp, number)
+
+        if slot is None or window is None:
+            return powers
+
+        first, last = window
+        values = []
+        for part in self._get_slices(self._columns[slot], first, last, comp):
+            values.extend(part)
+
+        if comp is None:
+            ncomps = self._ncomps
+            values = [sum(values[i:i + ncomps])
+                      for i in xrange(0, len(values), ncomps)]
+
+        # Nothing is held for iterations after the last one added
+        offset = timestamp - last
+        values.reverse()
+        powers[offset:offset + len(values)] = values
+        return powers
+
+    def get_uid_sum(self, uid, timestamp, number, names=None):
+        """Return power drawn by uid over the last number iterations up to
+        timestamp. Only components in names are summed if names is given"""
+        slot = self._uid_slots.get(uid, None)
+
+        if timestamp == -1:
+            timestamp = self._last_iter
+
+        window = self._get_window(timestamp, min(number, self._max_iters))
+
+        if slot is None or window is None:
+            return 0.0
+
+        first, last = window
+        column = self._columns[slot]
+
+        if names is None:
+            return sum(sum(part) for part in
+                       self._get_slices(column, first, last))
+
+        return sum(sum(part) for name in names for part in
+                   self._get_slices(column, first, last,
+                                    self._comp_idx[name]))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+from utils.pidindex import pidindex
+from utils.systeminfo import SystemInfo
+
+import threading
+
+
+class ProcSnapshot(object):
+    """View of /proc for one iteration shared by all CPU core monitors. The
+    per-core times of /proc/stat and the list of running PIDs are read once
+    when the snapshot is taken. Times of a PID are read the first time any
+    core asks for them and then kept for the rest of the iteration, so cores
+    never repeat a read. Snapshots are not to be modified by their users."""
+
+    __slots__ = ['iter_num', 'pids', '_cpu_times', '_pid_times']
+
+    _current = None
+    _current_lock = threading.Lock()
+
+    def __init__(self, iter_num):
+        self.iter_num = iter_num
+        self.pids = tuple(SystemInfo.get_running_pids())
+        # { core : (usr, sys, total) }
+        self._cpu_times = {cpu: tuple(times) for cpu, times in
+                           SystemInfo.get_cpus_usr_sys_total_times()
+                           .iteritems()}
+        # { pid : (usr, sys, start time) }
+        self._pid_times = {}
+
+    @classmethod
+    def get(cls, iter_num):
+        """Return snapshot for iteration, taking it if no core did so yet. A
+        core lagging behind gets the newest snapshot available"""
+        with cls._current_lock:
+            snapshot = cls._current
+            if snapshot is None or snapshot.iter_num < iter_num:
+                snapshot = cls(iter_num)
+                cls._current = snapshot
+                # Processes gone since the last snapshot
+                pidindex.prune(snapshot.pids)
+
+        return snapshot
+
+    def get_cpu_times(self, cpu):
+        """Return (usr, sys, total) times of core or empty tuple if they
+        could not be read"""
+        return self._cpu_times.get(cpu, ())
+
+    def get_pid_times(self, pid):
+        """Return (usr, sys, start time) of pid or empty tuple if they could
+        not be read"""
+        times = self._pid_times.get(pid, None)
+
+        if times is None:
+            # Two cores may race reading the same PID. Both get the same
+            # result, so keep whichever landed first
+            times = self._pid_times.setdefault(
+                pid, tuple(SystemInfo.get_pid_usr_sys_times(pid)))
+
+        return times
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+Parsers for /proc/<pid>/stat and /proc/stat contents.
+
+They work in place on a buffer (str or bytearray) holding the first end bytes
+of the file, so that a single buffer can be reused across reads. Only the
+fields asked for are extracted; lines are never split into lists.
+"""
+
+__all__ = ['parse_pid_times', 'parse_cpu_times', 'parse_all_cpu_times']
+
+import re
+
+# Matches from the state field (3) up to utime (14), stime (15) and
+# starttime (22)
+_PID_TIMES_RE = re.compile(
+    br'(?:[^ ]+ ){11}(\d+) (\d+) (?:[^ ]+ ){6}(\d+)(?= )')
+
+# Matches a per-core line up to the softirq column. Columns are: user nice
+# system idle iowait irq softirq. A column cut short by the end of the buffer
+# does not match
+_CPU_LINE = br'cpu(\d+) (\d+) (\d+) \d+ (\d+) (\d+) (\d+) (\d+)(?=[ \n])'
+_CPU_LINE_RE = re.compile(br'^' + _CPU_LINE, re.M)
+
+# { cpu : compiled pattern matching its line only }
+_CPU_RES = {}
+
+
+def parse_pid_times(buf, end):
+    """Return (utime, stime, starttime) from contents of /proc/<pid>/stat or
+    empty tuple if they can't be parsed. The command name may contain spaces
+    and parentheses, so fields are counted from its last closing
+    parenthesis"""
+    pos = buf.rfind(b')', 0, end)
+    if pos < 0:
+        return ()
+
+    # Skip ") " to reach the state field
+    match = _PID_TIMES_RE.match(buf, pos + 2, end)
+    if match is None:
+        return ()
+
+    utime, stime, starttime = match.groups()
+    return int(utime), int(stime), int(starttime)
+
+
+def parse_cpu_times(buf, end, cpu):
+    """Return (usr, sys, total) jiffies of core cpu from contents of
+    /proc/stat or empty tuple if the core is not listed (e.g. offline)"""
+    cpu_re = _CPU_RES.get(cpu, None)
+    if cpu_re is None:
+        cpu_re = _CPU_RES.setdefault(cpu, re.compile(
+            br'^' + _CPU_LINE.replace(br'(\d+)', str(cpu).encode(), 1),
+            re.M))
+
+    match = cpu_re.search(buf, 0, end)
+    if match is None:
+        return ()
+
+    return _get_cpu_times(*match.groups())
+
+
+def parse_all_cpu_times(buf, end):
+    """Return { cpu : (usr, sys, total) } for every core listed in contents
+    of /proc/stat"""
+    cpus = {}
+
+    for match in _CPU_LINE_RE.finditer(buf, 0, end):
+        groups = match.groups()
+        cpus[int(groups[0])] = _get_cpu_times(*groups[1:])
+
+    return cpus
+
+
+def _get_cpu_times(user, nice, idle, iowait, irq, softirq):
+    # Same accounting as SystemInfo always did
+    nice = int(nice)
+    usr = int(user) + nice
+    sys = nice + int(irq) + int(softirq)
+    return usr, sys, usr + sys + int(idle) + int(iowait)
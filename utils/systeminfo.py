@@ -1,12 +1,27 @@
 #!/usr/bin/env python
 
-from jnius import autoclass
+from libs.profiler import profiler
+from utils.fdcache import fdcache
+from utils.statparser import parse_all_cpu_times, parse_cpu_times
+from utils.statparser import parse_pid_times
+from utils.trace import tracer
 
 import logging
 import os
+import threading
 
-Process = autoclass('android.os.Process')
-PythonActivity = autoclass('org.renpy.android.PythonActivity').mActivity
+try:
+    from jnius import autoclass
+except ImportError:
+    # Off Android, e.g. in benchmarks. Everything is read from the kernel
+    autoclass = None
+
+if autoclass is not None:
+    Process = autoclass('android.os.Process')
+    PythonActivity = autoclass('org.renpy.android.PythonActivity').mActivity
+else:
+    Process = None
+    PythonActivity = None
 
 
 class SystemInfo(object):
@@ -64,14 +79,41 @@ class SystemInfo(object):
     INDEX_USR_TIME = 0
     INDEX_SYS_TIME = 1
     INDEX_TOTAL_TIME = 2
+    # Process start time in jiffies since boot. Tells apart processes reusing
+    # the same PID
+    INDEX_START_TIME = 2
+
+    # Per-core lines come first in /proc/stat, so this holds them all
+    STAT_BUFFER_SIZE = 4096
 
     logger = logging.getLogger("SystemInfo")
 
+    # Stat files are parsed in place from a buffer reused by each thread
+    _local = threading.local()
+
+    @classmethod
+    def _read_stat(cls, path):
+        """Read start of stat file into the buffer of the calling thread.
+        Return (buffer, number of bytes read)"""
+        buf = getattr(cls._local, "buf", None)
+        if buf is None:
+            buf = cls._local.buf = bytearray(cls.STAT_BUFFER_SIZE)
+
+        return buf, fdcache.read_into(path, buf)
+
     @classmethod
     def get_uid_for_pid(cls, pid):
+        uid = cls._get_uid_for_pid(pid)
+        if tracer.recording:
+            tracer.record_value("uid_for_pid.{0}".format(pid), uid)
+        return uid
+
+    @classmethod
+    def _get_uid_for_pid(cls, pid):
 
         try:
             uid = Process.getUidForPid(pid)
+            profiler.count_jni()
             return uid
         except AttributeError:
             pass
@@ -79,8 +121,10 @@ class SystemInfo(object):
         # Above method may not be available. Try from kernel
 
         try:
+            profiler.count_open()
             with open(cls.UID_STATUS_MASK.format(pid)) as fp:
                 data = fp.readlines(6)
+                profiler.count_read(sum(len(line) for line in data))
                 if data[6].startswith("Uid"):
                     uid_str = data[6].split(":")[1].split()[0]
                     return int(uid_str)
@@ -91,13 +135,24 @@ class SystemInfo(object):
 
         return -1
 
+    @classmethod
+    def get_self_uid(cls):
+        """Return UID the monitor itself runs as"""
+        try:
+            return Process.myUid()
+        except AttributeError:
+            return os.getuid()
+
     @classmethod
     def get_running_pids(cls):
         # Assume all files in PROC_DIR which are numbers represent pids
         # WARNING: isdigit() only works with non-negative integers
-        pids = [int(file_)
-                for file_ in os.listdir(cls.PROC_DIR) if file_.isdigit()]
-        return pids
+        profiler.count_open()
+        names = [file_ for file_ in os.listdir(cls.PROC_DIR) if
+                 file_.isdigit()]
+        if tracer.recording:
+            tracer.record_listdir(cls.PROC_DIR, names)
+        return [int(file_) for file_ in names]
 
     @classmethod
     def get_uid_name(cls, uid):
@@ -110,6 +165,10 @@ class SystemInfo(object):
         if uid < cls.AID_APP:
             return "sys_{}".format(uid)
 
+        if PythonActivity is None:
+            return "app_{}".format(uid)
+
+        profiler.count_jni(2)
         pm = PythonActivity.getPackageManager()
         packages = pm.getPackagesForUid(uid)
 
@@ -120,47 +179,62 @@ class SystemInfo(object):
 
     @classmethod
     def get_uids(cls):
-        return [int(uid) for uid in os.listdir(cls.UID_STATS_DIR)]
+        profiler.count_open()
+        names = os.listdir(cls.UID_STATS_DIR)
+        if tracer.recording:
+            tracer.record_listdir(cls.UID_STATS_DIR, names)
+        return [int(uid) for uid in names]
 
     @classmethod
     def get_pid_usr_sys_times(cls, pid):
-        """ times should contain two elements: times[INDEX_USR_TIME] constains
-        user time for pid and times[INDEX_SYS_TIME] contains sys time for pid
+        """ times should contain three elements: times[INDEX_USR_TIME]
+        constains user time for pid, times[INDEX_SYS_TIME] contains sys time
+        for pid and times[INDEX_START_TIME] the time the process started
         """
-        try:
-            with open(cls.PID_STAT_MASK.format(pid)) as fp:
-                data = fp.read().split()
-                return [int(data[13]), int(data[14])]
-        except (IOError, IndexError, ValueError):
-            pass
+        buf, nbytes = cls._read_stat(cls.PID_STAT_MASK.format(pid))
+
+        if nbytes > 0:
+            times = parse_pid_times(buf, nbytes)
+            if times:
+                return times
 
         cls.logger.error("Failed to read CPU time for PID {0}".format(pid))
 
-        return []
+        return ()
 
     @classmethod
     def get_usr_sys_total_times(cls, cpu):
-        """ times should contain seven elements. times[INDEX_USR_TIME]
+        """ times should contain three elements. times[INDEX_USR_TIME]
         containts total user time, times[INDEX_SYS_TIME] contains total sys
         time, and times[INDEX_TOTAL_TIME] contains total time (including idle
-        cycles)
+        cycles). Empty if cpu is offline
         """
-        try:
-            with open(cls.PROC_STAT_FILE) as fp:
-                data = fp.readlines(cpu + 1)
-                if data[cpu + 1].startswith("cpu"):
-                    times = data[cpu + 1].strip().split()
-                    # [usr, sys, total]
-                    usr = int(times[1]) + int(times[2])
-                    sys = int(times[2]) + int(times[6]) + int(times[7])
-                    total = usr + sys + int(times[4]) + int(times[5])
-                    return [usr, sys, total]
-        except (IOError, IndexError, ValueError):
-            pass
+        buf, nbytes = cls._read_stat(cls.PROC_STAT_FILE)
+
+        if nbytes > 0:
+            times = parse_cpu_times(buf, nbytes, cpu)
+            if times:
+                return times
 
         cls.logger.error("Failed to read CPU time")
 
-        return []
+        return ()
+
+    @classmethod
+    def get_cpus_usr_sys_total_times(cls):
+        """ Return times of every online core in a single read of /proc/stat
+        as { cpu : [usr, sys, total] }. Offline cores have no entry
+        """
+        buf, nbytes = cls._read_stat(cls.PROC_STAT_FILE)
+
+        if nbytes > 0:
+            cpus = parse_all_cpu_times(buf, nbytes)
+            if cpus:
+                return cpus
+
+        cls.logger.error("Failed to read CPU times")
+
+        return {}
 
     @classmethod
     def get_mem_info(cls):
@@ -170,8 +244,10 @@ class SystemInfo(object):
         (Kb), and mem[INDEX_MEM_CACHED] contains size of kernel caches (Kb)
         """
         try:
+            profiler.count_open()
             with open(cls.PROC_MEM_FILE) as fp:
                 data = fp.readlines(4)
+                profiler.count_read(sum(len(line) for line in data))
                 if data[0].startswith("MemTotal"):
                     total = int(data[0].split()[1])
                 if data[1].startswith("MemFree"):
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+
+"""
+Traces of the raw inputs of monitors, for replaying them off Android through
+the same monitors and estimator (see benchmarks.replay).
+
+While recording, contents of the /proc and /sys files monitors read,
+directories they list, answers of Android services and events pushed to event
+queues go to the trace as they come. A file, listing or value is only
+recorded when it differs from what was recorded last, so that inputs which
+seldom change take no room. The estimator ends each iteration with a record
+of its number and time: inputs recorded since the previous one belong to it.
+
+On the device, PowerEstimator records to its TRACE_FILE when set, see
+PowerEstimator.start_trace(). Recording should start before the phone gets
+created, so that values monitors read once when created make it to the
+trace. Inputs line up exactly with iterations when monitors run from the
+estimator thread; with a thread per monitor, a read may land on the
+iteration after the one it was made for.
+
+The format follows utils.powerlog: a header with the iteration interval
+followed by records, each a type byte, the varint length of its payload and
+the payload.
+"""
+
+__all__ = ['tracer', 'TraceRecorder', 'TraceWriter', 'TraceReader']
+
+from utils.powerlog import PowerLogReader
+from utils.powerlog import _get_string
+from utils.powerlog import _get_svarint
+from utils.powerlog import _get_varint
+from utils.powerlog import _put_string
+from utils.powerlog import _put_svarint
+from utils.powerlog import _put_varint
+
+import logging
+import struct
+import threading
+
+MAGIC = b"PWRT"
+VERSION = 1
+
+# Record types
+TRACE_ITERATION = 1     # iter_num, time
+TRACE_FILE = 2          # path, contents (None: could not be read)
+TRACE_LISTDIR = 3       # path, [names]
+TRACE_VALUE = 4         # key, value
+TRACE_EVENT = 5         # queue, time, kind, (args)
+TRACE_HARDWARE = 6      # model name, [monitor names]
+
+# Tags of values
+_NONE = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+_FLOAT = 4
+_STRING = 5
+_BYTES = 6
+
+_DOUBLE = struct.Struct("<d")
+
+
+def _put_bytes(buf, data):
+    _put_varint(buf, len(data))
+    buf.extend(data)
+
+
+def _get_bytes(buf, pos):
+    size, pos = _get_varint(buf, pos)
+    if pos + size > len(buf):
+        raise IndexError("bytes out of buffer")
+    return bytes(buf[pos:pos + size]), pos + size
+
+
+def _put_value(buf, value):
+    """Append None, bool, int, float or string value with its tag"""
+    if value is None:
+        buf.append(_NONE)
+    elif value is True or value is False:
+        buf.append(_TRUE if value else _FALSE)
+    elif isinstance(value, (int, long)):
+        buf.append(_INT)
+        _put_svarint(buf, value)
+    elif isinstance(value, float):
+        buf.append(_FLOAT)
+        buf.extend(_DOUBLE.pack(value))
+    elif isinstance(value, unicode):
+        buf.append(_STRING)
+        _put_string(buf, value)
+    elif isinstance(value, bytes):
+        buf.append(_BYTES)
+        _put_bytes(buf, value)
+    else:
+        raise TypeError("Can't trace value {0!r}".format(value))
+
+
+def _get_value(buf, pos):
+    tag = buf[pos]
+    pos += 1
+
+    if tag == _NONE:
+        return None, pos
+    if tag == _FALSE or tag == _TRUE:
+        return tag == _TRUE, pos
+    if tag == _INT:
+        return _get_svarint(buf, pos)
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + _DOUBLE.size
+    if tag == _STRING:
+        return _get_string(buf, pos)
+    if tag == _BYTES:
+        return _get_bytes(buf, pos)
+
+    raise ValueError("Unknown value tag {0}".format(tag))
+
+
+class TraceWriter(object):
+    """Serialize trace records, handed out to a binary file with
+    writelines() at the end of every iteration. The header is written right
+    away with write()"""
+
+    def __init__(self, out, iter_interval):
+        self._out = out
+        # Serialized records not handed out yet
+        self._records = []
+
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        _put_varint(header, iter_interval)
+        self._out.write(bytes(header))
+
+    def _add_record(self, type_, payload):
+        record = bytearray()
+        record.append(type_)
+        _put_varint(record, len(payload))
+        record.extend(payload)
+        self._records.append(bytes(record))
+
+    def write_file(self, path, data):
+        payload = bytearray()
+        _put_string(payload, path)
+        _put_value(payload, data)
+        self._add_record(TRACE_FILE, payload)
+
+    def write_listdir(self, path, names):
+        payload = bytearray()
+        _put_string(payload, path)
+        for name in names:
+            _put_string(payload, name)
+        self._add_record(TRACE_LISTDIR, payload)
+
+    def write_value(self, key, value):
+        payload = bytearray()
+        _put_string(payload, key)
+        _put_value(payload, value)
+        self._add_record(TRACE_VALUE, payload)
+
+    def write_event(self, queue, timestamp, kind, args):
+        payload = bytearray()
+        _put_string(payload, queue)
+        _put_varint(payload, timestamp)
+        _put_svarint(payload, kind)
+        for arg in args:
+            _put_value(payload, arg)
+        self._add_record(TRACE_EVENT, payload)
+
+    def write_hardware(self, model_name, names):
+        payload = bytearray()
+        _put_string(payload, model_name)
+        for name in names:
+            _put_string(payload, name)
+        self._add_record(TRACE_HARDWARE, payload)
+
+    def write_iteration(self, iter_num, timestamp):
+        """End iteration, handing out its records"""
+        payload = bytearray()
+        _put_varint(payload, iter_num)
+        _put_varint(payload, timestamp)
+        self._add_record(TRACE_ITERATION, payload)
+
+        self._out.writelines(self._records)
+        self._records = []
+
+    def close(self):
+        if self._out is None:
+            return
+
+        self._out.writelines(self._records)
+        self._records = []
+        self._out.close()
+        self._out = None
+
+
+class TraceReader(PowerLogReader):
+    """Iterate over records of a trace. Records are tuples starting with
+    their type:
+        (TRACE_ITERATION, iter_num, time)
+        (TRACE_FILE, path, contents)
+        (TRACE_LISTDIR, path, [names])
+        (TRACE_VALUE, key, value)
+        (TRACE_EVENT, queue, time, kind, (args))
+        (TRACE_HARDWARE, model_name, [monitor names])
+    Reading is that of PowerLogReader: a record cut short ends the trace"""
+
+    def _read_header(self):
+        while True:
+            try:
+                if bytes(self._data[:len(MAGIC)]) != MAGIC[:len(self._data)]:
+                    raise ValueError("Not a trace")
+                pos = len(MAGIC)
+                version = self._data[pos]
+                if version != VERSION:
+                    raise ValueError("Unsupported trace version "
+                                     "{0}".format(version))
+                self.iter_interval, pos = _get_varint(self._data, pos + 1)
+                break
+            except IndexError:
+                if not self._fill():
+                    raise ValueError("Trace header cut short")
+
+        self._pos = pos
+
+    def parse_record(self, type_, buf, pos, end):
+        if type_ == TRACE_ITERATION:
+            iter_num, pos = _get_varint(buf, pos)
+            timestamp, pos = _get_varint(buf, pos)
+            return TRACE_ITERATION, iter_num, timestamp
+
+        if type_ == TRACE_FILE:
+            path, pos = _get_string(buf, pos)
+            data, pos = _get_value(buf, pos)
+            return TRACE_FILE, path, data
+
+        if type_ == TRACE_LISTDIR:
+            path, pos = _get_string(buf, pos)
+            return TRACE_LISTDIR, path, self._parse_strings(buf, pos, end)
+
+        if type_ == TRACE_VALUE:
+            key, pos = _get_string(buf, pos)
+            value, pos = _get_value(buf, pos)
+            return TRACE_VALUE, key, value
+
+        if type_ == TRACE_EVENT:
+            queue, pos = _get_string(buf, pos)
+            timestamp, pos = _get_varint(buf, pos)
+            kind, pos = _get_svarint(buf, pos)
+            args = []
+            while pos < end:
+                arg, pos = _get_value(buf, pos)
+                args.append(arg)
+            return TRACE_EVENT, queue, timestamp, kind, tuple(args)
+
+        if type_ == TRACE_HARDWARE:
+            model_name, pos = _get_string(buf, pos)
+            return (TRACE_HARDWARE, model_name,
+                    self._parse_strings(buf, pos, end))
+
+        return None
+
+    def _parse_strings(self, buf, pos, end):
+        strings = []
+        while pos < end:
+            string, pos = _get_string(buf, pos)
+            strings.append(string)
+        return strings
+
+
+class TraceRecorder(object):
+    """Record inputs of monitors to a trace while started. Inputs come from
+    monitor and callback threads alike, so recording takes a lock. Code
+    reading inputs checks recording first, which costs nothing otherwise.
+
+    An input that can't be recorded, e.g. a value of a type traces don't
+    hold, is logged and left out: recording runs in callbacks of Android
+    services, which must not raise"""
+
+    # Not equal to any recorded input
+    _MISSING = object()
+
+    logger = logging.getLogger("TraceRecorder")
+
+    def __init__(self):
+        self.recording = False
+        self._writer = None
+        self._lock = threading.Lock()
+        # Last recorded inputs: { path : contents }, { path : names },
+        # { key : value }
+        self._files = {}
+        self._dirs = {}
+        self._values = {}
+        # Inputs left out since started
+        self.failed_records = 0
+
+    def start(self, out, iter_interval):
+        """Record to binary file out, e.g. a BackgroundWriter blocking when
+        full, as a trace must not miss records"""
+        with self._lock:
+            self._writer = TraceWriter(out, iter_interval)
+            self._files.clear()
+            self._dirs.clear()
+            self._values.clear()
+            self.failed_records = 0
+            self.recording = True
+
+    def stop(self):
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+            self.recording = False
+
+        if writer is not None:
+            writer.close()
+
+    def _write(self, method, *args):
+        """Call method of the writer with args, holding the lock. Return
+        whether the record was written"""
+        try:
+            method(*args)
+            return True
+        except (TypeError, ValueError, IOError) as e:
+            self.failed_records += 1
+            self.logger.warn("Could not record {0}: {1}".format(
+                method.__name__, e))
+            return False
+
+    def record_file(self, path, data):
+        """Record contents of path, or None if it could not be read"""
+        with self._lock:
+            if (self._writer is None or
+                    self._files.get(path, self._MISSING) == data):
+                return
+            if self._write(self._writer.write_file, path, data):
+                self._files[path] = data
+
+    def record_listdir(self, path, names):
+        """Record entries of directory path that were of interest"""
+        names = sorted(names)
+        with self._lock:
+            if self._writer is None or self._dirs.get(path, None) == names:
+                return
+            if self._write(self._writer.write_listdir, path, names):
+                self._dirs[path] = names
+
+    def record_value(self, key, value):
+        """Record value read from elsewhere than a file, e.g. an Android
+        service"""
+        with self._lock:
+            if (self._writer is None or
+                    self._values.get(key, self._MISSING) == value):
+                return
+            if self._write(self._writer.write_value, key, value):
+                self._values[key] = value
+
+    def traced(self, key, value):
+        """Return value, recorded under key while recording"""
+        if self.recording:
+            self.record_value(key, value)
+        return value
+
+    def record_event(self, queue, timestamp, kind, args):
+        with self._lock:
+            if self._writer is not None:
+                self._write(self._writer.write_event, queue, timestamp, kind,
+                            args)
+
+    def record_hardware(self, model_name, names):
+        """Record phone model and names of its monitors"""
+        with self._lock:
+            if self._writer is not None:
+                self._write(self._writer.write_hardware, model_name, names)
+
+    def end_iteration(self, iter_num, timestamp):
+        """Close iteration processed at time (ms)"""
+        with self._lock:
+            if self._writer is not None:
+                self._write(self._writer.write_iteration, iter_num,
+                            timestamp)
+
+
+tracer = TraceRecorder()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+import math
+
+
+class WeightedAverage(object):
+    """Exponentially weighted moving average updated in constant time. Zero
+    samples are skipped and the early bias towards zero of the accumulator is
+    corrected by 1 - (1 - weight) ^ count"""
+
+    __slots__ = ['_weight', '_inv_weight', '_weighted', '_count']
+
+    def __init__(self, weight):
+        self._weight = weight
+        self._inv_weight = 1.0 - weight
+        self._weighted = 0.0
+        self._count = 0
+
+    def add(self, value):
+        # Skip zero values to save cycles
+        if value == 0:
+            return
+
+        self._count += 1
+        self._weighted *= self._inv_weight
+        self._weighted += self._weight * value
+
+    def get(self):
+        if self._count == 0:
+            return 0
+
+        return self._weighted / (1.0 - math.pow(self._inv_weight,
+                                                self._count))